@@ -0,0 +1,148 @@
+"""
+Объединение одинаковых параллельных GET-запросов (single-flight),
+включается при REQUEST_COALESCING=1.
+
+Фронтенд часто запрашивает один и тот же список одновременно из нескольких
+компонентов. Пока запрос выполняется, такие же запросы того же пользователя
+(путь, строка запроса, Accept, If-None-Match) не выполняются заново, а ждут
+его и получают тот же ответ - статус, заголовки и уже сериализованное тело.
+
+Запрос, пришедший после коммита изменения данных пользователя в этом
+процессе, к уже выполняющемуся не присоединяется: в ключ входит счетчик
+записей пользователя, который увеличивается после коммита транзакции с
+bump_data_version. Пока у пользователя есть отложенные автосохранения заметок
+(NOTE_WRITE_BEHIND), его запросы не объединяются: они еще не закоммичены и
+счетчик не изменили, а записывает их сам запрос. Потоковые ответы
+(Accept: text/event-stream) не объединяются.
+"""
+import asyncio
+from typing import Dict, List, Tuple
+
+from jose import JWTError, jwt
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+
+from .core.config import settings
+from .services import write_behind
+
+COALESCED_PREFIX = "/api/"
+
+# user_id -> число коммитов, изменивших данные пользователя, пока у него были
+# выполняющиеся запросы; когда их не остается, запись удаляется
+_generations: Dict[int, int] = {}
+
+stats = {"leaders": 0, "coalesced": 0}
+
+
+def mark_changed(db: Session, *user_ids: int) -> None:
+    """Отмечает, что транзакция меняет данные пользователей (вызывается из bump_data_version)"""
+    db.info.setdefault("coalescing_changed", set()).update(user_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_generations(session: Session) -> None:
+    if session.in_nested_transaction():
+        return
+    for user_id in session.info.pop("coalescing_changed", ()):
+        _generations[user_id] = _generations.get(user_id, 0) + 1
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed(session: Session) -> None:
+    if session.in_nested_transaction():
+        return
+    session.info.pop("coalescing_changed", None)
+
+
+def _user_id(request: Request) -> int | None:
+    # Токен только декодируется для ключа; проверка пользователя - в зависимостях маршрута
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return int(jwt.decode(token, settings.secret_key, algorithms=["HS256"])["sub"])
+    except (JWTError, KeyError, TypeError, ValueError):
+        return None
+
+
+class CoalescingMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app):
+        super().__init__(app)
+        # ключ запроса -> ответ ведущего запроса (None, если он завершился ошибкой)
+        self.in_flight: Dict[tuple, asyncio.Future] = {}
+        # user_id -> число выполняющихся ведущих запросов
+        self._leaders: Dict[int, int] = {}
+
+    def _key(self, request: Request) -> tuple | None:
+        if request.method != "GET" or not request.url.path.startswith(COALESCED_PREFIX):
+            return None
+        accept = request.headers.get("accept", "")
+        if "text/event-stream" in accept:
+            return None
+        user_id = _user_id(request)
+        if user_id is None:
+            return None
+        buffer = write_behind.note_buffer
+        if buffer is not None and buffer.has_pending(user_id):
+            return None
+        return (
+            user_id,
+            _generations.get(user_id, 0),
+            request.url.path,
+            request.url.query,
+            accept,
+            request.headers.get("if-none-match", ""),
+        )
+
+    async def dispatch(self, request: Request, call_next):
+        key = self._key(request)
+        if key is None:
+            return await call_next(request)
+
+        shared = self.in_flight.get(key)
+        if shared is not None:
+            result = await asyncio.shield(shared)
+            if result is not None:
+                stats["coalesced"] += 1
+                return _replay(result)
+            return await call_next(request)
+
+        shared = self.in_flight[key] = asyncio.get_running_loop().create_future()
+        user_id = key[0]
+        self._leaders[user_id] = self._leaders.get(user_id, 0) + 1
+        stats["leaders"] += 1
+        result = None
+        try:
+            response = await call_next(request)
+            if response.headers.get("content-type", "").startswith("text/event-stream"):
+                # Поток не буферизуется; ожидающие запросы выполнятся сами
+                return response
+            body = b"".join([chunk async for chunk in response.body_iterator])
+            result = (response.status_code, list(response.headers.raw), body)
+            return _replay(result)
+        finally:
+            del self.in_flight[key]
+            self._release(user_id)
+            shared.set_result(result)
+
+    def _release(self, user_id: int) -> None:
+        if self._leaders[user_id] > 1:
+            self._leaders[user_id] -= 1
+            return
+        del self._leaders[user_id]
+        # Присоединиться больше не к чему: счетчик пользователя можно начать заново
+        _generations.pop(user_id, None)
+
+
+def _replay(result: Tuple[int, List[Tuple[bytes, bytes]], bytes]) -> Response:
+    status_code, raw_headers, body = result
+    response = Response(body, status_code=status_code)
+    response.raw_headers = raw_headers
+    return response
+
+
+def coalescing_stats() -> dict:
+    return {**stats, "enabled": settings.request_coalescing}
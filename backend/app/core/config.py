@@ -12,6 +12,63 @@ class Settings(BaseModel):
     # URL изображения для прикрепления к уведомлениям о дедлайнах (опционально)
     notification_image_url: Optional[str] = os.getenv("NOTIFICATION_IMAGE_URL", "https://i.pinimg.com/736x/28/28/7c/28287c47478349b53d46c3ce6b81d90f.jpg")
 
+    # Профиль хранения SQLite: PRAGMA применяются к каждому новому соединению
+    sqlite_journal_mode: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    sqlite_synchronous: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    sqlite_busy_timeout_ms: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    # Размер кэша страниц в КиБ (передается в PRAGMA cache_size как отрицательное число)
+    sqlite_cache_size_kib: int = int(os.getenv("SQLITE_CACHE_SIZE_KIB", "16384"))
+    sqlite_mmap_size: int = int(os.getenv("SQLITE_MMAP_SIZE", str(128 * 1024 * 1024)))
+    sqlite_temp_store: str = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+    # Явный BEGIN для транзакций: DEFERRED, IMMEDIATE или EXCLUSIVE.
+    # Пусто - поведение драйвера (BEGIN перед первой записью, чтение вне транзакции)
+    sqlite_begin_mode: str = os.getenv("SQLITE_BEGIN_MODE", "")
+
+    # Пул соединений
+    db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    db_max_overflow: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    db_pool_timeout: int = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+    # Отдельный пул соединений только на чтение для GET-эндпоинтов
+    db_read_pool_size: int = int(os.getenv("DB_READ_POOL_SIZE", "10"))
+    # Общий кэш страниц (cache=shared) у соединений пула чтения
+    sqlite_read_shared_cache: bool = os.getenv("SQLITE_READ_SHARED_CACHE", "0").lower() in ("1", "true", "yes")
+    # Асинхронный движок (aiosqlite) и async-эндпоинты CRUD вместо синхронных в threadpool
+    async_db: bool = os.getenv("ASYNC_DB", "0").lower() in ("1", "true", "yes")
+
+    # Групповой коммит: записи из параллельных запросов идут одной транзакцией
+    write_batching: bool = os.getenv("WRITE_BATCHING", "0").lower() in ("1", "true", "yes")
+    write_batch_max_size: int = int(os.getenv("WRITE_BATCH_MAX_SIZE", "64"))
+    write_batch_max_delay_ms: float = float(os.getenv("WRITE_BATCH_MAX_DELAY_MS", "5"))
+    # Сколько запрос ждет своей очереди к писателю (WRITE_BATCHING или ASYNC_DB), затем 503
+    write_queue_timeout_seconds: float = float(os.getenv("WRITE_QUEUE_TIMEOUT_SECONDS", "30"))
+
+    # Отложенная запись автосохранений: изменения одной заметки за окно пишутся одним обновлением.
+    # Буфер - в памяти процесса, чтение своих правок гарантируется только в пределах одного процесса
+    note_write_behind: bool = os.getenv("NOTE_WRITE_BEHIND", "0").lower() in ("1", "true", "yes")
+    note_write_behind_delay_ms: float = float(os.getenv("NOTE_WRITE_BEHIND_DELAY_MS", "2000"))
+    note_write_behind_max_pending: int = int(os.getenv("NOTE_WRITE_BEHIND_MAX_PENDING", "1000"))
+
+    # Кэш папок, тегов, настроек и избранной заметки в памяти процесса (LRU по пользователям); 0 - выключен
+    read_cache_max_bytes: int = int(os.getenv("READ_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+    read_cache_max_users: int = int(os.getenv("READ_CACHE_MAX_USERS", "10000"))
+
+    # Одинаковые параллельные GET-запросы пользователя выполняются один раз (app/coalescing.py)
+    request_coalescing: bool = os.getenv("REQUEST_COALESCING", "0").lower() in ("1", "true", "yes")
+
+    # Поток изменений /api/events: период heartbeat и размер очереди одного подключения
+    events_heartbeat_seconds: float = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+    events_queue_size: int = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))
+    # Срок действия одноразового билета на подключение к потоку (POST /api/events/ticket)
+    events_ticket_ttl_seconds: float = float(os.getenv("EVENTS_TICKET_TTL_SECONDS", "30"))
+
+    # Период фоновой очистки неиспользуемых тегов, минуты
+    tag_gc_interval_minutes: int = int(os.getenv("TAG_GC_INTERVAL_MINUTES", "10"))
+
+    # Подсказки тегов из индекса в памяти; у пользователей с большим числом тегов - запросом к БД
+    tag_suggest_max_cached: int = int(os.getenv("TAG_SUGGEST_MAX_CACHED", "5000"))
+    # Сколько пользователей держат кэш id тегов и индекс подсказок (вытеснение по LRU)
+    tag_cache_max_users: int = int(os.getenv("TAG_CACHE_MAX_USERS", "10000"))
+
 
 settings = Settings()
 
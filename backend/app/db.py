@@ -1,16 +1,192 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import logging
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 
 from .core.config import settings
 
+logger = logging.getLogger(__name__)
+
+
+def is_sqlite_url(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _is_sqlite_memory_url(url: str) -> bool:
+    return ":memory:" in url or url.split("?")[0].rstrip("/").endswith(":")
+
+
+def storage_pragmas() -> dict:
+    """Возвращает PRAGMA профиля хранения SQLite в порядке применения"""
+    return {
+        "journal_mode": settings.sqlite_journal_mode,
+        "synchronous": settings.sqlite_synchronous,
+        "busy_timeout": settings.sqlite_busy_timeout_ms,
+        "cache_size": -abs(settings.sqlite_cache_size_kib),
+        "mmap_size": settings.sqlite_mmap_size,
+        "temp_store": settings.sqlite_temp_store,
+    }
+
+
+def read_pragmas() -> dict:
+    """PRAGMA для соединений только на чтение: профиль хранения + query_only"""
+    return {**storage_pragmas(), "query_only": "ON"}
+
+
+def read_database_url(url: str) -> str:
+    """URL для пула чтения: при SQLITE_READ_SHARED_CACHE соединения делят кэш страниц"""
+    if not settings.sqlite_read_shared_cache or not is_sqlite_url(url) or _is_sqlite_memory_url(url):
+        return url
+    prefix, _, path = url.partition(":///")
+    separator = "&" if "?" in path else "?"
+    return f"{prefix}:///file:{path}{separator}cache=shared&uri=true"
+
+
+def apply_sqlite_profile(engine: Engine, pragmas: dict, begin_mode: str | None = None) -> None:
+    """Навешивает на движок события, применяющие профиль к каждому соединению.
+
+    Если задан begin_mode, неявные транзакции pysqlite (BEGIN перед первой
+    записью) отключаются и BEGIN <begin_mode> выдается в начале каждой
+    транзакции SQLAlchemy - это нужно для SAVEPOINT и BEGIN IMMEDIATE.
+    """
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        if begin_mode:
+            dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    if begin_mode:
+        @event.listens_for(engine, "begin")
+        def _on_begin(conn):
+            conn.exec_driver_sql(f"BEGIN {begin_mode}")
+
+
+def create_db_engine(url: str, pragmas: dict | None = None, begin_mode: str | None = None, **kwargs) -> Engine:
+    """Создает движок с профилем хранения (для SQLite) и настройками пула"""
+    if not is_sqlite_url(url):
+        kwargs.setdefault("pool_size", settings.db_pool_size)
+        kwargs.setdefault("max_overflow", settings.db_max_overflow)
+        kwargs.setdefault("pool_timeout", settings.db_pool_timeout)
+        return create_engine(url, **kwargs)
+
+    connect_args = kwargs.pop("connect_args", {})
+    connect_args.setdefault("check_same_thread", False)
+    if not _is_sqlite_memory_url(url):
+        # Для in-memory БД используется SingletonThreadPool без этих параметров
+        kwargs.setdefault("pool_size", settings.db_pool_size)
+        kwargs.setdefault("max_overflow", settings.db_max_overflow)
+        kwargs.setdefault("pool_timeout", settings.db_pool_timeout)
+    engine = create_engine(url, connect_args=connect_args, **kwargs)
+    apply_sqlite_profile(
+        engine,
+        storage_pragmas() if pragmas is None else pragmas,
+        settings.sqlite_begin_mode if begin_mode is None else begin_mode,
+    )
+    return engine
+
+
+def describe_storage(engine: Engine) -> dict:
+    """Возвращает фактические значения PRAGMA и параметры пула движка"""
+    report = {"url": engine.url.render_as_string(hide_password=True)}
+    if engine.dialect.name == "sqlite":
+        with engine.connect() as conn:
+            for name in read_pragmas():
+                report[name] = conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+    pool = engine.pool
+    report["pool"] = type(pool).__name__
+    if hasattr(pool, "size"):
+        report["pool_size"] = pool.size()
+    if hasattr(pool, "_max_overflow"):
+        report["max_overflow"] = pool._max_overflow
+    return report
+
+
+def log_storage_profile(engine: Engine, name: str = "запись") -> None:
+    """Пишет в лог отчет о фактическом профиле хранения"""
+    try:
+        report = describe_storage(engine)
+    except Exception as e:
+        logger.warning(f"Не удалось получить профиль хранения ({name}): {e}")
+        return
+    logger.info(f"Профиль хранения БД ({name}): " + ", ".join(f"{k}={v}" for k, v in report.items()))
+
+
+def async_database_url(url: str) -> str:
+    """Подставляет асинхронный драйвер (aiosqlite) в URL базы данных"""
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
 
-engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False} if settings.database_url.startswith("sqlite") else {},
-)
+
+def create_async_db_engine(url: str, pragmas: dict | None = None, **kwargs):
+    """Асинхронный аналог create_db_engine с тем же профилем хранения"""
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+    url = async_database_url(url)
+    if not _is_sqlite_memory_url(url):
+        # aiosqlite по умолчанию использует NullPool и открывает файл на каждый запрос
+        kwargs.setdefault("poolclass", AsyncAdaptedQueuePool)
+        kwargs.setdefault("pool_size", settings.db_pool_size)
+        kwargs.setdefault("max_overflow", settings.db_max_overflow)
+        kwargs.setdefault("pool_timeout", settings.db_pool_timeout)
+    async_engine = create_async_engine(url, **kwargs)
+    if is_sqlite_url(url):
+        apply_sqlite_profile(
+            async_engine.sync_engine,
+            storage_pragmas() if pragmas is None else pragmas,
+            settings.sqlite_begin_mode,
+        )
+    return async_engine
+
+
+def _has_separate_read_engine(url: str) -> bool:
+    # Отдельное in-memory соединение было бы другой, пустой БД
+    return is_sqlite_url(url) and not _is_sqlite_memory_url(url)
+
+
+engine = create_db_engine(settings.database_url)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Отдельный пул для GET-эндпоинтов: списки не ждут соединений, занятых записью
+if _has_separate_read_engine(settings.database_url):
+    read_engine = create_db_engine(
+        read_database_url(settings.database_url),
+        pragmas=read_pragmas(),
+        pool_size=settings.db_read_pool_size,
+    )
+else:
+    read_engine = engine
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# Асинхронный движок создается только при ASYNC_DB=1, чтобы aiosqlite не был обязательной зависимостью
+async_engine = None
+async_read_engine = None
+AsyncSessionLocal = None
+AsyncReadSessionLocal = None
+if settings.async_db:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    async_engine = create_async_db_engine(settings.database_url)
+    if _has_separate_read_engine(settings.database_url):
+        async_read_engine = create_async_db_engine(
+            read_database_url(settings.database_url),
+            pragmas=read_pragmas(),
+            pool_size=settings.db_read_pool_size,
+        )
+    else:
+        async_read_engine = async_engine
+    # expire_on_commit=False: после коммита атрибуты нельзя лениво догрузить вне greenlet
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
+
 
 def get_db():
     db = SessionLocal()
@@ -20,3 +196,38 @@ def get_db():
         db.close()
 
 
+def get_read_db():
+    """Сессия из пула только для чтения (PRAGMA query_only)"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def run_write(db: Session, fn, *args):
+    """Выполняет изменяющую функцию и фиксирует транзакцию.
+
+    Функции-обработчики роутеров (_create_*, _update_*, ...) только изменяют
+    сессию и собирают ответ; коммит делается здесь, чтобы их можно было вызывать
+    и из синхронных эндпоинтов, и из асинхронных через AsyncSession.run_sync.
+    """
+    try:
+        result = fn(db, *args)
+        db.commit()
+        return result
+    except Exception:
+        db.rollback()
+        raise
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+
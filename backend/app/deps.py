@@ -1,23 +1,23 @@
 import logging
-from fastapi import Depends, HTTPException, status
+import time
+from fastapi import Depends, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 
-from .db import get_db
+from .db import get_db, get_read_db, get_async_db, get_async_read_db
 from .models.user import User
 from .security import decode_access_token
+from .services import write_behind
 
 logger = logging.getLogger(__name__)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme), 
-    db: Session = Depends(get_db)
-) -> User:
+def _user_id_from_token(token: str) -> int:
     """
-    Получает текущего авторизованного пользователя из токена.
+    Декодирует токен и возвращает идентификатор пользователя.
     Добавлено детальное логирование для отладки проблем с авторизацией.
     """
     logger.info("=" * 80)
@@ -91,6 +91,54 @@ def get_current_user(
                 detail="Не удалось проверить токен. Пожалуйста, войдите заново."
             )
 
+    return user_id
+
+
+def defer_writes(request: Request) -> None:
+    """Отмечает запрос, который сам работает с отложенными изменениями (PATCH заметки)"""
+    request.state.defer_writes = True
+
+
+def _flush_deferred(request: Request, user_id: int) -> None:
+    # Отложенные автосохранения пользователя записываются до любого другого его запроса
+    if _has_deferred(request, user_id):
+        write_behind.flush_user_writes(user_id)
+
+
+def _has_deferred(request: Request, user_id: int) -> bool:
+    buffer = write_behind.note_buffer
+    return buffer is not None and buffer.has_pending(user_id) and not getattr(request.state, "defer_writes", False)
+
+
+def get_current_user(
+    request: Request,
+    token: str = Depends(oauth2_scheme), 
+    db: Session = Depends(get_db)
+) -> User:
+    """
+    Получает текущего авторизованного пользователя из токена.
+    Добавлено детальное логирование для отладки проблем с авторизацией.
+    """
+    user_id = _user_id_from_token(token)
+    _flush_deferred(request, user_id)
+    return _load_user(db, user_id)
+
+
+def get_current_reader(
+    request: Request,
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_read_db)
+) -> User:
+    """
+    То же, что get_current_user, но пользователь читается из пула только для чтения.
+    Используется GET-эндпоинтами вместе с get_read_db (сессия общая на запрос).
+    """
+    user_id = _user_id_from_token(token)
+    _flush_deferred(request, user_id)
+    return _load_user(db, user_id)
+
+
+def _load_user(db: Session, user_id: int) -> User:
     # Поиск пользователя в БД
     logger.info(f"[get_current_user] Поиск пользователя в БД с id={user_id}...")
     user = db.get(User, user_id)
@@ -116,3 +164,101 @@ def get_current_user(
     return user
 
 
+async def get_current_user_async(
+    request: Request,
+    token: str = Depends(oauth2_scheme),
+    db=Depends(get_async_db)
+) -> User:
+    """Асинхронный вариант get_current_user для эндпоинтов на AsyncSession"""
+    user_id = _user_id_from_token(token)
+    if _has_deferred(request, user_id):
+        await run_in_threadpool(write_behind.flush_user_writes, user_id)
+    return await _load_user_async(db, user_id)
+
+
+async def get_current_reader_async(
+    request: Request,
+    token: str = Depends(oauth2_scheme),
+    db=Depends(get_async_read_db)
+) -> User:
+    """Асинхронный вариант get_current_reader"""
+    user_id = _user_id_from_token(token)
+    if _has_deferred(request, user_id):
+        await run_in_threadpool(write_behind.flush_user_writes, user_id)
+    return await _load_user_async(db, user_id)
+
+
+async def _load_user_async(db, user_id: int) -> User:
+    user = await db.get(User, user_id)
+    if user is None:
+        logger.error(f"[get_current_user_async] ❌ ОШИБКА: пользователь с id={user_id} не найден в БД")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, 
+            detail=f"Пользователь с id={user_id} не найден в базе данных"
+        )
+    return user
+
+
+# Условные запросы по users.data_version.
+# ETag слабый: W/"<версия>", у списков дедлайнов еще и текущая минута, т.к. в них
+# есть оставшееся время. If-Match сравнивается только с версией.
+def _etag(user: User, per_minute: bool = False) -> str:
+    tag = str(user.data_version or 0)
+    if per_minute:
+        tag += f"-{int(time.time() // 60)}"
+    return f'W/"{tag}"'
+
+
+def _etag_values(header: str) -> set:
+    return {value.strip().removeprefix("W/") for value in header.split(",")}
+
+
+def _check_not_modified(request: Request, response: Response, user: User, per_minute: bool = False) -> None:
+    etag = _etag(user, per_minute)
+    # JSON и msgpack (fast_response) - один ETag, поэтому Vary нужен и у 304
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept"}
+    response.headers.update(headers)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag.removeprefix("W/") in _etag_values(if_none_match)):
+        # Ответ 304 отдается до выполнения запроса списка
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+
+def _check_if_match(request: Request, user: User) -> None:
+    if_match = request.headers.get("if-match")
+    if not if_match or if_match.strip() == "*":
+        return
+    version = str(user.data_version or 0)
+    if version not in {value.strip('"').split("-")[0] for value in _etag_values(if_match)}:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Данные изменились, обновите их и повторите запрос",
+            headers={"ETag": _etag(user)},
+        )
+
+
+def list_etag(request: Request, response: Response, user: User = Depends(get_current_reader)) -> None:
+    """ETag списка и ответ 304 на совпадающий If-None-Match"""
+    _check_not_modified(request, response, user)
+
+
+def deadlines_etag(request: Request, response: Response, user: User = Depends(get_current_reader)) -> None:
+    """То же, что list_etag, но ETag меняется еще и каждую минуту"""
+    _check_not_modified(request, response, user, per_minute=True)
+
+
+def if_match(request: Request, user: User = Depends(get_current_user)) -> None:
+    """Отклоняет изменение (412), если If-Match не совпадает с текущей версией данных"""
+    _check_if_match(request, user)
+
+
+async def list_etag_async(request: Request, response: Response, user: User = Depends(get_current_reader_async)) -> None:
+    _check_not_modified(request, response, user)
+
+
+async def deadlines_etag_async(request: Request, response: Response, user: User = Depends(get_current_reader_async)) -> None:
+    _check_not_modified(request, response, user, per_minute=True)
+
+
+async def if_match_async(request: Request, user: User = Depends(get_current_user_async)) -> None:
+    _check_if_match(request, user)
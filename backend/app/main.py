@@ -1,17 +1,39 @@
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
+from fastapi.routing import APIRoute
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
 import logging
+import re
 
 from .routers import health, auth
-from .routers import crud, webhook, settings
-from .db import engine, Base
+from .routers import crud, webhook, settings, sync, batch, search, bootstrap, events
+from .coalescing import CoalescingMiddleware
+from .db import engine, read_engine, log_storage_profile
+from .core.config import settings as app_settings
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+_SECRET_QUERY_PARAMS = re.compile(r"(?<=[?&])(ticket|token)=[^&\s]*")
+
+
+class _RedactQueryFilter(logging.Filter):
+    """Скрывает билеты и токены из строки запроса в журнале доступа uvicorn"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # Аргументы записи uvicorn.access: (клиент, метод, путь со строкой запроса, HTTP, статус)
+        if isinstance(record.args, tuple) and len(record.args) == 5 and isinstance(record.args[2], str):
+            args = list(record.args)
+            args[2] = _SECRET_QUERY_PARAMS.sub(r"\1=***", args[2])
+            record.args = tuple(args)
+        return True
+
+
+logging.getLogger("uvicorn.access").addFilter(_RedactQueryFilter())
+
 
 class LoggingMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
@@ -24,113 +46,63 @@ class LoggingMiddleware(BaseHTTPMiddleware):
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    from . import models  # noqa: F401
-    Base.metadata.create_all(bind=engine)
-    
-    # Выполняем миграцию user_settings если нужно
-    try:
-        import sqlite3
-        import json
-        from pathlib import Path
-        from .core.config import settings
-        
-        # Определяем путь к базе данных
-        db_url = settings.database_url
-        if db_url.startswith("sqlite:///./"):
-            db_path = Path(db_url.replace("sqlite:///./", ""))
-        elif db_url.startswith("sqlite:///"):
-            db_path = Path(db_url.replace("sqlite:///", ""))
-        else:
-            db_path = None
-        
-        if db_path and db_path.exists():
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            
-            # Проверяем структуру таблицы
-            cursor.execute("PRAGMA table_info(user_settings)")
-            columns = {col[1]: col for col in cursor.fetchall()}
-            
-            has_old_column = 'notification_time_minutes' in columns
-            has_new_column = 'notification_times_minutes' in columns
-            
-            if not has_new_column:
-                if has_old_column:
-                    # Миграция: переименование и преобразование
-                    logger.info("Выполняю миграцию user_settings: notification_time_minutes -> notification_times_minutes")
-                    cursor.execute("SELECT id, notification_time_minutes FROM user_settings")
-                    records = cursor.fetchall()
-                    
-                    # Создаем новую таблицу
-                    cursor.execute("""
-                        CREATE TABLE user_settings_new (
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            user_id INTEGER NOT NULL UNIQUE,
-                            language VARCHAR(2) NOT NULL DEFAULT 'ru',
-                            theme VARCHAR(10) NOT NULL DEFAULT 'dark',
-                            notification_times_minutes TEXT NOT NULL DEFAULT '[30]',
-                            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                            updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-                        )
-                    """)
-                    
-                    # Копируем данные
-                    for record_id, old_value in records:
-                        new_value = json.dumps([old_value] if old_value is not None else [30])
-                        cursor.execute("""
-                            SELECT user_id, language, theme, created_at, updated_at 
-                            FROM user_settings WHERE id = ?
-                        """, (record_id,))
-                        other_fields = cursor.fetchone()
-                        if other_fields:
-                            cursor.execute("""
-                                INSERT INTO user_settings_new 
-                                (id, user_id, language, theme, notification_times_minutes, created_at, updated_at)
-                                VALUES (?, ?, ?, ?, ?, ?, ?)
-                            """, (record_id, other_fields[0], other_fields[1], other_fields[2], 
-                                  new_value, other_fields[3], other_fields[4]))
-                    
-                    cursor.execute("DROP TABLE user_settings")
-                    cursor.execute("ALTER TABLE user_settings_new RENAME TO user_settings")
-                    cursor.execute("CREATE INDEX IF NOT EXISTS ix_user_settings_user_id ON user_settings(user_id)")
-                    conn.commit()
-                    logger.info(f"Миграция завершена. Преобразовано записей: {len(records)}")
-                else:
-                    # Просто добавляем новое поле
-                    logger.info("Добавляю поле notification_times_minutes в user_settings")
-                    cursor.execute("""
-                        ALTER TABLE user_settings 
-                        ADD COLUMN notification_times_minutes TEXT NOT NULL DEFAULT '[30]'
-                    """)
-                    cursor.execute("""
-                        UPDATE user_settings 
-                        SET notification_times_minutes = '[30]' 
-                        WHERE notification_times_minutes IS NULL
-                    """)
-                    conn.commit()
-                    logger.info("Поле notification_times_minutes добавлено")
-            
-            conn.close()
-    except Exception as e:
-        logger.warning(f"Не удалось выполнить миграцию user_settings: {e}")
+    from .migrations import run_migrations
+    run_migrations(engine)
+    log_storage_profile(engine)
+    if read_engine is not engine:
+        log_storage_profile(read_engine, "чтение")
     
     # Запускаем планировщик уведомлений о дедлайнах
     from .services.notification_service import start_scheduler, stop_scheduler
     start_scheduler()
     logger.info("Планировщик уведомлений о дедлайнах запущен")
+
+    from .services.write_queue import start_write_queue, stop_write_queue
+    start_write_queue()
+
+    from .services.write_behind import start_note_write_behind, stop_note_write_behind
+    start_note_write_behind(crud._write_deferred_note)
+
+    from .services.events import broker
+    broker.start(asyncio.get_running_loop())
     
     try:
         yield
     finally:
-        # Shutdown
+        # Открытые потоки /api/events завершаются, иначе остановка ждет их отключения
+        broker.close()
+        # Shutdown: отложенные изменения записываются, пока писатель еще работает
+        stop_note_write_behind()
+        stop_write_queue()
         stop_scheduler()
         logger.info("Планировщик уведомлений о дедлайнах остановлен")
+        from .db import async_engine, async_read_engine
+        if async_read_engine is not None and async_read_engine is not async_engine:
+            await async_read_engine.dispose()
+        if async_engine is not None:
+            await async_engine.dispose()
+
+
+def _drop_shadowed_routes(app: FastAPI) -> None:
+    """Убирает маршруты, перекрытые ранее зарегистрированными с тем же путем и методом"""
+    seen = set()
+    routes = []
+    for route in app.router.routes:
+        if isinstance(route, APIRoute):
+            keys = {(route.path, method) for method in route.methods}
+            if keys & seen:
+                continue
+            seen |= keys
+        routes.append(route)
+    app.router.routes[:] = routes
 
 
 def create_app() -> FastAPI:
     app = FastAPI(title="UniTask Tracker", version="0.1.0", lifespan=lifespan)
 
+    if app_settings.request_coalescing:
+        app.add_middleware(CoalescingMiddleware)
+
     # Добавляем логирование запросов
     app.add_middleware(LoggingMiddleware)
 
@@ -145,9 +117,19 @@ def create_app() -> FastAPI:
 
     app.include_router(health.router)
     app.include_router(auth.router)
+    if app_settings.async_db:
+        # Асинхронные версии подключаются первыми и перекрывают синхронные
+        from .routers import crud_async
+        app.include_router(crud_async.router)
     app.include_router(crud.router)
     app.include_router(webhook.router)
     app.include_router(settings.router)
+    app.include_router(sync.router)
+    app.include_router(batch.router)
+    app.include_router(search.router)
+    app.include_router(bootstrap.router)
+    app.include_router(events.router)
+    _drop_shadowed_routes(app)
 
     return app
 
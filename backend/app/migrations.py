@@ -0,0 +1,361 @@
+"""
+Версионированные миграции схемы БД.
+
+Текущая версия схемы хранится в таблице schema_version (одна строка). При
+старте приложения run_migrations сравнивает ее с последней известной версией
+и, только если она отстает, по очереди применяет недостающие миграции - каждую
+в своей транзакции. Новая (пустая) БД создается сразу по моделям и помечается
+последней версией.
+
+Миграции пишутся множественными SQL-операциями (INSERT ... SELECT, UPDATE
+без построчных циклов в Python) и должны переживать повторный запуск на БД,
+созданной старым create_all, поэтому новые таблицы/колонки добавляются через
+_create_missing_tables/_add_column.
+"""
+import logging
+from contextlib import contextmanager
+from typing import Callable, List, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+from .db import Base
+from .services.search_service import create_search_index, create_search_tables, rebuild_search_index
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = []
+
+
+def migration(version: int, description: str):
+    """Регистрирует функцию миграции схемы до указанной версии"""
+    def decorator(fn: Callable[[Connection], None]):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return decorator
+
+
+def latest_version() -> int:
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def _columns(conn: Connection, table: str) -> set:
+    return {col["name"] for col in inspect(conn).get_columns(table)}
+
+
+def _add_column(conn: Connection, table: str, column: str, ddl: str) -> bool:
+    """Добавляет колонку, если ее еще нет (БД могла быть создана новым create_all)"""
+    if column in _columns(conn, table):
+        return False
+    conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+    return True
+
+
+def _create_missing_tables(conn: Connection) -> None:
+    """Создает таблицы моделей, которых еще нет в БД"""
+    from . import models  # noqa: F401
+    Base.metadata.create_all(bind=conn)
+
+
+@migration(1, "Базовая схема: notes.is_favorite, user_settings.notification_times_minutes")
+def _baseline(conn: Connection) -> None:
+    _create_missing_tables(conn)
+
+    if _add_column(conn, "notes", "is_favorite", "BOOLEAN NOT NULL DEFAULT 0"):
+        conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_notes_is_favorite ON notes(is_favorite)")
+
+    columns = _columns(conn, "user_settings")
+    if "notification_times_minutes" in columns:
+        return
+    if "notification_time_minutes" not in columns:
+        conn.exec_driver_sql(
+            "ALTER TABLE user_settings ADD COLUMN notification_times_minutes TEXT NOT NULL DEFAULT '[30]'"
+        )
+        return
+
+    # notification_time_minutes (число) -> notification_times_minutes (JSON-массив)
+    conn.exec_driver_sql("""
+        CREATE TABLE user_settings_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL UNIQUE,
+            language VARCHAR(2) NOT NULL DEFAULT 'ru',
+            theme VARCHAR(10) NOT NULL DEFAULT 'dark',
+            notification_times_minutes TEXT NOT NULL DEFAULT '[30]',
+            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    """)
+    conn.exec_driver_sql("""
+        INSERT INTO user_settings_new
+            (id, user_id, language, theme, notification_times_minutes, created_at, updated_at)
+        SELECT id, user_id, language, theme,
+               '[' || COALESCE(notification_time_minutes, 30) || ']',
+               created_at, updated_at
+        FROM user_settings
+    """)
+    conn.exec_driver_sql("DROP TABLE user_settings")
+    conn.exec_driver_sql("ALTER TABLE user_settings_new RENAME TO user_settings")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_user_settings_id ON user_settings(id)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_user_settings_user_id ON user_settings(user_id)")
+
+
+@migration(2, "Теги пользователя: tags.user_id, tags.usage_count, уникальность (user_id, name)")
+def _per_user_tags(conn: Connection) -> None:
+    _add_column(conn, "tags", "user_id", "INTEGER")
+    _add_column(conn, "tags", "usage_count", "INTEGER NOT NULL DEFAULT 0")
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_tags_name")
+
+    # Владельцы глобальных тегов - пользователи связанных задач и заметок
+    conn.exec_driver_sql("DROP TABLE IF EXISTS temp.tag_owner")
+    conn.exec_driver_sql("""
+        CREATE TEMP TABLE tag_owner AS
+        SELECT nt.tag_id AS tag_id, n.user_id AS user_id
+        FROM note_tag nt JOIN notes n ON n.id = nt.note_id
+        UNION
+        SELECT tt.tag_id, t.user_id
+        FROM task_tag tt JOIN tasks t ON t.id = tt.task_id
+    """)
+    # Тег остается у первого владельца, остальным создаются копии с тем же именем
+    conn.exec_driver_sql("""
+        UPDATE tags SET user_id = (SELECT MIN(o.user_id) FROM tag_owner o WHERE o.tag_id = tags.id)
+        WHERE user_id IS NULL
+    """)
+    conn.exec_driver_sql("""
+        INSERT INTO tags (user_id, name, color, usage_count)
+        SELECT o.user_id, t.name, t.color, 0
+        FROM tag_owner o JOIN tags t ON t.id = o.tag_id
+        WHERE o.user_id <> t.user_id
+          AND NOT EXISTS (SELECT 1 FROM tags c WHERE c.user_id = o.user_id AND c.name = t.name)
+    """)
+    for table, item_table, item_column in (("note_tag", "notes", "note_id"), ("task_tag", "tasks", "task_id")):
+        conn.exec_driver_sql(f"""
+            UPDATE {table} SET tag_id = (
+                SELECT c.id FROM tags c, tags t, {item_table} i
+                WHERE t.id = {table}.tag_id AND i.id = {table}.{item_column}
+                  AND c.user_id = i.user_id AND c.name = t.name
+            )
+            WHERE EXISTS (
+                SELECT 1 FROM tags t, {item_table} i
+                WHERE t.id = {table}.tag_id AND i.id = {table}.{item_column} AND t.user_id <> i.user_id
+            )
+        """)
+    conn.exec_driver_sql("DROP TABLE temp.tag_owner")
+
+    # Теги без связей никому не принадлежат
+    conn.exec_driver_sql("DELETE FROM tags WHERE user_id IS NULL")
+    conn.exec_driver_sql("""
+        UPDATE tags SET usage_count =
+            (SELECT COUNT(*) FROM note_tag WHERE note_tag.tag_id = tags.id)
+          + (SELECT COUNT(*) FROM task_tag WHERE task_tag.tag_id = tags.id)
+    """)
+    conn.exec_driver_sql("CREATE UNIQUE INDEX IF NOT EXISTS ix_tags_user_id_name ON tags(user_id, name)")
+
+
+@migration(3, "Индексы постраничной выдачи заметок и задач")
+def _pagination_indexes(conn: Connection) -> None:
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_notes_user_favorite_updated ON notes(user_id, is_favorite, updated_at, id)"
+    )
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_tasks_user_created ON tasks(user_id, created_at, id)")
+
+
+@migration(4, "notes.snippet и notes.content_length для списков fields=summary")
+def _note_snippets(conn: Connection) -> None:
+    _add_column(conn, "notes", "snippet", "VARCHAR(200)")
+    _add_column(conn, "notes", "content_length", "INTEGER NOT NULL DEFAULT 0")
+    # Та же логика, что в crud._set_note_content: для todo - "выполнено/всего"
+    # по непустым пунктам, иначе первые 100 символов
+    conn.exec_driver_sql("""
+        UPDATE notes SET
+            content_length = COALESCE(length(content), 0),
+            snippet = CASE
+                WHEN json_valid(content)
+                     AND json_type(content) = 'object'
+                     AND json_extract(content, '$.type') = 'todo'
+                     AND json_type(content, '$.items') = 'array'
+                THEN (
+                    SELECT COALESCE(SUM(json_extract(value, '$.completed') IS NOT NULL
+                                        AND json_extract(value, '$.completed') NOT IN (0, '')), 0)
+                           || '/' || COUNT(*)
+                    FROM json_each(content, '$.items')
+                    WHERE type = 'object'
+                      AND trim(COALESCE(json_extract(value, '$.text'), ''), char(32, 9, 10, 13)) <> ''
+                )
+                ELSE substr(content, 1, 100)
+            END
+    """)
+
+
+@migration(5, "users.data_version для ETag и If-Match")
+def _user_data_version(conn: Connection) -> None:
+    _add_column(conn, "users", "data_version", "INTEGER NOT NULL DEFAULT 0")
+
+
+@migration(6, "Журнал изменений change_log для /api/sync")
+def _change_log(conn: Connection) -> None:
+    _create_missing_tables(conn)
+
+
+@migration(7, "Полнотекстовый поиск: notes_fts, tasks_fts и триггеры синхронизации")
+def _search_index(conn: Connection) -> None:
+    # Триггеры и заполнение индекса - в миграции 9: текст todo-заметок там берется уже из todo_items
+    create_search_tables(conn)
+
+
+@migration(8, "Индексы note_tag(tag_id, note_id) и task_tag(tag_id, task_id) для фильтров и счетчиков по тегам")
+def _tag_link_indexes(conn: Connection) -> None:
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_note_tag_tag_note ON note_tag(tag_id, note_id)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_task_tag_tag_task ON task_tag(tag_id, task_id)")
+
+
+@migration(9, "Пункты todo-заметок в таблице todo_items, notes.is_todo/todo_done/todo_total")
+def _todo_items(conn: Connection) -> None:
+    _create_missing_tables(conn)
+    _add_column(conn, "notes", "is_todo", "BOOLEAN NOT NULL DEFAULT 0")
+    _add_column(conn, "notes", "todo_done", "INTEGER")
+    _add_column(conn, "notes", "todo_total", "INTEGER")
+
+    # Пункты из JSON. id пункта сохраняется, если это целое число, уникальное в
+    # заметке; остальным (и повторам) - новые id после максимального в заметке
+    conn.exec_driver_sql("DROP TABLE IF EXISTS temp.todo_source")
+    conn.exec_driver_sql("""
+        CREATE TEMP TABLE todo_source AS
+        WITH todo_notes AS MATERIALIZED (
+            SELECT id, content FROM notes
+            WHERE json_valid(content)
+              AND json_type(content) = 'object'
+              AND json_extract(content, '$.type') = 'todo'
+              AND json_type(content, '$.items') = 'array'
+        )
+        SELECT n.id AS note_id,
+               j.key AS position,
+               CASE WHEN json_type(j.value, '$.id') = 'integer'
+                         AND json_extract(j.value, '$.id') BETWEEN 1 AND 9007199254740991
+                    THEN json_extract(j.value, '$.id') END AS item_id,
+               COALESCE(CAST(json_extract(j.value, '$.text') AS TEXT), '') AS text,
+               (json_extract(j.value, '$.completed') IS NOT NULL
+                AND json_extract(j.value, '$.completed') NOT IN (0, '')) AS done
+        FROM todo_notes n, json_each(n.content, '$.items') j
+        WHERE j.type = 'object'
+    """)
+    conn.exec_driver_sql("""
+        UPDATE todo_source SET item_id = NULL
+        WHERE item_id IS NOT NULL AND rowid NOT IN (
+            SELECT MIN(rowid) FROM todo_source WHERE item_id IS NOT NULL GROUP BY note_id, item_id
+        )
+    """)
+    conn.exec_driver_sql("""
+        INSERT INTO todo_items (note_id, id, position, text, done)
+        SELECT note_id,
+               COALESCE(item_id, COALESCE(MAX(item_id) OVER (PARTITION BY note_id), 0)
+                        + ROW_NUMBER() OVER (PARTITION BY note_id, item_id IS NULL ORDER BY position)),
+               ROW_NUMBER() OVER (PARTITION BY note_id ORDER BY position) - 1,
+               text, done
+        FROM todo_source
+    """)
+
+    # Триггеры FTS заметок теперь читают текст пунктов из todo_items
+    conn.exec_driver_sql("DROP TRIGGER IF EXISTS notes_fts_insert")
+    conn.exec_driver_sql("DROP TRIGGER IF EXISTS notes_fts_update")
+    create_search_index(conn)
+
+    # Та же логика, что в crud._refresh_todo_progress: счетчики по непустым пунктам,
+    # content_length - длина JSON, который отдается в content
+    conn.exec_driver_sql("""
+        UPDATE notes SET
+            is_todo = 1,
+            content = NULL,
+            todo_total = (SELECT COUNT(*) FROM todo_items i
+                          WHERE i.note_id = notes.id AND trim(i.text, char(32, 9, 10, 13)) <> ''),
+            todo_done = (SELECT COUNT(*) FROM todo_items i
+                         WHERE i.note_id = notes.id AND i.done AND trim(i.text, char(32, 9, 10, 13)) <> ''),
+            content_length = length(json_object('type', 'todo', 'items', json((
+                SELECT json_group_array(json_object(
+                    'id', i.id, 'text', i.text, 'completed', json(CASE WHEN i.done THEN 'true' ELSE 'false' END)
+                ))
+                FROM todo_items i WHERE i.note_id = notes.id
+            ))))
+        WHERE is_todo
+           OR (json_valid(content)
+               AND json_type(content) = 'object'
+               AND json_extract(content, '$.type') = 'todo'
+               AND json_type(content, '$.items') = 'array')
+    """)
+    conn.exec_driver_sql("UPDATE notes SET snippet = todo_done || '/' || todo_total WHERE is_todo")
+    conn.exec_driver_sql("DROP TABLE temp.todo_source")
+    rebuild_search_index(conn)
+
+
+@migration(10, "notes.content_hash и tasks.content_hash для пропуска изменений без отличий")
+def _content_hashes(conn: Connection) -> None:
+    # Хеши существующих строк неизвестны (NULL): они появятся при следующем сохранении
+    _add_column(conn, "notes", "content_hash", "VARCHAR(64)")
+    _add_column(conn, "tasks", "content_hash", "VARCHAR(64)")
+
+
+@migration(11, "Индекс deadlines(user_id, deadline_at) для /api/agenda")
+def _deadline_range_index(conn: Connection) -> None:
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_deadlines_user_deadline ON deadlines(user_id, deadline_at)")
+
+
+@contextmanager
+def _transaction(engine: Engine):
+    """Транзакция миграции; в SQLite сразу берем блокировку записи (BEGIN IMMEDIATE),
+    чтобы параллельно стартующие процессы не применили одну миграцию дважды"""
+    with engine.begin() as conn:
+        if conn.dialect.name == "sqlite" and not conn.connection.dbapi_connection.in_transaction:
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        yield conn
+
+
+def _read_version(conn: Connection) -> int | None:
+    if not inspect(conn).has_table("schema_version"):
+        return None
+    return conn.execute(text("SELECT version FROM schema_version")).scalar() or 0
+
+
+def _write_version(conn: Connection, version: int) -> None:
+    conn.exec_driver_sql("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+    conn.exec_driver_sql("DELETE FROM schema_version")
+    conn.execute(text("INSERT INTO schema_version (version) VALUES (:v)"), {"v": version})
+
+
+def current_version(engine: Engine) -> int | None:
+    with engine.connect() as conn:
+        return _read_version(conn)
+
+
+def run_migrations(engine: Engine) -> int:
+    """Приводит схему БД к последней версии и возвращает итоговую версию"""
+    target = latest_version()
+    if current_version(engine) == target:
+        return target
+
+    with _transaction(engine) as conn:
+        version = _read_version(conn)
+        if version is None:
+            if not inspect(conn).get_table_names():
+                # Пустая БД: создаем схему по моделям сразу в последней версии
+                _create_missing_tables(conn)
+                create_search_index(conn)
+                _write_version(conn, target)
+                logger.info(f"Создана схема БД версии {target}")
+                return target
+            # БД создана до появления schema_version
+            version = 0
+            _write_version(conn, version)
+
+    for number, description, fn in MIGRATIONS:
+        if number <= version:
+            continue
+        with _transaction(engine) as conn:
+            # Другой процесс мог применить миграцию, пока мы ждали блокировку
+            if (_read_version(conn) or 0) >= number:
+                continue
+            logger.info(f"Применяю миграцию {number}: {description}")
+            fn(conn)
+            _write_version(conn, number)
+    logger.info(f"Схема БД обновлена до версии {target}")
+    return target
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, Index, UniqueConstraint
+
+from ..db import Base
+
+
+class ChangeLog(Base):
+    """Последнее изменение каждой сущности пользователя (для /api/sync).
+
+    На сущность хранится одна строка: новая запись перезаписывает версию и
+    операцию, поэтому журнал не растет от правок, а удаления остаются как tombstone.
+    """
+    __tablename__ = "change_log"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    version = Column(Integer, nullable=False)
+    entity = Column(String(16), nullable=False)  # "note", "task", "folder", "deadline", "tag"
+    entity_id = Column(Integer, nullable=False)
+    op = Column(String(8), nullable=False)  # "upsert" | "delete"
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "entity", "entity_id", name="uq_change_log_entity"),
+        Index("ix_change_log_user_version", "user_id", "version"),
+    )
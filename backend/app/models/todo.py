@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Table, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Index, Table, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -11,6 +11,8 @@ task_tag = Table(
     Base.metadata,
     Column("task_id", ForeignKey("tasks.id", ondelete="CASCADE"), primary_key=True),
     Column("tag_id", ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True),
+    # Обратный порядок ключа: фильтр и счетчики по тегам (tag_id -> task_id)
+    Index("ix_task_tag_tag_task", "tag_id", "task_id"),
 )
 
 note_tag = Table(
@@ -18,6 +20,8 @@ note_tag = Table(
     Base.metadata,
     Column("note_id", ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True),
     Column("tag_id", ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True),
+    # Обратный порядок ключа: фильтр и счетчики по тегам (tag_id -> note_id)
+    Index("ix_note_tag_tag_note", "tag_id", "note_id"),
 )
 
 
@@ -25,8 +29,15 @@ class Tag(Base):
     __tablename__ = "tags"
     
     id = Column(Integer, primary_key=True)
-    name = Column(String(64), unique=True, nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    name = Column(String(64), nullable=False)
     color = Column(String(7), nullable=True)  # hex color like #FF5733
+    # Число связей с задачами и заметками; теги с нулем удаляются в фоне
+    usage_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        Index("ix_tags_user_id_name", "user_id", "name", unique=True),
+    )
 
 
 class Task(Base):
@@ -38,10 +49,17 @@ class Task(Base):
     description = Column(Text, nullable=True)
     due_at = Column(DateTime(timezone=True), nullable=True)
     is_completed = Column(Boolean, nullable=False, default=False)
+    # sha256 редактируемых полей и тегов; совпадение - PATCH без записи (NULL - неизвестен)
+    content_hash = Column(String(64), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     tags = relationship("Tag", secondary=task_tag, backref="tasks", lazy="joined")
 
+    __table_args__ = (
+        # Ключ постраничной выдачи задач
+        Index("ix_tasks_user_created", "user_id", "created_at", "id"),
+    )
+
 
 class Folder(Base):
     __tablename__ = "folders"
@@ -63,6 +81,17 @@ class Note(Base):
     folder_id = Column(Integer, ForeignKey("folders.id", ondelete="SET NULL"), nullable=True, index=True)
     title = Column(String(200), nullable=False)
     content = Column(Text, nullable=True)
+    # Превью для списков (fields=summary): начало текста или "выполнено/всего" для todo;
+    # вычисляются при записи content
+    snippet = Column(String(200), nullable=True)
+    content_length = Column(Integer, nullable=False, default=0, server_default="0")
+    # Todo-заметка: пункты хранятся строками TodoItem, content = NULL (JSON собирается при выдаче);
+    # todo_done/todo_total - непустые пункты, пересчитываются при каждом изменении пунктов
+    is_todo = Column(Boolean, nullable=False, default=False, server_default="0")
+    todo_done = Column(Integer, nullable=True)
+    todo_total = Column(Integer, nullable=True)
+    # sha256 заголовка, текста (или пунктов), папки и тегов; совпадение - PATCH без записи
+    content_hash = Column(String(64), nullable=True)
     is_favorite = Column(Boolean, nullable=False, default=False, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
@@ -70,6 +99,28 @@ class Note(Base):
     folder = relationship("Folder", back_populates="notes")
     tags = relationship("Tag", secondary=note_tag, backref="notes", lazy="joined")
     deadline = relationship("Deadline", back_populates="note", uselist=False, cascade="all, delete-orphan")
+    todo_items = relationship(
+        "TodoItem", order_by="TodoItem.position", lazy="selectin", cascade="all, delete-orphan"
+    )
+
+    __table_args__ = (
+        # Ключ сортировки и постраничной выдачи заметок
+        Index("ix_notes_user_favorite_updated", "user_id", "is_favorite", "updated_at", "id"),
+    )
+
+
+class TodoItem(Base):
+    __tablename__ = "todo_items"
+
+    # id задает клиент (как в JSON todo-заметки) и уникален только в пределах заметки;
+    # без rowid строки лежат в порядке ключа (note_id, id) - пункты заметки читаются одним диапазоном
+    note_id = Column(Integer, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True)
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    position = Column(Integer, nullable=False)
+    text = Column(Text, nullable=False, default="")
+    done = Column(Boolean, nullable=False, default=False)
+
+    __table_args__ = {"sqlite_with_rowid": False}
 
 
 class Deadline(Base):
@@ -86,6 +137,11 @@ class Deadline(Base):
     note = relationship("Note", back_populates="deadline")
     notifications = relationship("DeadlineNotification", back_populates="deadline", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Диапазон дней в /api/agenda
+        Index("ix_deadlines_user_deadline", "user_id", "deadline_at"),
+    )
+
 
 class DeadlineNotification(Base):
     __tablename__ = "deadline_notifications"
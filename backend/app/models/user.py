@@ -11,5 +11,7 @@ class User(Base):
     username = Column(String, unique=True, nullable=False, index=True)
     uuid = Column(String, unique=True, nullable=False, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # Растет при каждом изменении данных пользователя (ETag списков, If-Match)
+    data_version = Column(Integer, nullable=False, default=0, server_default="0")
 
 
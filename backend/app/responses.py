@@ -0,0 +1,56 @@
+"""
+Быстрая сериализация ответов списков.
+
+Функции _*_out уже собирают готовые модели ответа, поэтому повторная проверка
+через response_model не нужна: модели сериализуются прямо в байты
+TypeAdapter'ом (pydantic-core), который создается один раз на тип ответа.
+response_model у маршрутов остается для схемы OpenAPI.
+
+Клиент с Accept: application/msgpack получает тот же ответ в msgpack, если
+установлен пакет msgpack (без него ответ остается JSON).
+"""
+from functools import lru_cache
+from typing import Any, List
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+try:
+    import msgpack
+except ImportError:  # msgpack необязателен
+    msgpack = None
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+@lru_cache(maxsize=None)
+def _adapter(content_type) -> TypeAdapter:
+    return TypeAdapter(content_type)
+
+
+def _content_type(content: Any):
+    if isinstance(content, list):
+        return List[type(content[0])] if content else list
+    return type(content)
+
+
+def wants_msgpack(request: Request) -> bool:
+    accept = request.headers.get("accept", "")
+    return msgpack is not None and any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES)
+
+
+def fast_response(request: Request, response: Response, content: Any) -> Response:
+    """Ответ с моделью или списком моделей без повторной проверки через response_model.
+
+    response - объект ответа запроса: заголовки, выставленные зависимостями
+    (ETag, Cache-Control), переносятся в итоговый ответ.
+    """
+    adapter = _adapter(_content_type(content))
+    if wants_msgpack(request):
+        body, media_type = msgpack.packb(adapter.dump_python(content, mode="json")), MSGPACK_MEDIA_TYPES[0]
+    else:
+        body, media_type = adapter.dump_json(content), "application/json"
+    result = Response(body, media_type=media_type)
+    result.headers.update(response.headers)
+    result.headers["Vary"] = "Accept"
+    return result
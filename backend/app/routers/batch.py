@@ -0,0 +1,450 @@
+"""
+Пакетные изменения: POST /api/tasks/batch, /api/notes/batch, /api/deadlines/batch.
+
+Пакет содержит списки операций create/update/delete (для дедлайнов еще
+toggle_notifications) и выполняется в одной транзакции множественными SQL:
+вставка пачкой, одинаковые изменения - одним UPDATE ... WHERE id IN, удаления -
+одним DELETE, теги всех элементов - за один проход. Ошибка отдельной операции
+(нет объекта, неверные данные) не отменяет остальные: она возвращается в
+results со статусом, который вернул бы отдельный запрос.
+
+Версия данных увеличивается один раз, первым record_changes, и только если
+пакет что-то создал, изменил или удалил: пустой пакет, пакет из ошибок и
+обновления, совпавшие с сохраненным content_hash, ничего не пишут и ETag
+клиентов не меняют.
+"""
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Set, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session, joinedload
+
+from ..db import get_db, run_write
+from ..deps import get_current_user, if_match
+from ..models.todo import Deadline, DeadlineNotification, Folder, Note, Task, TodoItem, note_tag, task_tag
+from ..schemas import (
+    BatchItemResult,
+    DeadlineBatch,
+    DeadlineBatchOut,
+    DeadlineBatchResult,
+    NoteBatch,
+    NoteBatchOut,
+    NoteBatchResult,
+    TaskBatch,
+    TaskBatchOut,
+    TaskBatchResult,
+)
+from ..services.data_version import DELETE, record_changes
+from . import crud
+
+router = APIRouter(prefix="/api", tags=["crud"])
+
+_ITEM_OPS = ("create", "update", "delete")
+_DEADLINE_OPS = ("create", "update", "delete", "toggle_notifications")
+
+
+def _failed(result_cls, op: str, index: int, item_id: int | None, error: HTTPException) -> BatchItemResult:
+    return result_cls(op=op, index=index, id=item_id, status=error.status_code, detail=error.detail)
+
+
+def _in_request_order(results: list, ops: Tuple[str, ...]) -> list:
+    return sorted(results, key=lambda result: (ops.index(result.op), result.index))
+
+
+def _load_owned(db: Session, model, user_id: int, ids: Iterable[int]) -> dict:
+    """Объекты пользователя по id одним запросом (с тегами, они нужны для разницы связей)"""
+    ids = list(ids)
+    if not ids:
+        return {}
+    items = db.query(model).options(joinedload(model.tags)).filter(model.user_id == user_id, model.id.in_(ids)).all()
+    return {item.id: item for item in items}
+
+
+def _reload(db: Session, model, ids: List[int]) -> dict:
+    """Перечитывает измененные объекты одним запросом (связи и поля менялись прямым SQL)"""
+    if not ids:
+        return {}
+    items = db.query(model).options(joinedload(model.tags)).populate_existing().filter(model.id.in_(ids)).all()
+    return {item.id: item for item in items}
+
+
+def _apply_updates(db: Session, model, updates: List[Tuple[int, dict]]) -> None:
+    """Одинаковые изменения нескольких строк выполняются одним UPDATE ... WHERE id IN"""
+    groups: Dict[tuple, List[int]] = {}
+    for item_id, values in updates:
+        if values:
+            groups.setdefault(tuple(sorted(values.items())), []).append(item_id)
+    for values, ids in groups.items():
+        db.execute(update(model).where(model.id.in_(ids)).values(dict(values)))
+
+
+def _store_hashes(db: Session, model, hashes: List[Tuple[int, str]]) -> None:
+    """content_hash у измененных строк: разные значения - один executemany (UPDATE по ключу)"""
+    if hashes:
+        db.execute(update(model), [{"id": item_id, "content_hash": value} for item_id, value in hashes])
+
+
+def _check_target(targets: dict, item_id: int, seen: Set[int], deleting: Set[int], not_found: str):
+    """Объект операции update; повторы в пакете и обновление удаляемого объекта - ошибка 400"""
+    item = targets.get(item_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail=not_found)
+    if item_id in seen:
+        raise HTTPException(status_code=400, detail="Объект уже изменяется в этом пакете")
+    if item_id in deleting:
+        raise HTTPException(status_code=400, detail="Объект удаляется в этом же пакете")
+    seen.add(item_id)
+    return item
+
+
+def _collect_deletes(result_cls, targets: dict, ids: List[int], not_found: str, results: list) -> List[int]:
+    deleted: List[int] = []
+    for index, item_id in enumerate(ids):
+        if item_id not in targets or item_id in deleted:
+            results.append(_failed(result_cls, "delete", index, item_id, HTTPException(404, not_found)))
+            continue
+        deleted.append(item_id)
+        results.append(result_cls(op="delete", index=index, id=item_id))
+    return deleted
+
+
+# Tasks
+def _parse_due_at(value: str | None):
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Неверный формат даты: {e}")
+
+
+def _batch_tasks(db: Session, user_id: int, payload: TaskBatch) -> TaskBatchOut:
+    results: List[TaskBatchResult] = []
+    deleting = set(payload.delete)
+    targets = _load_owned(db, Task, user_id, {item.id for item in payload.update} | deleting)
+    tag_changes = []
+
+    created: List[Tuple[TaskBatchResult, Task]] = []
+    for index, item in enumerate(payload.create):
+        try:
+            due_at = _parse_due_at(item.due_at)
+        except HTTPException as e:
+            results.append(_failed(TaskBatchResult, "create", index, None, e))
+            continue
+        tag_names = crud._extract_hashtags(item.tags_text) if item.tags_text else set()
+        # tags=[] - у новой задачи связей нет, без ленивой загрузки при сравнении тегов
+        task = Task(
+            user_id=user_id, title=item.title, description=item.description, due_at=due_at, tags=[],
+            content_hash=crud._task_hash(item.title, item.description, due_at, False, tag_names),
+        )
+        created.append((TaskBatchResult(op="create", index=index), task))
+        if tag_names:
+            tag_changes.append((task, tag_names))
+    if created:
+        db.add_all([task for _, task in created])
+        db.flush()
+    for result, task in created:
+        result.id = task.id
+        results.append(result)
+
+    updates = []
+    hashes = []
+    seen: Set[int] = set()
+    for index, item in enumerate(payload.update):
+        try:
+            task = _check_target(targets, item.id, seen, deleting, "Задача не найдена")
+            # Как в _update_task: None - поле не меняется, пустой due_at - сброс срока
+            values = {}
+            if item.title is not None:
+                values["title"] = item.title
+            if item.description is not None:
+                values["description"] = item.description
+            if item.due_at is not None:
+                values["due_at"] = _parse_due_at(item.due_at)
+            if item.is_completed is not None:
+                values["is_completed"] = item.is_completed
+        except HTTPException as e:
+            results.append(_failed(TaskBatchResult, "update", index, item.id, e))
+            continue
+        results.append(TaskBatchResult(op="update", index=index, id=item.id))
+        tag_names = crud._extract_hashtags(item.tags_text) if item.tags_text is not None else None
+        content_hash = crud._task_hash(
+            values.get("title", task.title),
+            values.get("description", task.description),
+            values.get("due_at", task.due_at),
+            values.get("is_completed", task.is_completed),
+            tag_names if tag_names is not None else {tag.name for tag in task.tags},
+        )
+        if content_hash == task.content_hash:
+            continue  # Ничего не меняется, ответ - сохраненная задача
+        updates.append((item.id, values))
+        hashes.append((item.id, content_hash))
+        if tag_names is not None:
+            tag_changes.append((task, tag_names))
+
+    deleted = _collect_deletes(TaskBatchResult, targets, payload.delete, "Задача не найдена", results)
+
+    _apply_updates(db, Task, updates)
+    _store_hashes(db, Task, hashes)
+    crud._update_tags_for_items(db, user_id, tag_changes, is_note=False)
+    if deleted:
+        crud._release_tags(db, user_id, deleted, is_note=False)
+        db.execute(delete(task_tag).where(task_tag.c.task_id.in_(deleted)))
+        db.execute(delete(Task).where(Task.id.in_(deleted)))
+
+    changed = [task.id for _, task in created] + [task_id for task_id, _ in updates]
+    record_changes(db, user_id, "task", changed)
+    record_changes(db, user_id, "task", deleted, DELETE)
+
+    tasks = {**targets, **_reload(db, Task, changed)}
+    for result in results:
+        if result.status == 200 and result.op != "delete":
+            result.item = crud._task_out(tasks[result.id])
+    return TaskBatchOut(results=_in_request_order(results, _ITEM_OPS))
+
+
+@router.post("/tasks/batch", response_model=TaskBatchOut, dependencies=[Depends(if_match)])
+def batch_tasks(payload: TaskBatch, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """Создает, изменяет и удаляет задачи одной транзакцией"""
+    return run_write(db, _batch_tasks, user.id, payload)
+
+
+# Notes
+def _batch_notes(db: Session, user_id: int, payload: NoteBatch) -> NoteBatchOut:
+    results: List[NoteBatchResult] = []
+    deleting = set(payload.delete)
+    targets = _load_owned(db, Note, user_id, {item.id for item in payload.update} | deleting)
+    tag_changes = []
+    todo_changes = []
+
+    # Папки из пакета проверяются одним запросом
+    update_fields = [item.model_dump(exclude_unset=True) for item in payload.update]
+    folder_ids = {item.folder_id for item in payload.create if item.folder_id is not None}
+    folder_ids |= {fields["folder_id"] for fields in update_fields if fields.get("folder_id") is not None}
+    owned_folders = set(db.scalars(
+        select(Folder.id).where(Folder.user_id == user_id, Folder.id.in_(folder_ids))
+    )) if folder_ids else set()
+    default_folder_id = None
+    if any(item.folder_id is None for item in payload.create):
+        default_folder_id = crud._get_or_create_default_folder(db, user_id)[0].id
+
+    created: List[Tuple[NoteBatchResult, Note]] = []
+    for index, item in enumerate(payload.create):
+        if item.folder_id is not None and item.folder_id not in owned_folders:
+            results.append(_failed(NoteBatchResult, "create", index, None, HTTPException(404, "Папка не найдена")))
+            continue
+        note = Note(user_id=user_id, folder_id=item.folder_id or default_folder_id, title=item.title, tags=[])
+        todo_rows = crud._set_note_content(note, item.content)
+        tag_names = crud._extract_hashtags(item.tags_text) if item.tags_text else set()
+        note.content_hash = crud._note_hash(item.title, note.content, todo_rows, note.folder_id, tag_names)
+        created.append((NoteBatchResult(op="create", index=index), note))
+        if todo_rows is not None:
+            todo_changes.append((note, todo_rows))
+        if tag_names:
+            tag_changes.append((note, tag_names))
+    if created:
+        db.add_all([note for _, note in created])
+        db.flush()
+    for result, note in created:
+        result.id = note.id
+        results.append(result)
+
+    updates = []
+    hashes = []
+    seen: Set[int] = set()
+    for index, (item, fields) in enumerate(zip(payload.update, update_fields)):
+        try:
+            note = _check_target(targets, item.id, seen, deleting, "Заметка не найдена")
+            if fields.get("folder_id") is not None and fields["folder_id"] not in owned_folders:
+                raise HTTPException(status_code=404, detail="Папка не найдена")
+            if item.content_delta is not None:
+                fields["content"] = crud._apply_content_delta(crud._note_content(note), item.content_delta)
+        except HTTPException as e:
+            results.append(_failed(NoteBatchResult, "update", index, item.id, e))
+            continue
+        results.append(NoteBatchResult(op="update", index=index, id=item.id))
+        # Как в _update_note: меняются только переданные поля (в том числе None)
+        values = {key: fields[key] for key in ("title", "folder_id") if key in fields}
+        content, todo_rows = note.content, crud._current_todo_rows(note)
+        if "content" in fields:
+            content_values, todo_rows = crud._note_content_values(fields["content"])
+            content = content_values["content"]
+            values.update(content_values)
+        tag_names = crud._extract_hashtags(fields["tags_text"] or "") if "tags_text" in fields else None
+        content_hash = crud._note_hash(
+            values.get("title", note.title),
+            content,
+            todo_rows,
+            values.get("folder_id", note.folder_id),
+            tag_names if tag_names is not None else {tag.name for tag in note.tags},
+        )
+        if content_hash == note.content_hash:
+            continue  # Ничего не меняется, ответ - сохраненная заметка
+        updates.append((item.id, values))
+        hashes.append((item.id, content_hash))
+        if "content" in fields and (todo_rows is not None or note.is_todo):
+            todo_changes.append((note, todo_rows))
+        if tag_names is not None:
+            tag_changes.append((note, tag_names))
+
+    deleted = _collect_deletes(NoteBatchResult, targets, payload.delete, "Заметка не найдена", results)
+
+    _apply_updates(db, Note, updates)
+    _store_hashes(db, Note, hashes)
+    crud._store_todo_items(db, {note.id: todo_rows for note, todo_rows in todo_changes})
+    crud._update_tags_for_items(db, user_id, tag_changes, is_note=True)
+    deleted_deadlines: List[int] = []
+    if deleted:
+        crud._release_tags(db, user_id, deleted, is_note=True)
+        deleted_deadlines = list(db.scalars(select(Deadline.id).where(Deadline.note_id.in_(deleted))))
+        if deleted_deadlines:
+            db.execute(delete(DeadlineNotification).where(DeadlineNotification.deadline_id.in_(deleted_deadlines)))
+            db.execute(delete(Deadline).where(Deadline.id.in_(deleted_deadlines)))
+        db.execute(delete(note_tag).where(note_tag.c.note_id.in_(deleted)))
+        db.execute(delete(TodoItem).where(TodoItem.note_id.in_(deleted)))
+        db.execute(delete(Note).where(Note.id.in_(deleted)))
+
+    changed = [note.id for _, note in created] + [note_id for note_id, _ in updates]
+    record_changes(db, user_id, "note", changed)
+    record_changes(db, user_id, "note", deleted, DELETE)
+    record_changes(db, user_id, "deadline", deleted_deadlines, DELETE)
+
+    notes = {**targets, **_reload(db, Note, changed)}
+    returned = [result for result in results if result.status == 200 and result.op != "delete"]
+    flagged = crud._notes_with_deadline_notifications(db, [result.id for result in returned])
+    for result in returned:
+        result.item = crud._note_out(notes[result.id], result.id in flagged)
+    return NoteBatchOut(results=_in_request_order(results, _ITEM_OPS))
+
+
+@router.post("/notes/batch", response_model=NoteBatchOut, dependencies=[Depends(if_match)])
+def batch_notes(payload: NoteBatch, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """Создает, изменяет и удаляет заметки одной транзакцией"""
+    return run_write(db, _batch_notes, user.id, payload)
+
+
+# Deadlines
+def _batch_deadlines(db: Session, user_id: int, payload: DeadlineBatch) -> DeadlineBatchOut:
+    results: List[DeadlineBatchResult] = []
+    note_ids = {item.note_id for item in payload.create} | {item.note_id for item in payload.update}
+    note_ids |= set(payload.delete) | set(payload.toggle_notifications)
+    notes = {note.id: note for note in db.query(Note).filter(Note.user_id == user_id, Note.id.in_(note_ids))}
+    deadlines = {d.note_id: d for d in db.query(Deadline).filter(Deadline.note_id.in_(list(notes)))}
+
+    # Одна заметка - одна операция в пакете
+    seen: Set[int] = set()
+
+    def target(note_id: int) -> Deadline:
+        if note_id not in notes:
+            raise HTTPException(status_code=404, detail="Заметка не найдена")
+        if note_id in seen:
+            raise HTTPException(status_code=400, detail="Дедлайн заметки уже изменяется в этом пакете")
+        deadline = deadlines.get(note_id)
+        if deadline is None:
+            raise HTTPException(status_code=404, detail="Дедлайн не найден")
+        return deadline
+
+    created: List[Tuple[DeadlineBatchResult, Deadline]] = []
+    for index, item in enumerate(payload.create):
+        try:
+            if item.note_id not in notes:
+                raise HTTPException(status_code=404, detail="Заметка не найдена")
+            if not notes[item.note_id].is_todo:
+                raise HTTPException(status_code=400, detail="Дедлайн можно создать только для todo-заметок")
+            if item.note_id in deadlines or item.note_id in seen:
+                raise HTTPException(status_code=400, detail="Дедлайн для этой заметки уже существует")
+            deadline_at = crud._parse_deadline_at(item.deadline_at)
+        except HTTPException as e:
+            results.append(_failed(DeadlineBatchResult, "create", index, None, e))
+            continue
+        seen.add(item.note_id)
+        deadline = Deadline(note_id=item.note_id, user_id=user_id, deadline_at=deadline_at, notification_enabled=False)
+        created.append((DeadlineBatchResult(op="create", index=index), deadline))
+
+    changed: List[Deadline] = []
+    reset_ids: List[int] = []
+    for index, item in enumerate(payload.update):
+        try:
+            deadline = target(item.note_id)
+            deadline_at = crud._parse_deadline_at(item.deadline_at) if item.deadline_at is not None else None
+        except HTTPException as e:
+            results.append(_failed(DeadlineBatchResult, "update", index, None, e))
+            continue
+        seen.add(item.note_id)
+        # Те же правила пересчета уведомлений, что в _update_deadline
+        if deadline_at is not None:
+            old_time = deadline.deadline_at
+            if old_time.tzinfo is None:
+                old_time = old_time.replace(tzinfo=timezone.utc)
+            if abs((old_time - deadline_at).total_seconds()) > 1:
+                reset_ids.append(deadline.id)
+            deadline.deadline_at = deadline_at
+        if item.notification_enabled is not None:
+            if item.notification_enabled and not deadline.notification_enabled:
+                reset_ids.append(deadline.id)
+            deadline.notification_enabled = item.notification_enabled
+        changed.append(deadline)
+        results.append(DeadlineBatchResult(op="update", index=index, id=deadline.id))
+
+    removed: List[Deadline] = []
+    for index, note_id in enumerate(payload.delete):
+        try:
+            deadline = target(note_id)
+        except HTTPException as e:
+            results.append(_failed(DeadlineBatchResult, "delete", index, None, e))
+            continue
+        seen.add(note_id)
+        removed.append(deadline)
+        results.append(DeadlineBatchResult(op="delete", index=index, id=deadline.id))
+
+    for index, note_id in enumerate(payload.toggle_notifications):
+        try:
+            deadline = target(note_id)
+        except HTTPException as e:
+            results.append(_failed(DeadlineBatchResult, "toggle_notifications", index, None, e))
+            continue
+        seen.add(note_id)
+        deadline.notification_enabled = not deadline.notification_enabled
+        if deadline.notification_enabled:
+            reset_ids.append(deadline.id)
+        changed.append(deadline)
+        results.append(DeadlineBatchResult(op="toggle_notifications", index=index, id=deadline.id))
+
+    if created:
+        db.add_all([deadline for _, deadline in created])
+    db.flush()
+    for result, deadline in created:
+        result.id = deadline.id
+        results.append(result)
+    changed += [deadline for _, deadline in created]
+
+    # Отправленные уведомления (кроме expired) сбрасываются одним DELETE для всего пакета
+    if reset_ids:
+        db.execute(delete(DeadlineNotification).where(
+            DeadlineNotification.deadline_id.in_(reset_ids),
+            DeadlineNotification.notification_type != "expired"
+        ))
+    removed_ids = [deadline.id for deadline in removed]
+    if removed_ids:
+        db.execute(delete(DeadlineNotification).where(DeadlineNotification.deadline_id.in_(removed_ids)))
+        db.execute(delete(Deadline).where(Deadline.id.in_(removed_ids)))
+
+    # У заметок меняется has_deadline_notifications
+    changed_ids = [deadline.id for deadline in changed]
+    record_changes(db, user_id, "deadline", changed_ids)
+    record_changes(db, user_id, "deadline", removed_ids, DELETE)
+    record_changes(db, user_id, "note", {d.note_id for d in changed} | {d.note_id for d in removed})
+
+    # Перечитываем, чтобы даты в ответе были в том же виде, что у отдельных эндпоинтов
+    reloaded = {
+        d.id: d for d in db.query(Deadline).populate_existing().filter(Deadline.id.in_(changed_ids))
+    } if changed_ids else {}
+    for result in results:
+        if result.status == 200 and result.op != "delete":
+            result.item = crud._deadline_out(reloaded[result.id])
+    return DeadlineBatchOut(results=_in_request_order(results, _DEADLINE_OPS))
+
+
+@router.post("/deadlines/batch", response_model=DeadlineBatchOut, dependencies=[Depends(if_match)])
+def batch_deadlines(payload: DeadlineBatch, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """Создает, изменяет, удаляет дедлайны и переключает уведомления одной транзакцией"""
+    return run_write(db, _batch_deadlines, user.id, payload)
@@ -0,0 +1,67 @@
+"""
+Стартовая загрузка: /api/bootstrap собирает данные главного экрана (папки,
+заметки, избранная заметка, дедлайны, теги, задачи, настройки) одним запросом.
+
+Пользователь и токен проверяются один раз, все разделы читаются в одной сессии
+из пула чтения; section (можно передать несколько раз) ограничивает ответ
+нужными разделами.
+"""
+from typing import List, Literal, get_args
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from ..db import get_read_db
+from ..deps import deadlines_etag, get_current_reader
+from ..schemas import BootstrapOut
+from ..services.read_cache import read_cache
+from . import crud
+from . import settings as settings_router
+
+router = APIRouter(prefix="/api", tags=["bootstrap"])
+
+Section = Literal["folders", "notes", "favorite", "deadlines", "tags", "tasks", "settings"]
+SECTIONS = get_args(Section)
+
+
+def _bootstrap(db: Session, user, sections: set, fields: str = "full") -> BootstrapOut:
+    user_id = user.id
+    result = BootstrapOut(version=user.data_version or 0)
+    flagged = None
+    if "deadlines" in sections:
+        result.deadlines = crud._list_deadlines(db, user_id)
+        # Флаги уведомлений заметок - из уже прочитанных дедлайнов, без отдельного запроса
+        flagged = {d.note_id for d in result.deadlines if d.notification_enabled}
+    if "folders" in sections:
+        result.folders = read_cache.get(user, "folders", crud._list_folders, db, user_id)
+    if "notes" in sections:
+        result.notes = crud._list_notes(db, user_id, fields=fields, flagged=flagged)
+    if "favorite" in sections:
+        if result.notes is not None and fields == "full":
+            # Избранная заметка идет первой в полном списке
+            result.favorite = next((n for n in result.notes if n.is_favorite), None)
+        else:
+            result.favorite = read_cache.get(user, "favorite", crud._get_favorite_note, db, user_id)
+    if "tags" in sections:
+        result.tags = read_cache.get(user, "tags", crud._list_tags, db, user_id)
+    if "tasks" in sections:
+        result.tasks = crud._list_tasks(db, user_id)
+    if "settings" in sections:
+        result.settings = read_cache.get(user, "settings", settings_router._read_settings, db, user_id)
+    return result
+
+
+@router.get(
+    "/bootstrap",
+    response_model=BootstrapOut,
+    response_model_exclude_unset=True,
+    dependencies=[Depends(deadlines_etag)],
+)
+def bootstrap(
+    section: List[Section] | None = Query(None),
+    fields: str = Query("full", pattern="^(full|summary)$"),
+    db: Session = Depends(get_read_db),
+    user=Depends(get_current_reader),
+):
+    """Все разделы главного экрана (или только перечисленные в section); fields - как у /api/notes"""
+    return _bootstrap(db, user, set(section or SECTIONS), fields)
@@ -1,35 +1,120 @@
-from datetime import datetime, timezone
-from typing import List, Set, Tuple
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from collections import Counter
+from typing import Dict, List, Set, Tuple, Union
 import re
+import base64
 import hashlib
 import json
+import logging
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import delete, insert
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.orm import Session, joinedload, load_only, noload
+from sqlalchemy import (
+    DateTime, String, bindparam, case, delete, exists, func, insert, literal, select, true, tuple_, type_coerce, union_all,
+    update
+)
 
-from ..db import get_db
-from ..deps import get_current_user
-from ..models.todo import Task, Note, Tag, Folder, note_tag, task_tag, Deadline, DeadlineNotification
+from ..db import SessionLocal, get_db, get_read_db, run_write
+from ..responses import fast_response
+from ..services.data_version import DELETE, UPSERT, bump_data_version, record_changes
+from ..services.tag_service import (
+    cached_tag_ids, forget_tag_ids, mark_tags_changed, remember_tag_ids, suggest_tags
+)
+from ..services import write_behind
+from ..services.read_cache import read_cache
+from ..services.write_queue import run_batched_write
+from ..deps import deadlines_etag, defer_writes, get_current_reader, get_current_user, if_match, list_etag
+from ..models.todo import Task, Note, Tag, Folder, TodoItem, note_tag, task_tag, Deadline, DeadlineNotification
 from ..schemas import (
+    ContentDelta,
     TaskCreate,
     TaskOut,
+    TaskPage,
     TaskUpdate,
     NoteCreate,
     NoteOut,
+    NotePage,
+    NoteSummaryOut,
     NoteUpdate,
     TagOut,
     FolderCreate,
     FolderOut,
     FolderUpdate,
+    TodoItemCreate,
+    TodoItemOut,
+    TodoItemsOrder,
+    TodoItemsOut,
+    TodoItemUpdate,
     DeadlineCreate,
     DeadlineUpdate,
     DeadlineOut,
+    AgendaDay,
+    AgendaItem,
+    AgendaOut,
+    FacetCount,
+    NoteFacets,
+    TaskFacets,
 )
 
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api", tags=["crud"])
 
+DEFAULT_PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 200
+
+DEFAULT_SUGGEST_LIMIT = 10
+MAX_SUGGEST_LIMIT = 50
+
+MAX_AGENDA_DAYS = 366
+AGENDA_STATUSES = ("overdue", "today", "active")
+
+# Длина превью обычной заметки в Note.snippet
+NOTE_SNIPPET_LENGTH = 100
+
+# id пунктов todo задает клиент (Number в JS); большие и нецелые заменяются
+MAX_TODO_ITEM_ID = 2 ** 53 - 1
+
+
+def _encode_cursor(values: list) -> str:
+    """Непрозрачный курсор: значения ключа сортировки последней строки страницы"""
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _is_cursor_value(value, kind: type) -> bool:
+    if kind is datetime:
+        # Время хранится строкой; в курсоре - как в БД ("2024-01-01 10:00:00.000000")
+        try:
+            datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            return False
+        return True
+    if kind is int:
+        return isinstance(value, int) and not isinstance(value, bool)
+    return isinstance(value, kind)
+
+
+def _decode_cursor(cursor: str, kinds: Tuple[type, ...]) -> list:
+    """Значения курсора; kinds - типы значений ключа (bool, datetime для времени, int)"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        values = None
+    if (
+        not isinstance(values, list)
+        or len(values) != len(kinds)
+        or not all(_is_cursor_value(value, kind) for value, kind in zip(values, kinds))
+    ):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+    return values
+
+
+def _raw_value(db: Session, column, row_id_column, row_id: int) -> str:
+    """Значение колонки в том виде, в каком оно хранится в БД (для сравнения в курсоре)"""
+    return db.execute(select(type_coerce(column, String)).where(row_id_column == row_id)).scalar_one()
+
 
 def _extract_hashtags(text: str | None) -> Set[str]:
     """Извлекает имена тегов из текста с хэштегами"""
@@ -52,98 +137,613 @@ def _generate_color(name: str) -> str:
     return colors[hash_int % len(colors)]
 
 
-def _get_or_create_tags(db: Session, tag_names: Set[str]) -> List[Tag]:
-    """Получает существующие теги или создает новые"""
+def _get_or_create_tags(db: Session, user_id: int, tag_names: Set[str]) -> List[Tag]:
+    """Получает существующие теги пользователя или создает новые"""
     if not tag_names:
         return []
     
     # Получаем существующие теги
-    existing_tags = db.query(Tag).filter(Tag.name.in_(list(tag_names))).all()
+    existing_tags = db.query(Tag).filter(Tag.user_id == user_id, Tag.name.in_(list(tag_names))).all()
     existing_names = {tag.name for tag in existing_tags}
     
     # Создаем новые теги
     new_tags = []
     for name in tag_names:
         if name not in existing_names:
-            tag = Tag(name=name, color=_generate_color(name))
+            tag = Tag(user_id=user_id, name=name, color=_generate_color(name), usage_count=0)
             db.add(tag)
             new_tags.append(tag)
     
     if new_tags:
         db.flush()  # Сохраняем новые теги, но не коммитим
+        record_changes(db, user_id, "tag", [tag.id for tag in new_tags])
+        mark_tags_changed(db, user_id)
     
     return existing_tags + new_tags
 
 
-def _update_tags_for_item(db: Session, item, tag_names: Set[str], item_id: int, is_note: bool = False):
-    """Обновляет теги для задачи или заметки через прямой SQL"""
-    # Получаем или создаем теги
-    tags = _get_or_create_tags(db, tag_names)
-    
+def _adjust_usage(db: Session, tag_ids, delta: int) -> None:
+    """Меняет usage_count у тегов на delta"""
+    if tag_ids:
+        db.execute(
+            update(Tag)
+            .where(Tag.id.in_(list(tag_ids)))
+            .values(usage_count=Tag.usage_count + delta)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def _adjust_usage_counts(db: Session, counts: Dict[int, int], sign: int) -> None:
+    """Меняет usage_count на sign * counts[tag_id] (одним UPDATE на каждое значение счетчика)"""
+    by_count: Dict[int, List[int]] = {}
+    for tag_id, count in counts.items():
+        by_count.setdefault(count, []).append(tag_id)
+    for count, tag_ids in by_count.items():
+        _adjust_usage(db, tag_ids, sign * count)
+
+
+def _release_tags(db: Session, user_id: int, item_ids, is_note: bool) -> None:
+    """Уменьшает usage_count тегов удаляемых задач или заметок (сами связи удаляются отдельно)"""
+    if isinstance(item_ids, int):
+        item_ids = [item_ids]
+    mark_tags_changed(db, user_id)
+    association_table = note_tag if is_note else task_tag
+    id_column = "note_id" if is_note else "task_id"
+    counts = Counter(db.execute(
+        select(association_table.c.tag_id).where(association_table.c[id_column].in_(list(item_ids)))
+    ).scalars())
+    _adjust_usage_counts(db, counts, -1)
+
+
+def _resolve_tag_ids(db: Session, user_id: int, tag_names: Set[str]) -> Dict[str, int]:
+    """Возвращает id тегов пользователя по именам: из кэша, недостающие - из БД (с созданием)"""
+    cached = cached_tag_ids(user_id)
+    ids = {name: cached[name] for name in tag_names if name in cached}
+    missing = tag_names - ids.keys()
+    if missing:
+        found = {tag.name: tag.id for tag in _get_or_create_tags(db, user_id, missing)}
+        remember_tag_ids(user_id, found)
+        ids.update(found)
+    return ids
+
+
+def _acquire_tags(db: Session, user_id: int, uses: Dict[str, int]) -> Dict[str, int]:
+    """Увеличивает usage_count тегов на число новых связей uses[name] и возвращает id тегов"""
+    ids = _resolve_tag_ids(db, user_id, set(uses))
+    by_count: Dict[int, list] = {}
+    for name, tag_id in ids.items():
+        by_count.setdefault(uses[name], []).append((tag_id, name))
+
+    # Условие по (id, name) и user_id проверяет, что закэшированные id еще верны
+    applied = []
+    matched = 0
+    for count, pairs in by_count.items():
+        condition = (Tag.user_id == user_id) & tuple_(Tag.id, Tag.name).in_(pairs)
+        result = db.execute(
+            update(Tag).where(condition).values(usage_count=Tag.usage_count + count)
+            .execution_options(synchronize_session=False)
+        )
+        applied.append((condition, count))
+        matched += result.rowcount
+    if matched == len(ids):
+        return ids
+
+    # Кэш устарел (тег удален сборщиком или создавшая его транзакция откатилась)
+    for condition, count in applied:
+        db.execute(
+            update(Tag).where(condition).values(usage_count=Tag.usage_count - count)
+            .execution_options(synchronize_session=False)
+        )
+    forget_tag_ids(user_id)
+    ids = _resolve_tag_ids(db, user_id, set(uses))
+    _adjust_usage_counts(db, {ids[name]: count for name, count in uses.items()}, 1)
+    return ids
+
+
+def _update_tags_for_items(db: Session, user_id: int, changes: List[Tuple[object, Set[str]]], is_note: bool = False):
+    """Синхронизирует теги нескольких задач или заметок одного пользователя.
+
+    Меняются только добавленные и удаленные связи: одно удаление, одно разрешение
+    имен тегов и одна вставка (executemany) на весь набор.
+    """
     # Определяем промежуточную таблицу
     association_table = note_tag if is_note else task_tag
     id_column = "note_id" if is_note else "task_id"
     
-    # Удаляем все существующие связи
-    db.execute(delete(association_table).where(association_table.c[id_column] == item_id))
+    removed_links = []
+    released: Counter = Counter()
+    added_links = []
+    uses: Counter = Counter()
+    for item, tag_names in changes:
+        # item.tags загружен вместе с объектом (joinedload), у нового объекта он пуст
+        current = {tag.name: tag.id for tag in item.tags}
+        if current.keys() == tag_names:
+            continue
+        for name in current.keys() - tag_names:
+            removed_links.append((item.id, current[name]))
+            released[current[name]] += 1
+        for name in tag_names - current.keys():
+            added_links.append((item.id, name))
+            uses[name] += 1
+    
+    if removed_links or added_links:
+        mark_tags_changed(db, user_id)
+    
+    if removed_links:
+        db.execute(delete(association_table).where(
+            tuple_(association_table.c[id_column], association_table.c.tag_id).in_(removed_links)
+        ))
+        _adjust_usage_counts(db, released, -1)
     
-    # Добавляем новые связи
-    if tags:
-        values = [{id_column: item_id, "tag_id": tag.id} for tag in tags]
-        db.execute(insert(association_table).values(values))
+    if added_links:
+        ids = _acquire_tags(db, user_id, uses)
+        db.execute(
+            insert(association_table),
+            [{id_column: item_id, "tag_id": ids[name]} for item_id, name in added_links]
+        )
     
     db.flush()
 
 
+def _update_tags_for_item(db: Session, item, tag_names: Set[str], item_id: int, is_note: bool = False):
+    """Синхронизирует теги одной задачи или заметки"""
+    _update_tags_for_items(db, item.user_id, [(item, tag_names)], is_note)
+
+
+# Модели ответа собираются через model_construct: значения уже нужных типов,
+# проверка (и model_validator у FolderOut) здесь лишняя
+def _tag_out(tag: Tag) -> TagOut:
+    return TagOut.model_construct(id=tag.id, name=tag.name, color=tag.color)
+
+
+def _task_out(task: Task) -> TaskOut:
+    return TaskOut.model_construct(
+        id=task.id,
+        title=task.title,
+        description=task.description,
+        due_at=task.due_at.isoformat() if task.due_at else None,
+        is_completed=task.is_completed,
+        tags=[_tag_out(tag) for tag in (task.tags or [])]
+    )
+
+
+def _folder_out(folder: Folder) -> FolderOut:
+    return FolderOut.model_construct(
+        id=folder.id,
+        name=folder.name,
+        is_default=folder.is_default,
+        created_at=folder.created_at.isoformat() if folder.created_at else ""
+    )
+
+
+def _note_content(note: Note) -> str | None:
+    """content заметки в том виде, в котором его видит клиент"""
+    return _todo_content(note.todo_items) if note.is_todo else note.content
+
+
+def _note_out(note: Note, has_deadline_notifications: bool) -> NoteOut:
+    return NoteOut.model_construct(
+        id=note.id,
+        title=note.title,
+        content=_note_content(note),
+        folder_id=note.folder_id,
+        is_favorite=note.is_favorite if hasattr(note, 'is_favorite') else False,
+        tags=[_tag_out(tag) for tag in (note.tags or [])],
+        has_deadline_notifications=has_deadline_notifications
+    )
+
+
+def _note_summary_out(note: Note, has_deadline_notifications: bool) -> NoteSummaryOut:
+    return NoteSummaryOut.model_construct(
+        id=note.id,
+        title=note.title,
+        folder_id=note.folder_id,
+        is_favorite=note.is_favorite,
+        snippet=note.snippet,
+        content_length=note.content_length or 0,
+        todo_done=note.todo_done,
+        todo_total=note.todo_total,
+        tags=[_tag_out(tag) for tag in (note.tags or [])],
+        has_deadline_notifications=has_deadline_notifications
+    )
+
+
+def _todo_items(content: str | None) -> list | None:
+    """Пункты todo-заметки или None, если content не todo-список"""
+    if not content:
+        return None
+    try:
+        parsed = json.loads(content)
+    except ValueError:
+        return None
+    if isinstance(parsed, dict) and parsed.get("type") == "todo" and isinstance(parsed.get("items"), list):
+        return parsed["items"]
+    return None
+
+
+def _todo_rows(items: list) -> List[dict]:
+    """Пункты из JSON для todo_items (та же логика, что в миграции 9).
+
+    id пункта сохраняется, если это целое число, уникальное в списке; остальные
+    пункты получают новые id после максимального.
+    """
+    items = [item for item in items if isinstance(item, dict)]
+    kept: Set[int] = set()
+    ids = []
+    for item in items:
+        item_id = item.get("id")
+        valid = (
+            isinstance(item_id, int) and not isinstance(item_id, bool)
+            and 0 < item_id <= MAX_TODO_ITEM_ID and item_id not in kept
+        )
+        if valid:
+            kept.add(item_id)
+        ids.append(item_id if valid else None)
+    next_id = max(kept, default=0)
+    rows = []
+    for position, (item, item_id) in enumerate(zip(items, ids)):
+        if item_id is None:
+            next_id += 1
+            item_id = next_id
+        text = item.get("text")
+        if not isinstance(text, str):
+            text = "" if text is None else json.dumps(text, ensure_ascii=False)
+        rows.append({"id": item_id, "position": position, "text": text, "done": bool(item.get("completed"))})
+    return rows
+
+
+def _todo_content(items) -> str:
+    """content todo-заметки в прежнем JSON-формате (так же его сериализует фронтенд)"""
+    return json.dumps(
+        {"type": "todo", "items": [{"id": i.id, "text": i.text, "completed": bool(i.done)} for i in items]},
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+
+
+def _note_content_values(content: str | None) -> Tuple[dict, List[dict] | None]:
+    """Значения колонок заметки для нового content и пункты, если это todo-список.
+
+    У todo-заметки content не хранится: пункты записывает _store_todo_items, он же
+    пересчитывает snippet, content_length и счетчики. Для обычной заметки snippet и
+    content_length считаются здесь (та же логика, что в миграции 4).
+    """
+    items = _todo_items(content)
+    if items is not None:
+        return {"content": None, "is_todo": True}, _todo_rows(items)
+    return {
+        "content": content,
+        "snippet": content[:NOTE_SNIPPET_LENGTH] if content is not None else None,
+        "content_length": len(content) if content else 0,
+        "is_todo": False,
+        "todo_done": None,
+        "todo_total": None,
+    }, None
+
+
+def _set_note_content(note: Note, content: str | None) -> List[dict] | None:
+    """Записывает content в заметку; возвращает пункты для _store_todo_items (None - не todo)"""
+    values, rows = _note_content_values(content)
+    for key, value in values.items():
+        setattr(note, key, value)
+    return rows
+
+
+def _content_hash(content: str | None) -> str:
+    return hashlib.sha256((content or "").encode()).hexdigest()
+
+
+def _fields_hash(fields: list) -> str:
+    return hashlib.sha256(json.dumps(fields, ensure_ascii=False, separators=(",", ":")).encode()).hexdigest()
+
+
+def _note_hash(title, content, todo_rows: List[dict] | None, folder_id, tag_names) -> str:
+    """Хеш редактируемых полей заметки (Note.content_hash).
+
+    Совпадение с сохраненным хешем значит, что изменение ничего не меняет. У
+    todo-заметки вместо content учитываются пункты.
+    """
+    body = [[row["id"], row["text"], row["done"]] for row in todo_rows] if todo_rows is not None else content
+    return _fields_hash([title, body, folder_id, sorted(tag_names)])
+
+
+def _current_todo_rows(note: Note) -> List[dict] | None:
+    """Сохраненные пункты заметки в виде строк _todo_rows (None - не todo)"""
+    if not note.is_todo:
+        return None
+    return [{"id": item.id, "text": item.text, "done": bool(item.done)} for item in note.todo_items]
+
+
+def _task_hash(title, description, due_at: datetime | None, is_completed, tag_names) -> str:
+    """Хеш редактируемых полей задачи (Task.content_hash).
+
+    Срок сравнивается без часового пояса - так его возвращает SQLite.
+    """
+    due = due_at.replace(tzinfo=None).isoformat() if due_at else None
+    return _fields_hash([title, description, due, bool(is_completed), sorted(tag_names)])
+
+
+def _apply_content_delta(content: str | None, delta: ContentDelta) -> str:
+    """Применяет правки content_delta к текущему content.
+
+    409 - клиент правил другую версию текста (или результат не сошелся с
+    result_hash): ему нужно отправить content целиком.
+    """
+    if _content_hash(content) != delta.base_hash.lower():
+        raise HTTPException(status_code=409, detail="Текст заметки изменился, отправьте content целиком")
+    # Позиции в единицах UTF-16: работаем с байтами UTF-16-LE (по 2 байта на единицу)
+    text = bytearray((content or "").encode("utf-16-le"))
+    for op in delta.ops:
+        start = op.at * 2
+        end = start + op.delete * 2
+        if end > len(text):
+            raise HTTPException(status_code=400, detail="Правка выходит за границы текста")
+        text[start:end] = op.insert.encode("utf-16-le", "surrogatepass")
+    try:
+        result = text.decode("utf-16-le")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Правка разрезает символ")
+    if delta.result_hash is not None and _content_hash(result) != delta.result_hash.lower():
+        raise HTTPException(status_code=409, detail="Результат правок не совпал с result_hash, отправьте content целиком")
+    return result
+
+
+def _store_todo_items(db: Session, contents: Dict[int, List[dict] | None]) -> None:
+    """Приводит пункты заметок к переданным спискам (None - пунктов нет) и пересчитывает прогресс.
+
+    Пишутся только отличия от сохраненных пунктов, поэтому повторная отправка
+    всего списка с одной новой галочкой - это один UPDATE одного пункта.
+    """
+    if not contents:
+        return
+    existing = {
+        (row.note_id, row.id): row
+        for row in db.execute(
+            select(TodoItem.note_id, TodoItem.id, TodoItem.position, TodoItem.text, TodoItem.done)
+            .where(TodoItem.note_id.in_(list(contents)))
+        )
+    }
+    wanted = {
+        (note_id, row["id"]): {"note_id": note_id, **row}
+        for note_id, rows in contents.items() for row in rows or []
+    }
+    removed = [key for key in existing if key not in wanted]
+    added = [row for key, row in wanted.items() if key not in existing]
+    # Строки группируются по набору измененных колонок: в SET попадают только они,
+    # и триггер индекса поиска (UPDATE OF text) не срабатывает на галочках и порядке
+    changed: Dict[Tuple[str, ...], List[dict]] = {}
+    for key, row in wanted.items():
+        old = existing.get(key)
+        if old is None:
+            continue
+        columns = tuple(column for column in ("position", "text", "done") if getattr(old, column) != row[column])
+        if columns:
+            changed.setdefault(columns, []).append({"note_id": row["note_id"], "id": row["id"], **{c: row[c] for c in columns}})
+
+    if removed:
+        db.execute(delete(TodoItem).where(tuple_(TodoItem.note_id, TodoItem.id).in_(removed)))
+    if added:
+        db.execute(insert(TodoItem), added)
+    for rows in changed.values():
+        db.execute(update(TodoItem), rows)
+    _refresh_todo_progress(db, [note_id for note_id, rows in contents.items() if rows is not None])
+
+
+def _refresh_todo_progress(
+    db: Session, note_ids: List[int], touch: bool = True, reset_hash: bool = False
+) -> Dict[int, Tuple[int, int]]:
+    """Пересчитывает по пунктам todo_done/todo_total, snippet ("выполнено/всего") и content_length.
+
+    Как в превью фронтенда, пункты с пустым текстом не считаются. touch=False
+    оставляет updated_at (отметка пункта не поднимает заметку в списке);
+    reset_hash сбрасывает content_hash, если пункты менялись в обход
+    _update_note (хеш пересчитается при следующем сохранении заметки).
+    Возвращает {id заметки: (выполнено, всего)}.
+    """
+    if not note_ids:
+        return {}
+    items: Dict[int, list] = {note_id: [] for note_id in note_ids}
+    for row in db.execute(
+        select(TodoItem.note_id, TodoItem.id, TodoItem.text, TodoItem.done)
+        .where(TodoItem.note_id.in_(note_ids))
+        .order_by(TodoItem.note_id, TodoItem.position)
+    ):
+        items[row.note_id].append(row)
+
+    progress: Dict[int, Tuple[int, int]] = {}
+    params = []
+    for note_id, rows in items.items():
+        filled = [row for row in rows if row.text.strip()]
+        done = sum(1 for row in filled if row.done)
+        progress[note_id] = (done, len(filled))
+        params.append({
+            "note_id": note_id,
+            "todo_done": done,
+            "todo_total": len(filled),
+            "snippet": f"{done}/{len(filled)}",
+            "content_length": len(_todo_content(rows)),
+        })
+    notes = Note.__table__
+    stmt = update(notes).where(notes.c.id == bindparam("note_id"))
+    if not touch:
+        stmt = stmt.values(updated_at=notes.c.updated_at)
+    if reset_hash:
+        stmt = stmt.values(content_hash=None)
+    db.execute(stmt, params)
+    return progress
+
+
+def _load_task(db: Session, task_id: int) -> Task | None:
+    """Перечитывает задачу с тегами (связи меняются прямым SQL, поэтому populate_existing)"""
+    return db.query(Task).options(joinedload(Task.tags)).populate_existing().filter(Task.id == task_id).first()
+
+
+def _load_note(db: Session, note_id: int) -> Note | None:
+    """Перечитывает заметку с тегами (связи меняются прямым SQL, поэтому populate_existing)"""
+    return db.query(Note).options(joinedload(Note.tags)).populate_existing().filter(Note.id == note_id).first()
+
+
+def _has_deadline_notifications(db: Session, note_id: int) -> bool:
+    """Проверяет, есть ли у заметки дедлайн с включенными уведомлениями"""
+    deadline = db.query(Deadline).filter(
+        Deadline.note_id == note_id,
+        Deadline.notification_enabled == True
+    ).first()
+    return deadline is not None
+
+
 # Tags
-@router.get("/tags", response_model=List[TagOut])
-def list_tags(db: Session = Depends(get_db), user=Depends(get_current_user)):
-    return db.query(Tag).order_by(Tag.name.asc()).all()
+def _notes_with_deadline_notifications(db: Session, note_ids: List[int]) -> Set[int]:
+    """id заметок из списка, у которых есть дедлайн с включенными уведомлениями"""
+    if not note_ids:
+        return set()
+    return {row.note_id for row in db.query(Deadline.note_id).filter(
+        Deadline.note_id.in_(note_ids),
+        Deadline.notification_enabled == True
+    )}
+
+
+def _list_tags(db: Session, user_id: int) -> List[TagOut]:
+    # Покрывается индексом ix_tags_user_id_name
+    tags = db.query(Tag).filter(Tag.user_id == user_id).order_by(Tag.name.asc()).all()
+    return [_tag_out(tag) for tag in tags]
+
+
+@router.get("/tags", response_model=List[TagOut], dependencies=[Depends(list_etag)])
+def list_tags(db: Session = Depends(get_read_db), user=Depends(get_current_reader)):
+    return read_cache.get(user, "tags", _list_tags, db, user.id)
+
+
+def _suggest_tags(db: Session, user_id: int, prefix: str = "", limit: int = DEFAULT_SUGGEST_LIMIT) -> List[TagOut]:
+    # Теги хранятся в нижнем регистре (см. _extract_hashtags), решетку фронтенд может прислать вместе с префиксом
+    prefix = prefix.lstrip("#").lower()
+    return [TagOut(id=tag_id, name=name, color=color) for _, tag_id, name, color in suggest_tags(db, user_id, prefix, limit)]
+
+
+@router.get("/tags/suggest", response_model=List[TagOut])
+def suggest_tags_route(
+    prefix: str = Query("", max_length=64),
+    limit: int = Query(DEFAULT_SUGGEST_LIMIT, ge=1, le=MAX_SUGGEST_LIMIT),
+    db: Session = Depends(get_read_db),
+    user=Depends(get_current_reader),
+):
+    """Автодополнение тегов: самые используемые теги, начинающиеся с prefix"""
+    return _suggest_tags(db, user.id, prefix, limit)
+
+
+def _tag_filter(model, association_table, id_column: str, tag_ids: List[int], tag_mode: str = "all"):
+    """Условие фильтра по тегам: all - есть все теги (AND), any - хотя бы один (OR).
+
+    Оба варианта идут по индексу (tag_id, <item>_id) промежуточной таблицы.
+    """
+    tag_ids = set(tag_ids)
+    item_column = association_table.c[id_column]
+    if tag_mode == "any" or len(tag_ids) == 1:
+        return exists().where((item_column == model.id) & association_table.c.tag_id.in_(tag_ids))
+    return model.id.in_(
+        select(item_column)
+        .where(association_table.c.tag_id.in_(tag_ids))
+        .group_by(item_column)
+        .having(func.count() == len(tag_ids))
+    )
 
 
 # Tasks
-@router.get("/tasks", response_model=List[TaskOut])
-def list_tasks(tag_id: int | None = None, db: Session = Depends(get_db), user=Depends(get_current_user)):
+def _tasks_query(db: Session, user_id: int, tag_ids: List[int] | None = None, tag_mode: str = "all"):
     query = db.query(Task).options(joinedload(Task.tags)).filter(
-        Task.user_id == user.id
+        Task.user_id == user_id
     )
     
-    # Фильтр по тегу
-    if tag_id is not None:
-        # Используем exists для более надежной фильтрации
-        from sqlalchemy import exists
-        query = query.filter(
-            exists().where(
-                (task_tag.c.task_id == Task.id) & 
-                (task_tag.c.tag_id == tag_id)
-            )
-        )
+    # Фильтр по тегам
+    if tag_ids:
+        query = query.filter(_tag_filter(Task, task_tag, "task_id", tag_ids, tag_mode))
     
-    tasks = query.order_by(Task.created_at.desc()).all()
-    
-    result = []
-    for t in tasks:
-        # Явно преобразуем теги
-        tags_list = [TagOut(id=tag.id, name=tag.name, color=tag.color) for tag in (t.tags or [])]
-        result.append(TaskOut(
-            id=t.id,
-            title=t.title,
-            description=t.description,
-            due_at=t.due_at.isoformat() if t.due_at else None,
-            is_completed=t.is_completed,
-            tags=tags_list
-        ))
-    return result
+    return query.order_by(Task.created_at.desc(), Task.id.desc())
 
 
-@router.post("/tasks", response_model=TaskOut)
-def create_task(payload: TaskCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+def _list_tasks(
+    db: Session,
+    user_id: int,
+    tag_ids: List[int] | None = None,
+    limit: int | None = None,
+    cursor: str | None = None,
+    tag_mode: str = "all",
+) -> Union[List[TaskOut], TaskPage]:
+    query = _tasks_query(db, user_id, tag_ids, tag_mode)
+    if limit is None and cursor is None:
+        return [_task_out(t) for t in query.all()]
+
+    # Постраничный режим: ключ (created_at, id) по индексу ix_tasks_user_created
+    limit = limit or DEFAULT_PAGE_LIMIT
+    created_raw = type_coerce(Task.created_at, String)
+    if cursor:
+        created_at, task_id = _decode_cursor(cursor, (datetime, int))
+        query = query.filter(tuple_(created_raw, Task.id) < tuple_(created_at, task_id))
+    tasks = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        last = tasks[-1]
+        next_cursor = _encode_cursor([_raw_value(db, Task.created_at, Task.id, last.id), last.id])
+    return TaskPage(items=[_task_out(t) for t in tasks], next_cursor=next_cursor, limit=limit)
+
+
+@router.get("/tasks", response_model=Union[List[TaskOut], TaskPage], dependencies=[Depends(list_etag)])
+def list_tasks(
+    request: Request,
+    response: Response,
+    tag_id: List[int] | None = Query(None),
+    tag_mode: str = Query("all", pattern="^(all|any)$"),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+    cursor: str | None = None,
+    db: Session = Depends(get_read_db),
+    user=Depends(get_current_reader),
+):
+    """Без limit и cursor возвращает все задачи списком, иначе - страницу TaskPage.
+    tag_id можно передать несколько раз: tag_mode=all - задачи со всеми тегами, any - с любым"""
+    return fast_response(request, response, _list_tasks(db, user.id, tag_id, limit, cursor, tag_mode))
+
+
+def _task_facets(db: Session, user_id: int, tag_ids: List[int] | None = None, tag_mode: str = "all") -> TaskFacets:
+    """Число задач по фильтру и по каждому тегу - одним запросом с группировкой"""
+    matched = select(Task.id).where(Task.user_id == user_id)
+    if tag_ids:
+        matched = matched.where(_tag_filter(Task, task_tag, "task_id", tag_ids, tag_mode))
+    matched = matched.cte("matched")
+    rows = db.execute(union_all(
+        select(literal("tag"), task_tag.c.tag_id, func.count())
+        .select_from(matched.join(task_tag, task_tag.c.task_id == matched.c.id))
+        .group_by(task_tag.c.tag_id),
+        select(literal("total"), literal(None), func.count()).select_from(matched),
+    )).all()
+    return TaskFacets(
+        total=next(count for kind, _, count in rows if kind == "total"),
+        tags=[FacetCount(id=tag_id, count=count) for kind, tag_id, count in rows if kind == "tag"],
+    )
+
+
+@router.get("/tasks/facets", response_model=TaskFacets, dependencies=[Depends(list_etag)])
+def task_facets(
+    tag_id: List[int] | None = Query(None),
+    tag_mode: str = Query("all", pattern="^(all|any)$"),
+    db: Session = Depends(get_read_db),
+    user=Depends(get_current_reader),
+):
+    """Счетчики задач по тегам для текущего фильтра (для боковой панели)"""
+    return _task_facets(db, user.id, tag_id, tag_mode)
+
+
+def _create_task(db: Session, user_id: int, payload: TaskCreate) -> TaskOut:
+    bump_data_version(db, user_id)
     due_dt = datetime.fromisoformat(payload.due_at) if payload.due_at else None
+    tag_names = _extract_hashtags(payload.tags_text) if payload.tags_text else set()
     task = Task(
-        user_id=user.id,
+        user_id=user_id,
         title=payload.title,
         description=payload.description,
-        due_at=due_dt
+        due_at=due_dt,
+        content_hash=_task_hash(payload.title, payload.description, due_dt, False, tag_names)
     )
     
     db.add(task)
@@ -151,77 +751,88 @@ def create_task(payload: TaskCreate, db: Session = Depends(get_db), user=Depends
     task_id = task.id
     
     # Обрабатываем теги ПОСЛЕ добавления задачи в сессию
-    if payload.tags_text:
-        tag_names = _extract_hashtags(payload.tags_text)
+    if tag_names:
         _update_tags_for_item(db, task, tag_names, task_id, is_note=False)
     
-    db.commit()
-    
+    record_changes(db, user_id, "task", [task_id])
     # Перезагружаем с тегами
-    task = db.query(Task).options(joinedload(Task.tags)).filter(Task.id == task_id).first()
-    
-    tags_list = [TagOut(id=tag.id, name=tag.name, color=tag.color) for tag in (task.tags or [])]
-    return TaskOut(
-        id=task.id,
-        title=task.title,
-        description=task.description,
-        due_at=task.due_at.isoformat() if task.due_at else None,
-        is_completed=task.is_completed,
-        tags=tags_list
-    )
+    return _task_out(_load_task(db, task_id))
 
 
-@router.patch("/tasks/{task_id}", response_model=TaskOut)
-def update_task(task_id: int, payload: TaskUpdate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+@router.post("/tasks", response_model=TaskOut)
+def create_task(payload: TaskCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    return run_write(db, _create_task, user.id, payload)
+
+
+def _update_task(db: Session, user_id: int, task_id: int, payload: TaskUpdate) -> TaskOut:
     task = db.query(Task).options(joinedload(Task.tags)).filter(
         Task.id == task_id,
-        Task.user_id == user.id
+        Task.user_id == user_id
     ).first()
     
     if task is None:
         raise HTTPException(status_code=404, detail="Задача не найдена")
     
+    # None - поле не меняется, пустой due_at - сброс срока
+    due_at = task.due_at
+    if payload.due_at is not None:
+        due_at = datetime.fromisoformat(payload.due_at) if payload.due_at else None
+    tag_names = _extract_hashtags(payload.tags_text) if payload.tags_text is not None else None
+    content_hash = _task_hash(
+        payload.title if payload.title is not None else task.title,
+        payload.description if payload.description is not None else task.description,
+        due_at,
+        payload.is_completed if payload.is_completed is not None else task.is_completed,
+        tag_names if tag_names is not None else {tag.name for tag in task.tags},
+    )
+    # Изменение ничего не меняет: без записи и без новой версии данных
+    if content_hash == task.content_hash:
+        return _task_out(task)
+
+    bump_data_version(db, user_id)
     # Обновляем поля
     if payload.title is not None:
         task.title = payload.title
     if payload.description is not None:
         task.description = payload.description
     if payload.due_at is not None:
-        task.due_at = datetime.fromisoformat(payload.due_at) if payload.due_at else None
+        task.due_at = due_at
     if payload.is_completed is not None:
         task.is_completed = payload.is_completed
+    task.content_hash = content_hash
     
     # Обновляем теги
-    if payload.tags_text is not None:
-        tag_names = _extract_hashtags(payload.tags_text)
+    if tag_names is not None:
         _update_tags_for_item(db, task, tag_names, task_id, is_note=False)
     
-    db.commit()
+    db.flush()
+    record_changes(db, user_id, "task", [task_id])
     
     # Перезагружаем с тегами
-    task = db.query(Task).options(joinedload(Task.tags)).filter(Task.id == task_id).first()
-    
-    tags_list = [TagOut(id=tag.id, name=tag.name, color=tag.color) for tag in (task.tags or [])]
-    return TaskOut(
-        id=task.id,
-        title=task.title,
-        description=task.description,
-        due_at=task.due_at.isoformat() if task.due_at else None,
-        is_completed=task.is_completed,
-        tags=tags_list
-    )
+    return _task_out(_load_task(db, task_id))
 
 
-@router.delete("/tasks/{task_id}")
-def delete_task(task_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
+@router.patch("/tasks/{task_id}", response_model=TaskOut, dependencies=[Depends(if_match)])
+def update_task(task_id: int, payload: TaskUpdate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    return run_batched_write(db, _update_task, user.id, task_id, payload)
+
+
+def _delete_task(db: Session, user_id: int, task_id: int) -> dict:
+    bump_data_version(db, user_id)
     task = db.get(Task, task_id)
-    if task is None or task.user_id != user.id:
+    if task is None or task.user_id != user_id:
         raise HTTPException(status_code=404, detail="Задача не найдена")
+    _release_tags(db, user_id, task_id, is_note=False)
     db.delete(task)
-    db.commit()
+    record_changes(db, user_id, "task", [task_id], DELETE)
     return {"ok": True}
 
 
+@router.delete("/tasks/{task_id}")
+def delete_task(task_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    return run_write(db, _delete_task, user.id, task_id)
+
+
 # Folders
 def _get_or_create_default_folder(db: Session, user_id: int, commit_if_new: bool = False) -> Tuple[Folder, bool]:
     """Получает или создает папку 'Все' для пользователя
@@ -245,6 +856,7 @@ def _get_or_create_default_folder(db: Session, user_id: int, commit_if_new: bool
             db.add(default_folder)
             db.flush()  # Используем flush вместо commit, чтобы не нарушать транзакцию
             db.refresh(default_folder)
+            record_changes(db, user_id, "folder", [default_folder.id])
             was_created = True
             if commit_if_new:
                 db.commit()
@@ -254,57 +866,83 @@ def _get_or_create_default_folder(db: Session, user_id: int, commit_if_new: bool
         
         return default_folder, was_created
     except Exception as e:
-        import traceback
-        print(f"Error in _get_or_create_default_folder: {e}")
-        print(traceback.format_exc())
+        logger.exception(f"Ошибка в _get_or_create_default_folder (пользователь {user_id}): {e}")
         raise
 
 
-@router.get("/folders", response_model=List[FolderOut])
-def list_folders(db: Session = Depends(get_db), user=Depends(get_current_user)):
-    # Убеждаемся что папка "Все" существует
-    _, was_created = _get_or_create_default_folder(db, user.id, commit_if_new=True)
-    
-    folders = db.query(Folder).filter(
-        Folder.user_id == user.id
-    ).order_by(Folder.is_default.desc(), Folder.created_at.asc()).all()
-    
-    result = []
-    for f in folders:
-        result.append(FolderOut(
-            id=f.id,
-            name=f.name,
-            is_default=f.is_default,
-            created_at=f.created_at.isoformat() if f.created_at else ""
-        ))
-    return result
+def _ensure_default_folder(db: Session, user_id: int) -> None:
+    """Убеждается, что папка "Все" существует.
+
+    Сессия может быть только для чтения, поэтому папка (один раз на пользователя)
+    создается в отдельной сессии из пула записи.
+    """
+    has_default = db.query(Folder.id).filter(
+        Folder.user_id == user_id,
+        Folder.is_default == True
+    ).first() is not None
+    if has_default:
+        return
+    _create_default_folder(user_id)
 
 
-@router.post("/folders", response_model=FolderOut)
-def create_folder(payload: FolderCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+def _create_default_folder(user_id: int) -> None:
+    """Создает папку "Все" в отдельной сессии из пула записи (через общий писатель, если он включен)"""
+    with SessionLocal() as write_db:
+        # Версия данных увеличивается в record_changes при создании папки
+        run_batched_write(write_db, _get_or_create_default_folder, user_id)
+
+
+def _list_folders(db: Session, user_id: int, create_default: bool = True) -> List[FolderOut] | None:
+    """Папки пользователя; без папки "Все" при create_default=False возвращает None,
+    чтобы асинхронный эндпоинт создал ее вне цикла событий"""
+    query = db.query(Folder).filter(
+        Folder.user_id == user_id
+    ).order_by(Folder.is_default.desc(), Folder.created_at.asc())
+    folders = query.all()
+    
+    # Убеждаемся что папка "Все" существует (она первая в списке)
+    if not folders or not folders[0].is_default:
+        if not create_default:
+            return None
+        _ensure_default_folder(db, user_id)
+        folders = query.all()
+    
+    return [_folder_out(f) for f in folders]
+
+
+@router.get("/folders", response_model=List[FolderOut], dependencies=[Depends(list_etag)])
+def list_folders(
+    request: Request, response: Response, db: Session = Depends(get_read_db), user=Depends(get_current_reader)
+):
+    return fast_response(request, response, read_cache.get(user, "folders", _list_folders, db, user.id))
+
+
+def _create_folder(db: Session, user_id: int, payload: FolderCreate) -> FolderOut:
+    bump_data_version(db, user_id)
     folder = Folder(
-        user_id=user.id,
+        user_id=user_id,
         name=payload.name,
         is_default=False
     )
     
     db.add(folder)
-    db.commit()
+    db.flush()
     db.refresh(folder)
+    record_changes(db, user_id, "folder", [folder.id])
     
-    return FolderOut(
-        id=folder.id,
-        name=folder.name,
-        is_default=folder.is_default,
-        created_at=folder.created_at.isoformat() if folder.created_at else ""
-    )
+    return _folder_out(folder)
 
 
-@router.patch("/folders/{folder_id}", response_model=FolderOut)
-def update_folder(folder_id: int, payload: FolderUpdate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+@router.post("/folders", response_model=FolderOut)
+def create_folder(payload: FolderCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    return run_write(db, _create_folder, user.id, payload)
+
+
+def _update_folder(db: Session, user_id: int, folder_id: int, payload: FolderUpdate) -> FolderOut:
+    bump_data_version(db, user_id)
     folder = db.query(Folder).filter(
         Folder.id == folder_id,
-        Folder.user_id == user.id
+        Folder.user_id == user_id
     ).first()
     
     if folder is None:
@@ -316,22 +954,23 @@ def update_folder(folder_id: int, payload: FolderUpdate, db: Session = Depends(g
     if payload.name is not None:
         folder.name = payload.name
     
-    db.commit()
+    db.flush()
     db.refresh(folder)
+    record_changes(db, user_id, "folder", [folder.id])
     
-    return FolderOut(
-        id=folder.id,
-        name=folder.name,
-        is_default=folder.is_default,
-        created_at=folder.created_at.isoformat() if folder.created_at else ""
-    )
+    return _folder_out(folder)
 
 
-@router.delete("/folders/{folder_id}")
-def delete_folder(folder_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
+@router.patch("/folders/{folder_id}", response_model=FolderOut, dependencies=[Depends(if_match)])
+def update_folder(folder_id: int, payload: FolderUpdate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    return run_write(db, _update_folder, user.id, folder_id, payload)
+
+
+def _delete_folder(db: Session, user_id: int, folder_id: int) -> dict:
+    bump_data_version(db, user_id)
     folder = db.query(Folder).filter(
         Folder.id == folder_id,
-        Folder.user_id == user.id
+        Folder.user_id == user_id
     ).first()
     
     if folder is None:
@@ -341,94 +980,130 @@ def delete_folder(folder_id: int, db: Session = Depends(get_db), user=Depends(ge
         raise HTTPException(status_code=400, detail="Нельзя удалить папку 'Все'")
     
     # Перемещаем заметки из удаляемой папки в папку "Все"
-    default_folder, _ = _get_or_create_default_folder(db, user.id, commit_if_new=True)
-    db.query(Note).filter(Note.folder_id == folder_id).update({Note.folder_id: default_folder.id})
+    default_folder, _ = _get_or_create_default_folder(db, user_id)
+    moved_ids = [row.id for row in db.query(Note.id).filter(Note.folder_id == folder_id)]
+    # Папка входит в content_hash заметки: сбрасываем его у перемещенных
+    db.query(Note).filter(Note.folder_id == folder_id).update(
+        {Note.folder_id: default_folder.id, Note.content_hash: None}
+    )
     
     db.delete(folder)
-    db.commit()
+    record_changes(db, user_id, "note", moved_ids)
+    record_changes(db, user_id, "folder", [folder_id], DELETE)
     return {"ok": True}
 
 
+@router.delete("/folders/{folder_id}")
+def delete_folder(folder_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    return run_write(db, _delete_folder, user.id, folder_id)
+
+
 # Notes
-@router.get("/notes", response_model=List[NoteOut])
-def list_notes(folder_id: int | None = None, tag_id: int | None = None, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    try:
-        query = db.query(Note).options(joinedload(Note.tags)).filter(
-            Note.user_id == user.id
-        )
-        
-        # Если folder_id указан, проверяем, является ли это папкой "Все"
-        # Если это папка "Все" (is_default=True), показываем все заметки пользователя
-        # Иначе фильтруем по папке
-        if folder_id is not None:
-            folder = db.query(Folder).filter(
-                Folder.id == folder_id,
-                Folder.user_id == user.id
-            ).first()
-            
-            # Если папка существует и это не папка "Все", фильтруем по папке
-            # Если это папка "Все" (is_default=True), не фильтруем - показываем все заметки
-            if folder and not folder.is_default:
-                query = query.filter(Note.folder_id == folder_id)
-            # Если folder не найдена или это папка "Все", не фильтруем по folder_id
-        
-        # Фильтр по тегу
-        if tag_id is not None:
-            # Используем exists для более надежной фильтрации
-            from sqlalchemy import exists
-            query = query.filter(
-                exists().where(
-                    (note_tag.c.note_id == Note.id) & 
-                    (note_tag.c.tag_id == tag_id)
+def _folder_filter_id(db: Session, user_id: int, folder_id: int | None) -> int | None:
+    """id папки для фильтра заметок или None, если фильтровать по папке не нужно"""
+    if folder_id is None:
+        return None
+    folder = db.query(Folder).filter(
+        Folder.id == folder_id,
+        Folder.user_id == user_id
+    ).first()
+    
+    # Если папка существует и это не папка "Все", фильтруем по папке
+    # Если это папка "Все" (is_default=True) или папка не найдена, не фильтруем - показываем все заметки
+    if folder and not folder.is_default:
+        return folder_id
+    return None
+
+
+def _notes_query(
+    db: Session,
+    user_id: int,
+    folder_id: int | None = None,
+    tag_ids: List[int] | None = None,
+    tag_mode: str = "all",
+):
+    query = db.query(Note).options(joinedload(Note.tags)).filter(
+        Note.user_id == user_id
+    )
+    
+    filter_folder_id = _folder_filter_id(db, user_id, folder_id)
+    if filter_folder_id is not None:
+        query = query.filter(Note.folder_id == filter_folder_id)
+    
+    # Фильтр по тегам
+    if tag_ids:
+        query = query.filter(_tag_filter(Note, note_tag, "note_id", tag_ids, tag_mode))
+    
+    # Сортируем: сначала избранные (только одна), потом по дате обновления
+    return query.order_by(Note.is_favorite.desc(), Note.updated_at.desc(), Note.id.desc())
+
+
+def _list_notes(
+    db: Session,
+    user_id: int,
+    folder_id: int | None = None,
+    tag_ids: List[int] | None = None,
+    limit: int | None = None,
+    cursor: str | None = None,
+    fields: str = "full",
+    tag_mode: str = "all",
+    flagged: Set[int] | None = None,
+) -> Union[List[NoteOut], List[NoteSummaryOut], NotePage]:
+    """flagged - id заметок с включенными уведомлениями дедлайна, если они уже известны"""
+    try:
+        query = _notes_query(db, user_id, folder_id, tag_ids, tag_mode)
+        summary = fields == "summary"
+        if summary:
+            # Без content: читаем только колонки, нужные списку
+            query = query.options(load_only(
+                Note.id, Note.title, Note.folder_id, Note.is_favorite, Note.updated_at,
+                Note.snippet, Note.content_length, Note.todo_done, Note.todo_total,
+            ), noload(Note.todo_items))
+        serialize = _note_summary_out if summary else _note_out
+        paged = limit is not None or cursor is not None
+        next_cursor = None
+        if not paged:
+            notes = query.all()
+        else:
+            # Постраничный режим: ключ (is_favorite, updated_at, id)
+            # по индексу ix_notes_user_favorite_updated
+            limit = limit or DEFAULT_PAGE_LIMIT
+            updated_raw = type_coerce(Note.updated_at, String)
+            if cursor:
+                is_favorite, updated_at, note_id = _decode_cursor(cursor, (bool, datetime, int))
+                query = query.filter(
+                    tuple_(Note.is_favorite, updated_raw, Note.id) < tuple_(is_favorite, updated_at, note_id)
+                )
+            notes = query.limit(limit + 1).all()
+            if len(notes) > limit:
+                notes = notes[:limit]
+                last = notes[-1]
+                next_cursor = _encode_cursor(
+                    [last.is_favorite, _raw_value(db, Note.updated_at, Note.id, last.id), last.id]
                 )
-            )
-        
-        # Сортируем: сначала избранные (только одна), потом по дате обновления
-        notes = query.order_by(Note.is_favorite.desc(), Note.updated_at.desc()).all()
         
         # Получаем все дедлайны с включенными уведомлениями для заметок пользователя
-        note_ids = [n.id for n in notes]
-        deadlines_with_notifications = {}
-        if note_ids:
-            deadlines = db.query(Deadline).filter(
-                Deadline.note_id.in_(note_ids),
-                Deadline.notification_enabled == True
-            ).all()
-            for deadline in deadlines:
-                deadlines_with_notifications[deadline.note_id] = True
+        deadlines_with_notifications = flagged
+        if deadlines_with_notifications is None:
+            deadlines_with_notifications = _notes_with_deadline_notifications(db, [n.id for n in notes])
         
         result = []
         for n in notes:
             try:
-                # Явно преобразуем теги, обрабатывая возможные ошибки
-                tags_list = []
-                if n.tags:
-                    for tag in n.tags:
-                        try:
-                            tags_list.append(TagOut(id=tag.id, name=tag.name, color=tag.color))
-                        except Exception as tag_error:
-                            print(f"Error processing tag {tag.id}: {tag_error}")
-                            continue
-                
                 # Проверяем, есть ли у заметки дедлайн с включенными уведомлениями
-                has_deadline_notifications = deadlines_with_notifications.get(n.id, False)
-                
-                result.append(NoteOut(
-                    id=n.id,
-                    title=n.title,
-                    content=n.content,
-                    folder_id=n.folder_id,
-                    is_favorite=n.is_favorite if hasattr(n, 'is_favorite') else False,
-                    tags=tags_list,
-                    has_deadline_notifications=has_deadline_notifications
-                ))
+                has_deadline_notifications = n.id in deadlines_with_notifications
+                result.append(serialize(n, has_deadline_notifications))
             except Exception as note_error:
                 print(f"Error processing note {n.id}: {note_error}")
                 import traceback
                 traceback.print_exc()
                 continue
         
+        if paged:
+            return NotePage(items=result, next_cursor=next_cursor, limit=limit)
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         print(f"Error in list_notes: {e}")
@@ -436,141 +1111,264 @@ def list_notes(folder_id: int | None = None, tag_id: int | None = None, db: Sess
         raise HTTPException(status_code=500, detail=f"Ошибка при получении заметок: {str(e)}")
 
 
-@router.post("/notes", response_model=NoteOut)
-def create_note(payload: NoteCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+@router.get("/notes", response_model=Union[List[NoteOut], List[NoteSummaryOut], NotePage], dependencies=[Depends(list_etag)])
+def list_notes(
+    request: Request,
+    response: Response,
+    folder_id: int | None = None,
+    tag_id: List[int] | None = Query(None),
+    tag_mode: str = Query("all", pattern="^(all|any)$"),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+    cursor: str | None = None,
+    fields: str = Query("full", pattern="^(full|summary)$"),
+    db: Session = Depends(get_read_db),
+    user=Depends(get_current_reader),
+):
+    """Без limit и cursor возвращает все заметки списком, иначе - страницу NotePage.
+    fields=summary заменяет content на snippet и content_length.
+    tag_id можно передать несколько раз: tag_mode=all - заметки со всеми тегами, any - с любым"""
+    return fast_response(request, response, _list_notes(db, user.id, folder_id, tag_id, limit, cursor, fields, tag_mode))
+
+
+def _note_facets(
+    db: Session,
+    user_id: int,
+    folder_id: int | None = None,
+    tag_ids: List[int] | None = None,
+    tag_mode: str = "all",
+) -> NoteFacets:
+    """Счетчики заметок по тегам и папкам одним запросом с группировкой.
+
+    total и теги считаются по всему фильтру, папки - по фильтру без папки,
+    чтобы боковая панель показывала, сколько заметок будет в каждой папке.
+    """
+    matched = select(Note.id, Note.folder_id).where(Note.user_id == user_id)
+    if tag_ids:
+        matched = matched.where(_tag_filter(Note, note_tag, "note_id", tag_ids, tag_mode))
+    matched = matched.cte("matched")
+    filter_folder_id = _folder_filter_id(db, user_id, folder_id)
+    in_folder = matched.c.folder_id == filter_folder_id if filter_folder_id is not None else true()
+    rows = db.execute(union_all(
+        select(literal("tag"), note_tag.c.tag_id, func.count())
+        .select_from(matched.join(note_tag, note_tag.c.note_id == matched.c.id))
+        .where(in_folder)
+        .group_by(note_tag.c.tag_id),
+        select(literal("folder"), matched.c.folder_id, func.count()).group_by(matched.c.folder_id),
+        select(literal("total"), literal(None), func.count()).select_from(matched).where(in_folder),
+    )).all()
+    return NoteFacets(
+        total=next(count for kind, _, count in rows if kind == "total"),
+        tags=[FacetCount(id=item_id, count=count) for kind, item_id, count in rows if kind == "tag"],
+        folders=[FacetCount(id=item_id, count=count) for kind, item_id, count in rows if kind == "folder"],
+    )
+
+
+@router.get("/notes/facets", response_model=NoteFacets, dependencies=[Depends(list_etag)])
+def note_facets(
+    folder_id: int | None = None,
+    tag_id: List[int] | None = Query(None),
+    tag_mode: str = Query("all", pattern="^(all|any)$"),
+    db: Session = Depends(get_read_db),
+    user=Depends(get_current_reader),
+):
+    """Счетчики заметок по тегам и папкам для текущего фильтра (для боковой панели)"""
+    return _note_facets(db, user.id, folder_id, tag_id, tag_mode)
+
+
+def _create_note(db: Session, user_id: int, payload: NoteCreate) -> NoteOut:
+    bump_data_version(db, user_id)
     try:
-        print(f"Creating note for user {user.id}, payload: {payload}")
-        
         # Если folder_id не указан, используем папку "Все"
         folder_id = payload.folder_id
         if folder_id is None:
-            default_folder, _ = _get_or_create_default_folder(db, user.id)
+            default_folder, _ = _get_or_create_default_folder(db, user_id)
             folder_id = default_folder.id
-            print(f"Using default folder with id: {folder_id}")
         else:
             # Проверяем, что папка существует и принадлежит пользователю
             folder = db.query(Folder).filter(
                 Folder.id == folder_id,
-                Folder.user_id == user.id
+                Folder.user_id == user_id
             ).first()
             if folder is None:
                 raise HTTPException(status_code=404, detail="Папка не найдена")
-            print(f"Using folder with id: {folder_id}")
         
         note = Note(
-            user_id=user.id,
+            user_id=user_id,
             folder_id=folder_id,
-            title=payload.title,
-            content=payload.content
+            title=payload.title
         )
+        todo_rows = _set_note_content(note, payload.content)
+        tag_names = _extract_hashtags(payload.tags_text) if payload.tags_text else set()
+        note.content_hash = _note_hash(payload.title, note.content, todo_rows, folder_id, tag_names)
         
         db.add(note)
         db.flush()  # Сохраняем заметку чтобы получить ID
         note_id = note.id
-        print(f"Note created with id: {note_id}")
+        logger.debug(f"Заметка {note_id} создана (пользователь {user_id}, папка {folder_id})")
+        if todo_rows is not None:
+            _store_todo_items(db, {note_id: todo_rows})
         
         # Обрабатываем теги ПОСЛЕ добавления заметки в сессию
-        if payload.tags_text:
-            tag_names = _extract_hashtags(payload.tags_text)
+        if tag_names:
             _update_tags_for_item(db, note, tag_names, note_id, is_note=True)
         
-        db.commit()
-        print(f"Note committed, reloading...")
-        
+        record_changes(db, user_id, "note", [note_id])
         # Перезагружаем с тегами
-        note = db.query(Note).options(joinedload(Note.tags)).filter(Note.id == note_id).first()
+        note = _load_note(db, note_id)
         
         if note is None:
             raise HTTPException(status_code=500, detail="Не удалось загрузить созданную заметку")
         
-        tags_list = [TagOut(id=tag.id, name=tag.name, color=tag.color) for tag in (note.tags or [])]
-        
-        # Проверяем, есть ли у заметки дедлайн с включенными уведомлениями
-        deadline = db.query(Deadline).filter(
-            Deadline.note_id == note.id,
-            Deadline.notification_enabled == True
-        ).first()
-        has_deadline_notifications = deadline is not None
-        
-        result = NoteOut(
-            id=note.id,
-            title=note.title,
-            content=note.content,
-            folder_id=note.folder_id,
-            is_favorite=note.is_favorite if hasattr(note, 'is_favorite') else False,
-            tags=tags_list,
-            has_deadline_notifications=has_deadline_notifications
-        )
-        print(f"Note created successfully: {result.id}")
-        return result
+        return _note_out(note, _has_deadline_notifications(db, note.id))
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
-        import traceback
-        print(f"Error creating note: {e}")
-        print(traceback.format_exc())
+        logger.exception(f"Ошибка при создании заметки (пользователь {user_id}): {e}")
         raise HTTPException(status_code=500, detail=f"Ошибка при создании заметки: {str(e)}")
 
 
-@router.patch("/notes/{note_id}", response_model=NoteOut)
-def update_note(note_id: int, payload: NoteUpdate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+@router.post("/notes", response_model=NoteOut)
+def create_note(payload: NoteCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    return run_batched_write(db, _create_note, user.id, payload)
+
+
+def _update_note(db: Session, user_id: int, note_id: int, payload: NoteUpdate) -> NoteOut:
     note = db.query(Note).options(joinedload(Note.tags)).filter(
         Note.id == note_id,
-        Note.user_id == user.id
+        Note.user_id == user_id
     ).first()
     
     if note is None:
         raise HTTPException(status_code=404, detail="Заметка не найдена")
     
-    # Обновляем поля
     # Используем exclude_unset=True, чтобы обновлять только переданные поля (включая None)
     payload_dict = payload.dict(exclude_unset=True)
-    
+    if payload.content_delta is not None:
+        payload_dict['content'] = _apply_content_delta(_note_content(note), payload.content_delta)
+    content_values, todo_rows = None, None
+    if 'content' in payload_dict:
+        content_values, todo_rows = _note_content_values(payload_dict['content'])  # None - очистка content
+    # Теги меняются, если tags_text был передан, даже если это пустая строка
+    tag_names = _extract_hashtags(payload_dict['tags_text'] or '') if 'tags_text' in payload_dict else None
+
+    # Итоговое состояние совпадает с сохраненным (фронтенд сохраняет заметку при
+    # каждом переходе): ничего не пишем, версия данных и updated_at не меняются
+    if content_values is None:
+        content, todo_rows = note.content, _current_todo_rows(note)
+    else:
+        content = content_values["content"]
+    content_hash = _note_hash(
+        payload_dict.get('title', note.title),
+        content,
+        todo_rows,
+        payload_dict.get('folder_id', note.folder_id),
+        tag_names if tag_names is not None else {tag.name for tag in note.tags},
+    )
+    if content_hash == note.content_hash:
+        return _note_out(note, _has_deadline_notifications(db, note_id))
+
+    bump_data_version(db, user_id)
+    # Обновляем поля
     if 'title' in payload_dict:
         note.title = payload_dict['title']
-    if 'content' in payload_dict:
-        note.content = payload_dict['content']  # Может быть None для очистки content
+    was_todo = note.is_todo
+    if content_values is not None:
+        for key, value in content_values.items():
+            setattr(note, key, value)
     if 'folder_id' in payload_dict:
         note.folder_id = payload_dict['folder_id']
+    note.content_hash = content_hash
     
-    # Обновляем теги (если tags_text был передан, даже если это пустая строка)
-    if 'tags_text' in payload_dict:
-        tag_names = _extract_hashtags(payload_dict['tags_text'] or '')
+    if tag_names is not None:
         _update_tags_for_item(db, note, tag_names, note_id, is_note=True)
     
-    db.commit()
+    db.flush()
+    if content_values is not None and (todo_rows is not None or was_todo):
+        _store_todo_items(db, {note_id: todo_rows})
+    record_changes(db, user_id, "note", [note_id])
     
     # Перезагружаем с тегами
-    note = db.query(Note).options(joinedload(Note.tags)).filter(Note.id == note_id).first()
-    
-    tags_list = [TagOut(id=tag.id, name=tag.name, color=tag.color) for tag in (note.tags or [])]
-    
-    # Проверяем, есть ли у заметки дедлайн с включенными уведомлениями
-    deadline = db.query(Deadline).filter(
-        Deadline.note_id == note_id,
-        Deadline.notification_enabled == True
-    ).first()
-    has_deadline_notifications = deadline is not None
-    
-    return NoteOut(
-        id=note.id,
-        title=note.title,
-        content=note.content,
-        folder_id=note.folder_id,
-        is_favorite=note.is_favorite if hasattr(note, 'is_favorite') else False,
-        tags=tags_list,
-        has_deadline_notifications=has_deadline_notifications
-    )
+    note = _load_note(db, note_id)
+    return _note_out(note, _has_deadline_notifications(db, note_id))
 
 
-@router.post("/notes/{note_id}/favorite", response_model=NoteOut)
-def toggle_favorite_note(note_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    """Устанавливает заметку в избранное. Если заметка уже в избранном, снимает её. 
-    Если устанавливается новая заметка в избранное, старая автоматически снимается."""
+# Поля автосохранения, которые можно отложить (NOTE_WRITE_BEHIND); теги и папку - нет,
+# для ответа с ними нужны записанные теги и проверка папки
+_DEFERRED_NOTE_FIELDS = {"title", "content", "content_delta"}
+
+
+def _write_deferred_note(db: Session, user_id: int, note_id: int, fields: dict) -> NoteOut:
+    """Записывает накопленные в буфере изменения заметки"""
+    return _update_note(db, user_id, note_id, NoteUpdate(**fields))
+
+
+def _update_note_after_deferred(db: Session, user_id: int, note_id: int, deferred: dict | None, payload: NoteUpdate) -> NoteOut:
+    # Отложенные изменения и новое - одной транзакцией, в порядке поступления
+    if deferred:
+        _update_note(db, user_id, note_id, NoteUpdate(**deferred))
+    return _update_note(db, user_id, note_id, payload)
+
+
+def _defer_note_update(db: Session, user_id: int, note_id: int, payload: NoteUpdate, defer: bool = True) -> NoteOut:
+    """PATCH заметки при отложенной записи: title/content копятся в буфере.
+
+    Ответ - заметка из БД с отложенными полями поверх; content_delta применяется
+    к тексту с учетом еще не записанных правок. defer=False (запрос с If-Match:
+    клиенту нужна новая версия данных) - запись сразу, вместе с отложенной.
+    """
+    # Транзакция загрузки пользователя не должна держать БД, пока ждем буфер
+    # (при SQLITE_BEGIN_MODE=IMMEDIATE она держит блокировку записи)
+    db.rollback()
+    buffer = write_behind.note_buffer
+    fields = payload.dict(exclude_unset=True)
+    with buffer.key_lock(user_id, note_id):
+        error = buffer.take_error(user_id, note_id)
+        if error is not None:
+            # Предыдущие автосохранения уже подтверждены клиенту, но не записаны
+            raise HTTPException(
+                status_code=409,
+                detail=f"Предыдущие изменения заметки не сохранены: {error}. Перечитайте заметку",
+            )
+        if not defer or fields.keys() - _DEFERRED_NOTE_FIELDS:
+            return run_batched_write(
+                db, _update_note_after_deferred, user_id, note_id, buffer.take(user_id, note_id), payload
+            )
+        note = db.query(Note).options(joinedload(Note.tags)).filter(
+            Note.id == note_id,
+            Note.user_id == user_id
+        ).first()
+        if note is None:
+            raise HTTPException(status_code=404, detail="Заметка не найдена")
+        deferred = buffer.get(user_id, note_id) or {}
+        if payload.content_delta is not None:
+            content = deferred["content"] if "content" in deferred else _note_content(note)
+            fields["content"] = _apply_content_delta(content, payload.content_delta)
+            del fields["content_delta"]
+        fields = buffer.put(user_id, note_id, fields)
+        out = _note_out(note, _has_deadline_notifications(db, note_id))
+        db.rollback()
+    if "content" in fields:
+        _, todo_rows = _note_content_values(fields["content"])
+        if todo_rows is not None:
+            # todo-список - в том виде, в котором его вернет чтение
+            fields["content"] = _todo_content([TodoItem(**row) for row in todo_rows])
+    return out.model_copy(update=fields)
+
+
+@router.patch("/notes/{note_id}", response_model=NoteOut, dependencies=[Depends(defer_writes), Depends(if_match)])
+def update_note(
+    note_id: int, payload: NoteUpdate, request: Request, db: Session = Depends(get_db), user=Depends(get_current_user)
+):
+    if write_behind.note_buffer is not None:
+        return _defer_note_update(db, user.id, note_id, payload, "if-match" not in request.headers)
+    return run_batched_write(db, _update_note, user.id, note_id, payload)
+
+
+def _toggle_favorite_note(db: Session, user_id: int, note_id: int) -> NoteOut:
+    bump_data_version(db, user_id)
     note = db.query(Note).filter(
         Note.id == note_id,
-        Note.user_id == user.id
+        Note.user_id == user_id
     ).first()
     
     if note is None:
@@ -588,92 +1386,211 @@ def toggle_favorite_note(note_id: int, db: Session = Depends(get_db), user=Depen
         note.updated_at = note.created_at + timedelta(seconds=1)
     else:
         # Снимаем избранное со всех других заметок пользователя
+        unfavorited_ids = [row.id for row in db.query(Note.id).filter(
+            Note.user_id == user_id,
+            Note.is_favorite == True
+        )]
         db.query(Note).filter(
-            Note.user_id == user.id,
+            Note.user_id == user_id,
             Note.is_favorite == True
         ).update({"is_favorite": False})
+        record_changes(db, user_id, "note", unfavorited_ids)
         # Устанавливаем текущую заметку в избранное
         note.is_favorite = True
         # При установке в избранное НЕ обновляем updated_at,
         # чтобы заметка сохраняла свою позицию
     
-    db.commit()
+    db.flush()
+    record_changes(db, user_id, "note", [note_id])
     
     # Перезагружаем с тегами для ответа
-    note = db.query(Note).options(joinedload(Note.tags)).filter(Note.id == note_id).first()
-    tags_list = [TagOut(id=tag.id, name=tag.name, color=tag.color) for tag in (note.tags or [])]
-    
-    # Проверяем, есть ли у заметки дедлайн с включенными уведомлениями
-    deadline = db.query(Deadline).filter(
-        Deadline.note_id == note_id,
-        Deadline.notification_enabled == True
-    ).first()
-    has_deadline_notifications = deadline is not None
-    
-    return NoteOut(
-        id=note.id,
-        title=note.title,
-        content=note.content,
-        folder_id=note.folder_id,
-        is_favorite=note.is_favorite,
-        tags=tags_list,
-        has_deadline_notifications=has_deadline_notifications
-    )
+    note = _load_note(db, note_id)
+    return _note_out(note, _has_deadline_notifications(db, note_id))
 
 
-@router.get("/notes/favorite", response_model=NoteOut | None)
-def get_favorite_note(db: Session = Depends(get_db), user=Depends(get_current_user)):
-    """Получает избранную заметку пользователя"""
+@router.post("/notes/{note_id}/favorite", response_model=NoteOut)
+def toggle_favorite_note(note_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """Устанавливает заметку в избранное. Если заметка уже в избранном, снимает её. 
+    Если устанавливается новая заметка в избранное, старая автоматически снимается."""
+    return run_write(db, _toggle_favorite_note, user.id, note_id)
+
+
+def _get_favorite_note(db: Session, user_id: int) -> NoteOut | None:
     note = db.query(Note).options(joinedload(Note.tags)).filter(
-        Note.user_id == user.id,
+        Note.user_id == user_id,
         Note.is_favorite == True
     ).first()
     
     if note is None:
         return None
     
-    tags_list = [TagOut(id=tag.id, name=tag.name, color=tag.color) for tag in (note.tags or [])]
-    
-    # Проверяем, есть ли у заметки дедлайн с включенными уведомлениями
-    deadline = db.query(Deadline).filter(
-        Deadline.note_id == note.id,
-        Deadline.notification_enabled == True
-    ).first()
-    has_deadline_notifications = deadline is not None
-    
-    return NoteOut(
-        id=note.id,
-        title=note.title,
-        content=note.content,
-        folder_id=note.folder_id,
-        is_favorite=note.is_favorite,
-        tags=tags_list,
-        has_deadline_notifications=has_deadline_notifications
-    )
+    return _note_out(note, _has_deadline_notifications(db, note.id))
 
 
-@router.delete("/notes/{note_id}")
-def delete_note(note_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
+@router.get("/notes/favorite", response_model=NoteOut | None)
+def get_favorite_note(db: Session = Depends(get_read_db), user=Depends(get_current_reader)):
+    """Получает избранную заметку пользователя"""
+    return read_cache.get(user, "favorite", _get_favorite_note, db, user.id)
+
+
+def _delete_note(db: Session, user_id: int, note_id: int) -> dict:
+    bump_data_version(db, user_id)
     note = db.get(Note, note_id)
-    if note is None or note.user_id != user.id:
+    if note is None or note.user_id != user_id:
         raise HTTPException(status_code=404, detail="Заметка не найдена")
+    _release_tags(db, user_id, note_id, is_note=True)
+    deadline_id = db.query(Deadline.id).filter(Deadline.note_id == note_id).scalar()
     db.delete(note)
-    db.commit()
+    record_changes(db, user_id, "note", [note_id], DELETE)
+    if deadline_id is not None:
+        record_changes(db, user_id, "deadline", [deadline_id], DELETE)
     return {"ok": True}
 
 
-# Deadlines
-def _is_todo_note(content: str | None) -> bool:
-    """Проверяет, является ли заметка todo-заметкой."""
-    if not content:
-        return False
-    try:
-        parsed = json.loads(content)
-        return parsed.get("type") == "todo" and isinstance(parsed.get("items"), list)
-    except:
-        return False
+@router.delete("/notes/{note_id}")
+def delete_note(note_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    return run_write(db, _delete_note, user.id, note_id)
+
+
+# Todo items
+def _check_todo_note(db: Session, user_id: int, note_id: int) -> None:
+    note = db.execute(select(Note.is_todo).where(Note.id == note_id, Note.user_id == user_id)).first()
+    if note is None:
+        raise HTTPException(status_code=404, detail="Заметка не найдена")
+    if not note.is_todo:
+        raise HTTPException(status_code=400, detail="Заметка не является todo-списком")
 
 
+def _todo_change(db: Session, user_id: int, note_id: int, item=None, touch: bool = True) -> TodoItemsOut:
+    """Пересчитывает прогресс заметки после изменения пунктов и записывает изменение для /api/sync"""
+    done, total = _refresh_todo_progress(db, [note_id], touch, reset_hash=True)[note_id]
+    record_changes(db, user_id, "note", [note_id])
+    return TodoItemsOut(
+        note_id=note_id,
+        item=TodoItemOut(id=item.id, text=item.text, completed=item.done) if item is not None else None,
+        done=done,
+        total=total,
+    )
+
+
+def _add_todo_item(db: Session, user_id: int, note_id: int, payload: TodoItemCreate) -> TodoItemsOut:
+    bump_data_version(db, user_id)
+    _check_todo_note(db, user_id, note_id)
+    count, max_id = db.execute(
+        select(func.count(), func.max(TodoItem.id)).where(TodoItem.note_id == note_id)
+    ).one()
+    position = count if payload.position is None else min(payload.position, count)
+    if position < count:
+        db.execute(
+            update(TodoItem)
+            .where(TodoItem.note_id == note_id, TodoItem.position >= position)
+            .values(position=TodoItem.position + 1)
+        )
+    item = db.execute(
+        insert(TodoItem)
+        .values(note_id=note_id, id=(max_id or 0) + 1, position=position, text=payload.text, done=payload.completed)
+        .returning(TodoItem.id, TodoItem.text, TodoItem.done)
+    ).one()
+    return _todo_change(db, user_id, note_id, item)
+
+
+@router.post("/notes/{note_id}/items", response_model=TodoItemsOut)
+def add_todo_item(note_id: int, payload: TodoItemCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """Добавляет пункт в todo-заметку (position не указан - в конец списка)"""
+    return run_batched_write(db, _add_todo_item, user.id, note_id, payload)
+
+
+def _update_todo_item(db: Session, user_id: int, note_id: int, item_id: int, payload: TodoItemUpdate) -> TodoItemsOut:
+    bump_data_version(db, user_id)
+    _check_todo_note(db, user_id, note_id)
+    fields = payload.model_dump(exclude_none=True)
+    values = {"text": fields["text"]} if "text" in fields else {}
+    if "completed" in fields:
+        values["done"] = fields["completed"]
+    columns = (TodoItem.id, TodoItem.text, TodoItem.done)
+    where = (TodoItem.note_id == note_id, TodoItem.id == item_id)
+    if values:
+        item = db.execute(update(TodoItem).where(*where).values(values).returning(*columns)).first()
+    else:
+        item = db.execute(select(*columns).where(*where)).first()
+    if item is None:
+        raise HTTPException(status_code=404, detail="Пункт не найден")
+    # Только отметка не меняет текст заметки и не поднимает ее в списке
+    return _todo_change(db, user_id, note_id, item, touch="text" in values)
+
+
+@router.patch("/notes/{note_id}/items/{item_id}", response_model=TodoItemsOut, dependencies=[Depends(if_match)])
+def update_todo_item(
+    note_id: int, item_id: int, payload: TodoItemUpdate,
+    db: Session = Depends(get_db), user=Depends(get_current_user),
+):
+    return run_batched_write(db, _update_todo_item, user.id, note_id, item_id, payload)
+
+
+def _toggle_todo_item(db: Session, user_id: int, note_id: int, item_id: int) -> TodoItemsOut:
+    bump_data_version(db, user_id)
+    _check_todo_note(db, user_id, note_id)
+    item = db.execute(
+        update(TodoItem)
+        .where(TodoItem.note_id == note_id, TodoItem.id == item_id)
+        .values(done=~TodoItem.done)
+        .returning(TodoItem.id, TodoItem.text, TodoItem.done)
+    ).first()
+    if item is None:
+        raise HTTPException(status_code=404, detail="Пункт не найден")
+    return _todo_change(db, user_id, note_id, item, touch=False)
+
+
+@router.post("/notes/{note_id}/items/{item_id}/toggle", response_model=TodoItemsOut)
+def toggle_todo_item(note_id: int, item_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """Отмечает пункт выполненным или снимает отметку"""
+    return run_batched_write(db, _toggle_todo_item, user.id, note_id, item_id)
+
+
+def _reorder_todo_items(db: Session, user_id: int, note_id: int, payload: TodoItemsOrder) -> TodoItemsOut:
+    bump_data_version(db, user_id)
+    _check_todo_note(db, user_id, note_id)
+    positions = dict(db.execute(select(TodoItem.id, TodoItem.position).where(TodoItem.note_id == note_id)).all())
+    if sorted(payload.item_ids) != sorted(positions):
+        raise HTTPException(status_code=400, detail="Нужно перечислить все пункты заметки, каждый один раз")
+    moved = [
+        {"note_id": note_id, "id": item_id, "position": position}
+        for position, item_id in enumerate(payload.item_ids)
+        if positions[item_id] != position
+    ]
+    if moved:
+        db.execute(update(TodoItem), moved)
+    return _todo_change(db, user_id, note_id)
+
+
+@router.put("/notes/{note_id}/items/order", response_model=TodoItemsOut, dependencies=[Depends(if_match)])
+def reorder_todo_items(note_id: int, payload: TodoItemsOrder, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """Задает новый порядок пунктов todo-заметки"""
+    return run_batched_write(db, _reorder_todo_items, user.id, note_id, payload)
+
+
+def _delete_todo_item(db: Session, user_id: int, note_id: int, item_id: int) -> TodoItemsOut:
+    bump_data_version(db, user_id)
+    _check_todo_note(db, user_id, note_id)
+    position = db.execute(
+        delete(TodoItem).where(TodoItem.note_id == note_id, TodoItem.id == item_id).returning(TodoItem.position)
+    ).scalar()
+    if position is None:
+        raise HTTPException(status_code=404, detail="Пункт не найден")
+    db.execute(
+        update(TodoItem)
+        .where(TodoItem.note_id == note_id, TodoItem.position > position)
+        .values(position=TodoItem.position - 1)
+    )
+    return _todo_change(db, user_id, note_id)
+
+
+@router.delete("/notes/{note_id}/items/{item_id}", response_model=TodoItemsOut)
+def delete_todo_item(note_id: int, item_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    return run_batched_write(db, _delete_todo_item, user.id, note_id, item_id)
+
+
+# Deadlines
 def _calculate_deadline_info(deadline_at: datetime) -> dict:
     """Вычисляет информацию о дедлайне (оставшееся время, статус, текст)."""
     # Приводим deadline_at к timezone-aware datetime
@@ -726,20 +1643,75 @@ def _calculate_deadline_info(deadline_at: datetime) -> dict:
     }
 
 
-@router.post("/deadlines", response_model=DeadlineOut)
-def create_deadline(payload: DeadlineCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    """Создает дедлайн для заметки. Заметка должна быть todo-заметкой."""
+def _deadline_out(deadline: Deadline) -> DeadlineOut:
+    # Вычисляем информацию о дедлайне
+    info = _calculate_deadline_info(deadline.deadline_at)
+    
+    return DeadlineOut.model_construct(
+        id=deadline.id,
+        note_id=deadline.note_id,
+        deadline_at=deadline.deadline_at.isoformat(),
+        notification_enabled=deadline.notification_enabled,
+        days_remaining=info["days_remaining"],
+        status=info["status"],
+        time_remaining_text=info["time_remaining_text"]
+    )
+
+
+def _get_user_deadline(db: Session, user_id: int, note_id: int) -> Deadline:
+    """Возвращает дедлайн заметки пользователя или выбрасывает 404"""
+    # Проверяем, что заметка существует и принадлежит пользователю
+    note = db.query(Note).filter(
+        Note.id == note_id,
+        Note.user_id == user_id
+    ).first()
+    
+    if note is None:
+        raise HTTPException(status_code=404, detail="Заметка не найдена")
+    
+    # Получаем дедлайн
+    deadline = db.query(Deadline).filter(Deadline.note_id == note_id).first()
+    
+    if deadline is None:
+        raise HTTPException(status_code=404, detail="Дедлайн не найден")
+    
+    return deadline
+
+
+def _record_deadline_change(db: Session, user_id: int, deadline: Deadline, op: str = UPSERT) -> None:
+    """Отмечает изменение дедлайна и его заметки (у нее меняется has_deadline_notifications)"""
+    record_changes(db, user_id, "deadline", [deadline.id], op)
+    record_changes(db, user_id, "note", [deadline.note_id])
+
+
+def _parse_deadline_at(value: str) -> datetime:
+    """Разбирает дату дедлайна из ISO-строки (без timezone - UTC); дата не может быть в прошлом"""
+    try:
+        deadline_at = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Неверный формат даты: {e}")
+    # Приводим к timezone-aware, если не указан timezone
+    if deadline_at.tzinfo is None:
+        deadline_at = deadline_at.replace(tzinfo=timezone.utc)
+    # Проверяем, что дата не в прошлом
+    if deadline_at < datetime.now(timezone.utc):
+        raise HTTPException(status_code=400, detail="Дата дедлайна не может быть в прошлом")
+    return deadline_at
+
+
+def _create_deadline(db: Session, user_id: int, payload: DeadlineCreate) -> DeadlineOut:
+    bump_data_version(db, user_id)
     # Проверяем, что заметка существует и принадлежит пользователю
     note = db.query(Note).filter(
         Note.id == payload.note_id,
-        Note.user_id == user.id
+        Note.user_id == user_id
     ).first()
     
     if note is None:
         raise HTTPException(status_code=404, detail="Заметка не найдена")
     
     # Проверяем, что заметка является todo
-    if not _is_todo_note(note.content):
+    if not note.is_todo:
         raise HTTPException(status_code=400, detail="Дедлайн можно создать только для todo-заметок")
     
     # Проверяем, нет ли уже дедлайна для этой заметки
@@ -747,138 +1719,162 @@ def create_deadline(payload: DeadlineCreate, db: Session = Depends(get_db), user
     if existing_deadline:
         raise HTTPException(status_code=400, detail="Дедлайн для этой заметки уже существует")
     
-    # Парсим дату
-    try:
-        deadline_str = payload.deadline_at.replace('Z', '+00:00')
-        deadline_at = datetime.fromisoformat(deadline_str)
-        # Приводим к timezone-aware, если не указан timezone
-        if deadline_at.tzinfo is None:
-            deadline_at = deadline_at.replace(tzinfo=timezone.utc)
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Неверный формат даты: {e}")
-    
-    # Проверяем, что дата не в прошлом
-    now = datetime.now(timezone.utc)
-    if deadline_at < now:
-        raise HTTPException(status_code=400, detail="Дата дедлайна не может быть в прошлом")
+    deadline_at = _parse_deadline_at(payload.deadline_at)
     
     # Создаем дедлайн
     deadline = Deadline(
         note_id=payload.note_id,
-        user_id=user.id,
+        user_id=user_id,
         deadline_at=deadline_at,
         notification_enabled=False
     )
     
     db.add(deadline)
-    db.commit()
+    db.flush()
     db.refresh(deadline)
+    _record_deadline_change(db, user_id, deadline)
     
-    # Вычисляем информацию о дедлайне
-    info = _calculate_deadline_info(deadline.deadline_at)
-    
-    return DeadlineOut(
-        id=deadline.id,
-        note_id=deadline.note_id,
-        deadline_at=deadline.deadline_at.isoformat(),
-        notification_enabled=deadline.notification_enabled,
-        days_remaining=info["days_remaining"],
-        status=info["status"],
-        time_remaining_text=info["time_remaining_text"]
-    )
+    return _deadline_out(deadline)
 
 
-@router.get("/deadlines", response_model=List[DeadlineOut])
-def get_all_deadlines(db: Session = Depends(get_db), user=Depends(get_current_user)):
-    """Получает все дедлайны пользователя."""
+@router.post("/deadlines", response_model=DeadlineOut)
+def create_deadline(payload: DeadlineCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """Создает дедлайн для заметки. Заметка должна быть todo-заметкой."""
+    return run_write(db, _create_deadline, user.id, payload)
+
+
+def _list_deadlines(db: Session, user_id: int) -> List[DeadlineOut]:
     # Получаем все дедлайны пользователя
-    deadlines = db.query(Deadline).filter(Deadline.user_id == user.id).all()
+    deadlines = db.query(Deadline).filter(Deadline.user_id == user_id).all()
     
     # Вычисляем информацию о каждом дедлайне
-    result = []
-    for deadline in deadlines:
-        info = _calculate_deadline_info(deadline.deadline_at)
-        result.append(DeadlineOut(
-            id=deadline.id,
-            note_id=deadline.note_id,
-            deadline_at=deadline.deadline_at.isoformat(),
-            notification_enabled=deadline.notification_enabled,
-            days_remaining=info["days_remaining"],
-            status=info["status"],
-            time_remaining_text=info["time_remaining_text"]
+    return [_deadline_out(deadline) for deadline in deadlines]
+
+
+@router.get("/deadlines", response_model=List[DeadlineOut], dependencies=[Depends(deadlines_etag)])
+def get_all_deadlines(
+    request: Request, response: Response, db: Session = Depends(get_read_db), user=Depends(get_current_reader)
+):
+    """Получает все дедлайны пользователя."""
+    return fast_response(request, response, _list_deadlines(db, user.id))
+
+
+def _agenda_days(date_from: date, date_to: date, tz: str) -> List[Tuple[str, datetime, datetime]]:
+    """Локальные дни диапазона: (YYYY-MM-DD, начало, конец) в UTC без tzinfo - как хранится deadline_at"""
+    try:
+        zone = ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Неизвестный часовой пояс: {tz}")
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="Дата to раньше даты from")
+    if (date_to - date_from).days >= MAX_AGENDA_DAYS:
+        raise HTTPException(status_code=400, detail=f"Диапазон не больше {MAX_AGENDA_DAYS} дней")
+
+    def utc_midnight(day: date) -> datetime:
+        return datetime.combine(day, dt_time.min, tzinfo=zone).astimezone(timezone.utc).replace(tzinfo=None)
+
+    days = [date_from + timedelta(days=i) for i in range((date_to - date_from).days + 2)]
+    return [(day.isoformat(), utc_midnight(day), utc_midnight(following)) for day, following in zip(days, days[1:])]
+
+
+def _agenda(db: Session, user_id: int, date_from: date, date_to: date, tz: str = "UTC") -> AgendaOut:
+    """Дедлайны диапазона по локальным дням одним запросом.
+
+    Границы дней считаются в Python (с учетом перехода на летнее время) и
+    передаются в запрос CTE days; раскладка по дням, статус (как в
+    _calculate_deadline_info) и счетчики дней считаются в SQL по индексу
+    ix_deadlines_user_deadline.
+    """
+    day_rows = _agenda_days(date_from, date_to, tz)
+    # SQLite не поддерживает имена столбцов у VALUES в FROM - дни собираются через UNION ALL
+    days = union_all(*(
+        select(literal(day, String).label("day"), literal(starts, DateTime()).label("starts"),
+               literal(ends, DateTime()).label("ends"))
+        for day, starts, ends in day_rows
+    )).cte("days")
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    status = case(
+        (Deadline.deadline_at < now, "overdue"),
+        (Deadline.deadline_at < now + timedelta(hours=24), "today"),
+        else_="active",
+    )
+    items = (
+        select(
+            Deadline.id, Deadline.note_id, Note.title, Deadline.deadline_at, Deadline.notification_enabled,
+            days.c.day, status.label("status"),
+        )
+        .join(Note, Note.id == Deadline.note_id)
+        .join(days, (Deadline.deadline_at >= days.c.starts) & (Deadline.deadline_at < days.c.ends))
+        .where(
+            Deadline.user_id == user_id,
+            Deadline.deadline_at >= day_rows[0][1],
+            Deadline.deadline_at < day_rows[-1][2],
+        )
+        .subquery()
+    )
+    counts = [
+        func.sum(case((items.c.status == name, 1), else_=0)).over(partition_by=items.c.day).label(name)
+        for name in AGENDA_STATUSES
+    ]
+    rows = db.execute(select(items, *counts).order_by(items.c.deadline_at, items.c.id)).all()
+
+    result = AgendaOut(tz=tz, overdue=0, today=0, active=0, days=[])
+    for row in rows:
+        if not result.days or result.days[-1].date != row.day:
+            result.days.append(AgendaDay(date=row.day, overdue=row.overdue, today=row.today, active=row.active, items=[]))
+            for name in AGENDA_STATUSES:
+                setattr(result, name, getattr(result, name) + getattr(row, name))
+        result.days[-1].items.append(AgendaItem(
+            id=row.id,
+            note_id=row.note_id,
+            note_title=row.title,
+            deadline_at=row.deadline_at.isoformat(),
+            notification_enabled=row.notification_enabled,
+            status=row.status,
         ))
-    
     return result
 
 
+@router.get("/agenda", response_model=AgendaOut, dependencies=[Depends(deadlines_etag)])
+def get_agenda(
+    date_from: date = Query(..., alias="from"),
+    date_to: date = Query(..., alias="to"),
+    tz: str = "UTC",
+    db: Session = Depends(get_read_db),
+    user=Depends(get_current_reader),
+):
+    """Дедлайны с from по to (включительно) по дням в часовом поясе tz (IANA, например Europe/Moscow)"""
+    return _agenda(db, user.id, date_from, date_to, tz)
+
+
+def _get_deadline(db: Session, user_id: int, note_id: int) -> DeadlineOut:
+    return _deadline_out(_get_user_deadline(db, user_id, note_id))
+
+
 @router.get("/deadlines/{note_id}", response_model=DeadlineOut)
-def get_deadline(note_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
+def get_deadline(note_id: int, db: Session = Depends(get_read_db), user=Depends(get_current_reader)):
     """Получает дедлайн для заметки."""
-    # Проверяем, что заметка существует и принадлежит пользователю
-    note = db.query(Note).filter(
-        Note.id == note_id,
-        Note.user_id == user.id
-    ).first()
-    
-    if note is None:
-        raise HTTPException(status_code=404, detail="Заметка не найдена")
-    
-    # Получаем дедлайн
-    deadline = db.query(Deadline).filter(Deadline.note_id == note_id).first()
-    
-    if deadline is None:
-        raise HTTPException(status_code=404, detail="Дедлайн не найден")
-    
-    # Вычисляем информацию о дедлайне
-    info = _calculate_deadline_info(deadline.deadline_at)
-    
-    return DeadlineOut(
-        id=deadline.id,
-        note_id=deadline.note_id,
-        deadline_at=deadline.deadline_at.isoformat(),
-        notification_enabled=deadline.notification_enabled,
-        days_remaining=info["days_remaining"],
-        status=info["status"],
-        time_remaining_text=info["time_remaining_text"]
-    )
+    return _get_deadline(db, user.id, note_id)
 
 
-@router.patch("/deadlines/{note_id}", response_model=DeadlineOut)
-def update_deadline(note_id: int, payload: DeadlineUpdate, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    """Обновляет дедлайн для заметки."""
-    # Проверяем, что заметка существует и принадлежит пользователю
-    note = db.query(Note).filter(
-        Note.id == note_id,
-        Note.user_id == user.id
-    ).first()
-    
-    if note is None:
-        raise HTTPException(status_code=404, detail="Заметка не найдена")
-    
-    # Получаем дедлайн
-    deadline = db.query(Deadline).filter(Deadline.note_id == note_id).first()
-    
-    if deadline is None:
-        raise HTTPException(status_code=404, detail="Дедлайн не найден")
+def _reset_deadline_notifications(db: Session, deadline_id: int) -> None:
+    """Удаляет отправленные уведомления дедлайна (кроме expired), чтобы они пересчитались"""
+    db.query(DeadlineNotification).filter(
+        DeadlineNotification.deadline_id == deadline_id,
+        DeadlineNotification.notification_type != "expired"
+    ).delete(synchronize_session=False)
+
+
+def _update_deadline(db: Session, user_id: int, note_id: int, payload: DeadlineUpdate) -> DeadlineOut:
+    bump_data_version(db, user_id)
+    deadline = _get_user_deadline(db, user_id, note_id)
     
     # Сохраняем старое время дедлайна для проверки изменений
     old_deadline_at = deadline.deadline_at
     
     # Обновляем поля
     if payload.deadline_at is not None:
-        try:
-            deadline_str = payload.deadline_at.replace('Z', '+00:00')
-            deadline_at = datetime.fromisoformat(deadline_str)
-            # Приводим к timezone-aware, если не указан timezone
-            if deadline_at.tzinfo is None:
-                deadline_at = deadline_at.replace(tzinfo=timezone.utc)
-            # Проверяем, что дата не в прошлом
-            now = datetime.now(timezone.utc)
-            if deadline_at < now:
-                raise HTTPException(status_code=400, detail="Дата дедлайна не может быть в прошлом")
-            deadline.deadline_at = deadline_at
-        except ValueError as e:
-            raise HTTPException(status_code=400, detail=f"Неверный формат даты: {e}")
+        deadline.deadline_at = _parse_deadline_at(payload.deadline_at)
     
     if payload.notification_enabled is not None:
         old_notification_enabled = deadline.notification_enabled
@@ -886,11 +1882,7 @@ def update_deadline(note_id: int, payload: DeadlineUpdate, db: Session = Depends
         
         # Если уведомления были включены, удаляем старые уведомления для пересчета
         if payload.notification_enabled and not old_notification_enabled:
-            from ..models.todo import DeadlineNotification
-            db.query(DeadlineNotification).filter(
-                DeadlineNotification.deadline_id == deadline.id,
-                DeadlineNotification.notification_type != "expired"
-            ).delete(synchronize_session=False)
+            _reset_deadline_notifications(db, deadline.id)
     
     # Если время дедлайна изменилось, удаляем все существующие уведомления (кроме expired)
     # чтобы система могла пересчитать их с новым временем
@@ -905,69 +1897,38 @@ def update_deadline(note_id: int, payload: DeadlineUpdate, db: Session = Depends
             new_time = new_time.replace(tzinfo=timezone.utc)
         # Сравниваем с точностью до секунды
         if abs((old_time - new_time).total_seconds()) > 1:
-            from ..models.todo import DeadlineNotification
-            db.query(DeadlineNotification).filter(
-                DeadlineNotification.deadline_id == deadline.id,
-                DeadlineNotification.notification_type != "expired"
-            ).delete(synchronize_session=False)
+            _reset_deadline_notifications(db, deadline.id)
     
-    db.commit()
+    db.flush()
     db.refresh(deadline)
+    _record_deadline_change(db, user_id, deadline)
     
-    # Вычисляем информацию о дедлайне
-    info = _calculate_deadline_info(deadline.deadline_at)
-    
-    return DeadlineOut(
-        id=deadline.id,
-        note_id=deadline.note_id,
-        deadline_at=deadline.deadline_at.isoformat(),
-        notification_enabled=deadline.notification_enabled,
-        days_remaining=info["days_remaining"],
-        status=info["status"],
-        time_remaining_text=info["time_remaining_text"]
-    )
+    return _deadline_out(deadline)
+
+
+@router.patch("/deadlines/{note_id}", response_model=DeadlineOut, dependencies=[Depends(if_match)])
+def update_deadline(note_id: int, payload: DeadlineUpdate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """Обновляет дедлайн для заметки."""
+    return run_write(db, _update_deadline, user.id, note_id, payload)
+
+
+def _delete_deadline(db: Session, user_id: int, note_id: int) -> dict:
+    bump_data_version(db, user_id)
+    deadline = _get_user_deadline(db, user_id, note_id)
+    db.delete(deadline)
+    _record_deadline_change(db, user_id, deadline, DELETE)
+    return {"ok": True}
 
 
 @router.delete("/deadlines/{note_id}")
 def delete_deadline(note_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
     """Удаляет дедлайн для заметки."""
-    # Проверяем, что заметка существует и принадлежит пользователю
-    note = db.query(Note).filter(
-        Note.id == note_id,
-        Note.user_id == user.id
-    ).first()
-    
-    if note is None:
-        raise HTTPException(status_code=404, detail="Заметка не найдена")
-    
-    # Получаем дедлайн
-    deadline = db.query(Deadline).filter(Deadline.note_id == note_id).first()
-    
-    if deadline is None:
-        raise HTTPException(status_code=404, detail="Дедлайн не найден")
-    
-    db.delete(deadline)
-    db.commit()
-    return {"ok": True}
+    return run_write(db, _delete_deadline, user.id, note_id)
 
 
-@router.post("/deadlines/{note_id}/notifications/toggle", response_model=DeadlineOut)
-def toggle_deadline_notifications(note_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    """Переключает подписку на уведомления для дедлайна."""
-    # Проверяем, что заметка существует и принадлежит пользователю
-    note = db.query(Note).filter(
-        Note.id == note_id,
-        Note.user_id == user.id
-    ).first()
-    
-    if note is None:
-        raise HTTPException(status_code=404, detail="Заметка не найдена")
-    
-    # Получаем дедлайн
-    deadline = db.query(Deadline).filter(Deadline.note_id == note_id).first()
-    
-    if deadline is None:
-        raise HTTPException(status_code=404, detail="Дедлайн не найден")
+def _toggle_deadline_notifications(db: Session, user_id: int, note_id: int) -> DeadlineOut:
+    bump_data_version(db, user_id)
+    deadline = _get_user_deadline(db, user_id, note_id)
     
     # Переключаем подписку
     old_notification_enabled = deadline.notification_enabled
@@ -975,27 +1936,19 @@ def toggle_deadline_notifications(note_id: int, db: Session = Depends(get_db), u
     
     # Если уведомления были включены, удаляем старые уведомления для пересчета
     if deadline.notification_enabled and not old_notification_enabled:
-        from ..models.todo import DeadlineNotification
-        db.query(DeadlineNotification).filter(
-            DeadlineNotification.deadline_id == deadline.id,
-            DeadlineNotification.notification_type != "expired"
-        ).delete(synchronize_session=False)
+        _reset_deadline_notifications(db, deadline.id)
     
-    db.commit()
+    db.flush()
     db.refresh(deadline)
+    _record_deadline_change(db, user_id, deadline)
     
-    # Вычисляем информацию о дедлайне
-    info = _calculate_deadline_info(deadline.deadline_at)
-    
-    return DeadlineOut(
-        id=deadline.id,
-        note_id=deadline.note_id,
-        deadline_at=deadline.deadline_at.isoformat(),
-        notification_enabled=deadline.notification_enabled,
-        days_remaining=info["days_remaining"],
-        status=info["status"],
-        time_remaining_text=info["time_remaining_text"]
-    )
+    return _deadline_out(deadline)
+
+
+@router.post("/deadlines/{note_id}/notifications/toggle", response_model=DeadlineOut)
+def toggle_deadline_notifications(note_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """Переключает подписку на уведомления для дедлайна."""
+    return run_write(db, _toggle_deadline_notifications, user.id, note_id)
 
 
 @router.post("/deadlines/{note_id}/notifications/test")
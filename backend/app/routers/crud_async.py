@@ -0,0 +1,298 @@
+"""
+Асинхронные версии эндпоинтов CRUD и настроек (включаются при ASYNC_DB=1).
+
+Запросы не занимают поток AnyIO threadpool: логика выполняется через
+AsyncSession.run_sync, то есть используется тот же код построения запросов
+и сборки ответов, что и в синхронных роутерах crud.py и settings.py.
+"""
+from datetime import date
+from typing import List, Union
+
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..db import SessionLocal, get_async_db, get_async_read_db
+from ..responses import fast_response
+from ..services import write_behind
+from ..services.read_cache import read_cache
+from ..services.write_queue import run_batched_write_async
+from ..deps import (
+    deadlines_etag_async,
+    defer_writes,
+    get_current_reader_async,
+    get_current_user_async,
+    if_match_async,
+    list_etag_async,
+)
+from ..schemas import (
+    TaskCreate,
+    TaskFacets,
+    TaskOut,
+    TaskPage,
+    TaskUpdate,
+    NoteCreate,
+    NoteFacets,
+    NoteOut,
+    NotePage,
+    NoteSummaryOut,
+    NoteUpdate,
+    TagOut,
+    TodoItemCreate,
+    TodoItemsOrder,
+    TodoItemsOut,
+    TodoItemUpdate,
+    FolderCreate,
+    FolderOut,
+    FolderUpdate,
+    DeadlineCreate,
+    DeadlineUpdate,
+    DeadlineOut,
+    AgendaOut,
+    UserSettingsOut,
+    UserSettingsUpdate,
+)
+from . import crud
+from . import settings as settings_router
+
+
+router = APIRouter(prefix="/api", tags=["crud"])
+
+
+# Tags
+@router.get("/tags", response_model=List[TagOut], dependencies=[Depends(list_etag_async)])
+async def list_tags_async(db: AsyncSession = Depends(get_async_read_db), user=Depends(get_current_reader_async)):
+    return await read_cache.get_async(user, "tags", db.run_sync, crud._list_tags, user.id)
+
+
+@router.get("/tags/suggest", response_model=List[TagOut])
+async def suggest_tags_async(
+    prefix: str = Query("", max_length=64),
+    limit: int = Query(crud.DEFAULT_SUGGEST_LIMIT, ge=1, le=crud.MAX_SUGGEST_LIMIT),
+    db: AsyncSession = Depends(get_async_read_db),
+    user=Depends(get_current_reader_async),
+):
+    return await db.run_sync(crud._suggest_tags, user.id, prefix, limit)
+
+
+# Tasks
+@router.get("/tasks", response_model=Union[List[TaskOut], TaskPage], dependencies=[Depends(list_etag_async)])
+async def list_tasks_async(
+    request: Request,
+    response: Response,
+    tag_id: List[int] | None = Query(None),
+    tag_mode: str = Query("all", pattern="^(all|any)$"),
+    limit: int | None = Query(None, ge=1, le=crud.MAX_PAGE_LIMIT),
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_async_read_db),
+    user=Depends(get_current_reader_async),
+):
+    return fast_response(request, response, await db.run_sync(crud._list_tasks, user.id, tag_id, limit, cursor, tag_mode))
+
+
+@router.get("/tasks/facets", response_model=TaskFacets, dependencies=[Depends(list_etag_async)])
+async def task_facets_async(
+    tag_id: List[int] | None = Query(None),
+    tag_mode: str = Query("all", pattern="^(all|any)$"),
+    db: AsyncSession = Depends(get_async_read_db),
+    user=Depends(get_current_reader_async),
+):
+    return await db.run_sync(crud._task_facets, user.id, tag_id, tag_mode)
+
+
+@router.post("/tasks", response_model=TaskOut)
+async def create_task_async(payload: TaskCreate, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user_async)):
+    return await run_batched_write_async(db, crud._create_task, user.id, payload)
+
+
+@router.patch("/tasks/{task_id}", response_model=TaskOut, dependencies=[Depends(if_match_async)])
+async def update_task_async(task_id: int, payload: TaskUpdate, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user_async)):
+    return await run_batched_write_async(db, crud._update_task, user.id, task_id, payload)
+
+
+@router.delete("/tasks/{task_id}")
+async def delete_task_async(task_id: int, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user_async)):
+    return await run_batched_write_async(db, crud._delete_task, user.id, task_id)
+
+
+# Folders
+async def _list_folders(db: AsyncSession, user_id: int):
+    folders = await db.run_sync(crud._list_folders, user_id, False)
+    if folders is None:
+        # Папка "Все" создается синхронной сессией - в threadpool, а не в цикле событий
+        await run_in_threadpool(crud._create_default_folder, user_id)
+        folders = await db.run_sync(crud._list_folders, user_id, False)
+    return folders
+
+
+@router.get("/folders", response_model=List[FolderOut], dependencies=[Depends(list_etag_async)])
+async def list_folders_async(request: Request, response: Response, db: AsyncSession = Depends(get_async_read_db), user=Depends(get_current_reader_async)):
+    folders = await read_cache.get_async(user, "folders", _list_folders, db, user.id)
+    return fast_response(request, response, folders)
+
+
+@router.post("/folders", response_model=FolderOut)
+async def create_folder_async(payload: FolderCreate, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user_async)):
+    return await run_batched_write_async(db, crud._create_folder, user.id, payload)
+
+
+@router.patch("/folders/{folder_id}", response_model=FolderOut, dependencies=[Depends(if_match_async)])
+async def update_folder_async(folder_id: int, payload: FolderUpdate, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user_async)):
+    return await run_batched_write_async(db, crud._update_folder, user.id, folder_id, payload)
+
+
+@router.delete("/folders/{folder_id}")
+async def delete_folder_async(folder_id: int, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user_async)):
+    return await run_batched_write_async(db, crud._delete_folder, user.id, folder_id)
+
+
+# Notes
+@router.get("/notes", response_model=Union[List[NoteOut], List[NoteSummaryOut], NotePage], dependencies=[Depends(list_etag_async)])
+async def list_notes_async(
+    request: Request,
+    response: Response,
+    folder_id: int | None = None,
+    tag_id: List[int] | None = Query(None),
+    tag_mode: str = Query("all", pattern="^(all|any)$"),
+    limit: int | None = Query(None, ge=1, le=crud.MAX_PAGE_LIMIT),
+    cursor: str | None = None,
+    fields: str = Query("full", pattern="^(full|summary)$"),
+    db: AsyncSession = Depends(get_async_read_db),
+    user=Depends(get_current_reader_async),
+):
+    notes = await db.run_sync(crud._list_notes, user.id, folder_id, tag_id, limit, cursor, fields, tag_mode)
+    return fast_response(request, response, notes)
+
+
+@router.get("/notes/facets", response_model=NoteFacets, dependencies=[Depends(list_etag_async)])
+async def note_facets_async(
+    folder_id: int | None = None,
+    tag_id: List[int] | None = Query(None),
+    tag_mode: str = Query("all", pattern="^(all|any)$"),
+    db: AsyncSession = Depends(get_async_read_db),
+    user=Depends(get_current_reader_async),
+):
+    return await db.run_sync(crud._note_facets, user.id, folder_id, tag_id, tag_mode)
+
+
+@router.post("/notes", response_model=NoteOut)
+async def create_note_async(payload: NoteCreate, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user_async)):
+    return await run_batched_write_async(db, crud._create_note, user.id, payload)
+
+
+def _defer_note_update(user_id: int, note_id: int, payload: NoteUpdate, defer: bool) -> NoteOut:
+    with SessionLocal() as db:
+        return crud._defer_note_update(db, user_id, note_id, payload, defer)
+
+
+@router.patch("/notes/{note_id}", response_model=NoteOut, dependencies=[Depends(defer_writes), Depends(if_match_async)])
+async def update_note_async(note_id: int, payload: NoteUpdate, request: Request, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user_async)):
+    if write_behind.note_buffer is not None:
+        # Буфер отложенной записи работает с синхронной сессией и блокировкой - в threadpool
+        return await run_in_threadpool(_defer_note_update, user.id, note_id, payload, "if-match" not in request.headers)
+    return await run_batched_write_async(db, crud._update_note, user.id, note_id, payload)
+
+
+@router.post("/notes/{note_id}/favorite", response_model=NoteOut)
+async def toggle_favorite_note_async(note_id: int, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user_async)):
+    return await run_batched_write_async(db, crud._toggle_favorite_note, user.id, note_id)
+
+
+@router.get("/notes/favorite", response_model=NoteOut | None)
+async def get_favorite_note_async(db: AsyncSession = Depends(get_async_read_db), user=Depends(get_current_reader_async)):
+    return await read_cache.get_async(user, "favorite", db.run_sync, crud._get_favorite_note, user.id)
+
+
+@router.delete("/notes/{note_id}")
+async def delete_note_async(note_id: int, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user_async)):
+    return await run_batched_write_async(db, crud._delete_note, user.id, note_id)
+
+
+# Todo items
+@router.post("/notes/{note_id}/items", response_model=TodoItemsOut)
+async def add_todo_item_async(note_id: int, payload: TodoItemCreate, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user_async)):
+    return await run_batched_write_async(db, crud._add_todo_item, user.id, note_id, payload)
+
+
+@router.patch("/notes/{note_id}/items/{item_id}", response_model=TodoItemsOut, dependencies=[Depends(if_match_async)])
+async def update_todo_item_async(
+    note_id: int, item_id: int, payload: TodoItemUpdate,
+    db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user_async),
+):
+    return await run_batched_write_async(db, crud._update_todo_item, user.id, note_id, item_id, payload)
+
+
+@router.post("/notes/{note_id}/items/{item_id}/toggle", response_model=TodoItemsOut)
+async def toggle_todo_item_async(note_id: int, item_id: int, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user_async)):
+    return await run_batched_write_async(db, crud._toggle_todo_item, user.id, note_id, item_id)
+
+
+@router.put("/notes/{note_id}/items/order", response_model=TodoItemsOut, dependencies=[Depends(if_match_async)])
+async def reorder_todo_items_async(note_id: int, payload: TodoItemsOrder, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user_async)):
+    return await run_batched_write_async(db, crud._reorder_todo_items, user.id, note_id, payload)
+
+
+@router.delete("/notes/{note_id}/items/{item_id}", response_model=TodoItemsOut)
+async def delete_todo_item_async(note_id: int, item_id: int, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user_async)):
+    return await run_batched_write_async(db, crud._delete_todo_item, user.id, note_id, item_id)
+
+
+# Deadlines
+@router.post("/deadlines", response_model=DeadlineOut)
+async def create_deadline_async(payload: DeadlineCreate, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user_async)):
+    return await run_batched_write_async(db, crud._create_deadline, user.id, payload)
+
+
+@router.get("/deadlines", response_model=List[DeadlineOut], dependencies=[Depends(deadlines_etag_async)])
+async def get_all_deadlines_async(request: Request, response: Response, db: AsyncSession = Depends(get_async_read_db), user=Depends(get_current_reader_async)):
+    return fast_response(request, response, await db.run_sync(crud._list_deadlines, user.id))
+
+
+@router.get("/agenda", response_model=AgendaOut, dependencies=[Depends(deadlines_etag_async)])
+async def get_agenda_async(
+    date_from: date = Query(..., alias="from"),
+    date_to: date = Query(..., alias="to"),
+    tz: str = "UTC",
+    db: AsyncSession = Depends(get_async_read_db),
+    user=Depends(get_current_reader_async),
+):
+    return await db.run_sync(crud._agenda, user.id, date_from, date_to, tz)
+
+
+@router.get("/deadlines/{note_id}", response_model=DeadlineOut)
+async def get_deadline_async(note_id: int, db: AsyncSession = Depends(get_async_read_db), user=Depends(get_current_reader_async)):
+    return await db.run_sync(crud._get_deadline, user.id, note_id)
+
+
+@router.patch("/deadlines/{note_id}", response_model=DeadlineOut, dependencies=[Depends(if_match_async)])
+async def update_deadline_async(note_id: int, payload: DeadlineUpdate, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user_async)):
+    return await run_batched_write_async(db, crud._update_deadline, user.id, note_id, payload)
+
+
+@router.delete("/deadlines/{note_id}")
+async def delete_deadline_async(note_id: int, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user_async)):
+    return await run_batched_write_async(db, crud._delete_deadline, user.id, note_id)
+
+
+@router.post("/deadlines/{note_id}/notifications/toggle", response_model=DeadlineOut)
+async def toggle_deadline_notifications_async(note_id: int, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user_async)):
+    return await run_batched_write_async(db, crud._toggle_deadline_notifications, user.id, note_id)
+
+
+# Settings
+async def _read_settings(db: AsyncSession, user_id: int) -> UserSettingsOut:
+    settings = await db.run_sync(settings_router._read_settings, user_id, False)
+    if settings is None:
+        # Настройки по умолчанию создаются через писатель - в threadpool, а не в цикле событий
+        settings = await run_in_threadpool(settings_router._create_settings, user_id)
+    return settings
+
+
+@router.get("/settings", response_model=UserSettingsOut, tags=["settings"])
+async def get_user_settings_async(db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user_async)):
+    return await read_cache.get_async(user, "settings", _read_settings, db, user.id)
+
+
+@router.put("/settings", response_model=UserSettingsOut, tags=["settings"])
+async def update_user_settings_async(payload: UserSettingsUpdate, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user_async)):
+    return await run_batched_write_async(db, settings_router._update_settings, user.id, payload)
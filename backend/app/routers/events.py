@@ -0,0 +1,89 @@
+"""
+Поток изменений /api/events (Server-Sent Events) вместо опроса.
+
+После подключения приходит событие ready с текущей версией данных, затем:
+    change       - {"version", "changes": [{"entity", "id", "op"}]} после
+                   каждого коммита, изменившего данные пользователя (id события -
+                   версия, по ней можно догрузить изменения через /api/sync?since=;
+                   настройки - entity "settings", их перечитывают через /api/settings);
+    notification - напоминание о дедлайне отправлено;
+    resync       - события пропущены, данные нужно перечитать;
+    heartbeat    - раз в EVENTS_HEARTBEAT_SECONDS, заменяет опрос /health.
+
+EventSource в браузере не передает заголовки: клиент получает одноразовый
+билет POST /api/events/ticket (с обычной авторизацией) и подключается к
+/api/events?ticket=... Соединение с БД нужно только на проверку пользователя:
+открытый поток держит лишь очередь в брокере.
+"""
+import asyncio
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+
+from ..core.config import settings
+from ..db import ReadSessionLocal
+from ..deps import _load_user, get_current_reader
+from ..models.user import User
+from ..schemas import EventsTicket
+from ..services.events import CLOSE, broker, issue_ticket, redeem_ticket
+
+router = APIRouter(prefix="/api", tags=["events"])
+
+
+def _format(name: str, data: dict, event_id: int | None = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {name}\ndata: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n"
+
+
+def _stream_user(request: Request, ticket: str | None = None) -> User:
+    """Пользователь потока: токен из заголовка Authorization или одноразовый билет"""
+    scheme, _, bearer = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and bearer:
+        with ReadSessionLocal() as db:
+            return get_current_reader(request, bearer, db)
+    user_id = redeem_ticket(ticket) if ticket else None
+    if user_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Билет потока недействителен или истек. Получите новый через POST /api/events/ticket",
+        )
+    with ReadSessionLocal() as db:
+        return _load_user(db, user_id)
+
+
+async def _events(user: User):
+    queue = broker.subscribe(user.id)
+    try:
+        version = user.data_version or 0
+        yield f"retry: 5000\n{_format('ready', {'version': version}, version)}"
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), settings.events_heartbeat_seconds)
+            except asyncio.TimeoutError:
+                yield _format("heartbeat", {"status": "ok"})
+                continue
+            if item is CLOSE:
+                return
+            name, data = item
+            yield _format(name, data, data.get("version") if name == "change" else None)
+    finally:
+        broker.unsubscribe(user.id, queue)
+
+
+@router.post("/events/ticket", response_model=EventsTicket)
+def events_ticket(user: User = Depends(get_current_reader)):
+    """Одноразовый билет на подключение к /api/events?ticket= (для EventSource)"""
+    return EventsTicket(ticket=issue_ticket(user.id), expires_in=settings.events_ticket_ttl_seconds)
+
+
+@router.get("/events")
+async def events(user: User = Depends(_stream_user)):
+    """Поток изменений данных пользователя (text/event-stream)"""
+    if broker.loop is None:
+        broker.start(asyncio.get_running_loop())
+    return StreamingResponse(
+        _events(user),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,5 +1,9 @@
 from fastapi import APIRouter
 
+from ..coalescing import coalescing_stats
+from ..services.events import broker
+from ..services.read_cache import read_cache
+
 
 router = APIRouter(prefix="/health", tags=["health"]) 
 
@@ -9,3 +13,7 @@ def healthcheck():
     return {"status": "ok"}
 
 
+@router.get("/metrics")
+def metrics():
+    """Счетчики кэша чтения, объединения запросов и потоков /api/events процесса"""
+    return {"read_cache": read_cache.stats(), "coalescing": coalescing_stats(), "events": broker.stats()}
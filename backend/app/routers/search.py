@@ -0,0 +1,154 @@
+"""
+Поиск по заметкам и задачам: GET /api/search?q=...
+
+Запрос выполняется по индексам FTS5 (services/search_service.py), поддерживает
+префиксы (слово*), фильтры по папке и тегам как у списков. Ранжирование: сначала документы, у
+которых все слова запроса есть в заголовке, затем остальные; внутри - более
+свежие выше.
+"""
+from typing import Dict, List
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import bindparam, column, literal_column, select, table, text
+from sqlalchemy.orm import Session
+
+from . import crud
+from ..db import get_read_db
+from ..deps import get_current_reader, list_etag
+from ..models.todo import Note, Task, note_tag, task_tag
+from ..schemas import SearchHit, SearchOut
+from ..services.search_service import build_match_query
+
+router = APIRouter(prefix="/api", tags=["search"])
+
+MAX_SEARCH_LIMIT = 100
+SNIPPET_TOKENS = 16
+
+TITLE_SCORE = 2
+TEXT_SCORE = 1
+
+notes_fts = table("notes_fts", column("rowid"))
+tasks_fts = table("tasks_fts", column("rowid"))
+
+
+def _snippets(db: Session, table: str, match: str, ids: List[int]) -> Dict[int, str]:
+    """Фрагменты текста только для найденной страницы (snippet дорогой, не считаем его для всех совпадений)"""
+    if not ids:
+        return {}
+    rows = db.execute(
+        text(f"""
+            SELECT rowid, snippet({table}, 1, '', '', '…', {SNIPPET_TOKENS})
+            FROM {table}
+            WHERE {table} MATCH :match AND rowid IN :ids
+        """).bindparams(bindparam("ids", expanding=True)),
+        {"match": match, "ids": ids},
+    )
+    return {row_id: snippet for row_id, snippet in rows if snippet}
+
+
+def _fts_match(fts, query: str):
+    return literal_column(fts.name).op("MATCH")(query)
+
+
+def _in_title(fts, title_match: str):
+    # Подзапрос к той же таблице FTS не должен коррелировать с внешним запросом
+    return fts.c.rowid.in_(select(fts.c.rowid).where(_fts_match(fts, title_match)).correlate(None))
+
+
+def _search_notes(
+    db: Session, match: str, title_match: str, user_id: int,
+    folder_id: int | None, tag_ids: List[int] | None, tag_mode: str, count: int,
+) -> List[SearchHit]:
+    query = select(
+        Note.id, Note.title, Note.folder_id, Note.updated_at, _in_title(notes_fts, title_match).label("in_title")
+    ).select_from(notes_fts.join(Note, Note.id == notes_fts.c.rowid)).where(
+        _fts_match(notes_fts, match), Note.user_id == user_id
+    )
+    # Фильтры - как у GET /api/notes: папка "Все" показывает все заметки
+    if folder_id is not None:
+        query = query.where(Note.folder_id == folder_id)
+    if tag_ids:
+        query = query.where(crud._tag_filter(Note, note_tag, "note_id", tag_ids, tag_mode))
+    rows = db.execute(
+        query.order_by(literal_column("in_title").desc(), Note.updated_at.desc(), Note.id.desc()).limit(count)
+    ).all()
+    snippets = _snippets(db, "notes_fts", match, [row.id for row in rows])
+    return [
+        SearchHit(
+            type="note", id=row.id, title=row.title, snippet=snippets.get(row.id), folder_id=row.folder_id,
+            score=TITLE_SCORE if row.in_title else TEXT_SCORE, updated_at=row.updated_at.isoformat(),
+        )
+        for row in rows
+    ]
+
+
+def _search_tasks(
+    db: Session, match: str, title_match: str, user_id: int, tag_ids: List[int] | None, tag_mode: str, count: int,
+) -> List[SearchHit]:
+    # У задач нет updated_at - свежесть по дате создания
+    query = select(
+        Task.id, Task.title, Task.created_at.label("updated_at"), _in_title(tasks_fts, title_match).label("in_title")
+    ).select_from(tasks_fts.join(Task, Task.id == tasks_fts.c.rowid)).where(
+        _fts_match(tasks_fts, match), Task.user_id == user_id
+    )
+    if tag_ids:
+        query = query.where(crud._tag_filter(Task, task_tag, "task_id", tag_ids, tag_mode))
+    rows = db.execute(
+        query.order_by(literal_column("in_title").desc(), Task.created_at.desc(), Task.id.desc()).limit(count)
+    ).all()
+    snippets = _snippets(db, "tasks_fts", match, [row.id for row in rows])
+    return [
+        SearchHit(
+            type="task", id=row.id, title=row.title, snippet=snippets.get(row.id),
+            score=TITLE_SCORE if row.in_title else TEXT_SCORE, updated_at=row.updated_at.isoformat(),
+        )
+        for row in rows
+    ]
+
+
+def _search(
+    db: Session,
+    user_id: int,
+    q: str,
+    kind: str = "all",
+    folder_id: int | None = None,
+    tag_ids: List[int] | None = None,
+    prefix: bool = True,
+    limit: int = 20,
+    offset: int = 0,
+    tag_mode: str = "all",
+) -> SearchOut:
+    match = build_match_query(user_id, q, prefix)
+    if match is None:
+        return SearchOut(items=[])
+    title_match = build_match_query(user_id, q, prefix, columns="title")
+    folder_id = crud._folder_filter_id(db, user_id, folder_id)
+
+    # Из каждого индекса берем лучшие offset + limit и сливаем в общем порядке
+    count = offset + limit
+    hits: List[SearchHit] = []
+    if kind in ("all", "notes"):
+        hits += _search_notes(db, match, title_match, user_id, folder_id, tag_ids, tag_mode, count)
+    # У задач нет папок: с фильтром по папке (кроме "Все") ищем только заметки
+    if kind in ("all", "tasks") and folder_id is None:
+        hits += _search_tasks(db, match, title_match, user_id, tag_ids, tag_mode, count)
+    hits.sort(key=lambda hit: (hit.score, hit.updated_at), reverse=True)
+    return SearchOut(items=hits[offset:offset + limit])
+
+
+@router.get("/search", response_model=SearchOut, dependencies=[Depends(list_etag)])
+def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    type: str = Query("all", pattern="^(all|notes|tasks)$"),
+    folder_id: int | None = None,
+    tag_id: List[int] | None = Query(None),
+    tag_mode: str = Query("all", pattern="^(all|any)$"),
+    prefix: bool = True,
+    limit: int = Query(20, ge=1, le=MAX_SEARCH_LIMIT),
+    offset: int = Query(0, ge=0, le=1000),
+    db: Session = Depends(get_read_db),
+    user=Depends(get_current_reader),
+):
+    """Ищет заметки и задачи; prefix=true ищет последнее слово по префиксу (поиск по мере набора).
+    folder_id и tag_id/tag_mode фильтруют так же, как в GET /api/notes и /api/tasks"""
+    return _search(db, user.id, q, type, folder_id, tag_id, prefix, limit, offset, tag_mode)
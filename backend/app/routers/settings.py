@@ -2,55 +2,72 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 import logging
 
-from ..db import get_db
+from ..db import SessionLocal, get_db
 from ..deps import get_current_user
 from ..models.user import User
 from ..models.user_settings import UserSettings
 from ..schemas import UserSettingsOut, UserSettingsUpdate
+from ..services.data_version import bump_data_version, record_changes
+from ..services.read_cache import read_cache
+from ..services.write_queue import run_batched_write
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api", tags=["settings"])
 
 
-@router.get("/settings", response_model=UserSettingsOut)
-def get_user_settings(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    """Получить настройки пользователя"""
-    settings = db.query(UserSettings).filter(UserSettings.user_id == user.id).first()
+def _get_settings(db: Session, user_id: int) -> UserSettingsOut:
+    settings = db.query(UserSettings).filter(UserSettings.user_id == user_id).first()
     
     if not settings:
         # Создаем настройки по умолчанию, если их нет
         settings = UserSettings(
-            user_id=user.id,
+            user_id=user_id,
             language="ru",
             theme="dark",
             notification_times_minutes=[30]  # По умолчанию одно уведомление за 30 минут
         )
         db.add(settings)
-        db.commit()
-        db.refresh(settings)
+        db.flush()
     
     # Убеждаемся, что notification_times_minutes это список
     if not isinstance(settings.notification_times_minutes, list):
         settings.notification_times_minutes = [30]
-        db.commit()
-        db.refresh(settings)
+        db.flush()
     
-    return settings
+    return UserSettingsOut.model_validate(settings)
 
 
-@router.put("/settings", response_model=UserSettingsOut)
-def update_user_settings(
-    payload: UserSettingsUpdate,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
-):
-    """Обновить настройки пользователя"""
-    settings = db.query(UserSettings).filter(UserSettings.user_id == user.id).first()
+def _create_settings(user_id: int) -> UserSettingsOut:
+    """Создает настройки по умолчанию в отдельной сессии из пула записи (через общий писатель, если он включен)"""
+    with SessionLocal() as write_db:
+        return run_batched_write(write_db, _get_settings, user_id)
+
+
+def _read_settings(db: Session, user_id: int, create_default: bool = True) -> UserSettingsOut | None:
+    """Настройки из сессии только на чтение; недостающие создаются через _create_settings.
+    При create_default=False вместо этого возвращает None"""
+    settings = db.query(UserSettings).filter(UserSettings.user_id == user_id).first()
+    if settings is None or not isinstance(settings.notification_times_minutes, list):
+        return _create_settings(user_id) if create_default else None
+    return UserSettingsOut.model_validate(settings)
+
+
+@router.get("/settings", response_model=UserSettingsOut)
+def get_user_settings(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    """Получить настройки пользователя"""
+    return read_cache.get(user, "settings", _read_settings, db, user.id)
+
+
+def _update_settings(db: Session, user_id: int, payload: UserSettingsUpdate) -> UserSettingsOut:
+    bump_data_version(db, user_id)
+    # Настройки у пользователя одни, id сущности - id пользователя
+    record_changes(db, user_id, "settings", [user_id])
+    settings = db.query(UserSettings).filter(UserSettings.user_id == user_id).first()
     
     if not settings:
         # Создаем настройки, если их нет
         settings = UserSettings(
-            user_id=user.id,
+            user_id=user_id,
             language=payload.language or "ru",
             theme=payload.theme or "dark",
             notification_times_minutes=payload.notification_times_minutes or [30]
@@ -106,7 +123,7 @@ def update_user_settings(
             if old_times_sorted != unique_times:
                 from ..models.todo import Deadline, DeadlineNotification
                 # Находим все дедлайны пользователя
-                user_deadlines = db.query(Deadline).filter(Deadline.user_id == user.id).all()
+                user_deadlines = db.query(Deadline).filter(Deadline.user_id == user_id).all()
                 deadline_ids = [d.id for d in user_deadlines]
                 
                 if deadline_ids:
@@ -115,10 +132,20 @@ def update_user_settings(
                         DeadlineNotification.deadline_id.in_(deadline_ids),
                         DeadlineNotification.notification_type != "expired"
                     ).delete(synchronize_session=False)
-                    logger.info(f"Удалены существующие уведомления для {len(deadline_ids)} дедлайнов пользователя {user.id} после обновления времен уведомлений")
+                    logger.info(f"Удалены существующие уведомления для {len(deadline_ids)} дедлайнов пользователя {user_id} после обновления времен уведомлений")
     
-    db.commit()
+    db.flush()
     db.refresh(settings)
     
-    return settings
+    return UserSettingsOut.model_validate(settings)
+
+
+@router.put("/settings", response_model=UserSettingsOut)
+def update_user_settings(
+    payload: UserSettingsUpdate,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    """Обновить настройки пользователя"""
+    return run_batched_write(db, _update_settings, user.id, payload)
 
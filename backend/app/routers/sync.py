@@ -0,0 +1,97 @@
+"""
+Дельта-синхронизация: /api/sync?since=<версия> возвращает только сущности,
+созданные, измененные или удаленные после этой версии данных пользователя.
+"""
+from typing import Dict, List
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session, joinedload
+
+from ..db import get_read_db
+from ..deps import deadlines_etag, get_current_reader
+from ..models.change_log import ChangeLog
+from ..models.todo import Deadline, Folder, Note, Tag, Task
+from ..schemas import SyncDeleted, SyncOut
+from ..services.data_version import DELETE
+from . import crud
+
+router = APIRouter(prefix="/api", tags=["sync"])
+
+# Сущность журнала -> (модель, поле SyncOut)
+_ENTITIES = {
+    "note": (Note, "notes"),
+    "task": (Task, "tasks"),
+    "folder": (Folder, "folders"),
+    "deadline": (Deadline, "deadlines"),
+    "tag": (Tag, "tags"),
+}
+
+
+def _full_snapshot(db: Session, user_id: int, version: int) -> SyncOut:
+    return SyncOut(
+        version=version,
+        full=True,
+        notes=crud._list_notes(db, user_id),
+        tasks=crud._list_tasks(db, user_id),
+        folders=crud._list_folders(db, user_id),
+        deadlines=crud._list_deadlines(db, user_id),
+        tags=crud._list_tags(db, user_id),
+    )
+
+
+def _load_changed(db: Session, user_id: int, entity: str, ids: List[int]) -> list:
+    """Текущие объекты измененных сущностей пользователя, уже сериализованные"""
+    if entity == "note":
+        notes = db.query(Note).options(joinedload(Note.tags)).filter(Note.user_id == user_id, Note.id.in_(ids)).all()
+        flagged = crud._notes_with_deadline_notifications(db, [n.id for n in notes])
+        return [crud._note_out(n, n.id in flagged) for n in notes]
+    if entity == "task":
+        tasks = db.query(Task).options(joinedload(Task.tags)).filter(Task.user_id == user_id, Task.id.in_(ids)).all()
+        return [crud._task_out(t) for t in tasks]
+    if entity == "folder":
+        folders = db.query(Folder).filter(Folder.user_id == user_id, Folder.id.in_(ids)).all()
+        return [crud._folder_out(f) for f in folders]
+    if entity == "deadline":
+        deadlines = db.query(Deadline).filter(Deadline.user_id == user_id, Deadline.id.in_(ids)).all()
+        return [crud._deadline_out(d) for d in deadlines]
+    tags = db.query(Tag).filter(Tag.user_id == user_id, Tag.id.in_(ids)).all()
+    return [crud._tag_out(t) for t in tags]
+
+
+def _sync(db: Session, user_id: int, version: int, since: int) -> SyncOut:
+    # since=0 - первая синхронизация; since из будущего - состояние клиента не от этой БД
+    if since <= 0 or since > version:
+        return _full_snapshot(db, user_id, version)
+
+    upserts: Dict[str, List[int]] = {}
+    deletes: Dict[str, List[int]] = {}
+    changes = db.query(ChangeLog.entity, ChangeLog.entity_id, ChangeLog.op).filter(
+        ChangeLog.user_id == user_id,
+        ChangeLog.version > since
+    )
+    for entity, entity_id, op in changes:
+        # Настройки (entity "settings") в /api/sync не входят
+        if entity in _ENTITIES:
+            (deletes if op == DELETE else upserts).setdefault(entity, []).append(entity_id)
+
+    result = SyncOut(version=version, full=False, deleted=SyncDeleted())
+    for entity, ids in upserts.items():
+        items = _load_changed(db, user_id, entity, ids)
+        field = _ENTITIES[entity][1]
+        setattr(result, field, items)
+        # Сущность могла быть удалена уже после чтения журнала
+        missing = set(ids) - {item.id for item in items}
+        deletes.setdefault(entity, []).extend(missing)
+    for entity, ids in deletes.items():
+        setattr(result.deleted, _ENTITIES[entity][1], sorted(ids))
+    return result
+
+
+@router.get("/sync", response_model=SyncOut, dependencies=[Depends(deadlines_etag)])
+def sync(
+    since: int = Query(0, ge=0),
+    db: Session = Depends(get_read_db),
+    user=Depends(get_current_reader),
+):
+    """Изменения с версии since (версия берется из поля version предыдущего ответа)"""
+    return _sync(db, user.id, user.data_version or 0, since)
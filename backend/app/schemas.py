@@ -1,6 +1,6 @@
 from typing import Optional, Any
 from datetime import datetime
-from pydantic import BaseModel, field_serializer, model_validator
+from pydantic import BaseModel, Field, field_serializer, model_validator
 
 
 class UserCreate(BaseModel):
@@ -56,6 +56,11 @@ class Token(BaseModel):
     token_type: str = "bearer"
 
 
+class EventsTicket(BaseModel):
+    ticket: str
+    expires_in: float
+
+
 class LoginRequest(BaseModel):
     username: str
     uuid: str
@@ -110,6 +115,13 @@ class TaskOut(BaseModel):
         from_attributes = True
 
 
+class TaskPage(BaseModel):
+    """Страница задач; next_cursor передается в следующий запрос, None - последняя страница"""
+    items: list[TaskOut]
+    next_cursor: str | None
+    limit: int
+
+
 # Folders
 class FolderBase(BaseModel):
     name: str
@@ -178,12 +190,41 @@ class NoteCreate(NoteBase):
     pass
 
 
+MAX_DELTA_OPS = 1000  # Максимум правок в content_delta
+
+
+class ContentSplice(BaseModel):
+    """Замена delete символов начиная с at на insert.
+
+    Позиции - в единицах UTF-16, как индексы строк в JS; правки применяются
+    по очереди, каждая к результату предыдущей.
+    """
+    at: int = Field(ge=0)
+    delete: int = Field(0, ge=0)
+    insert: str = ""
+
+
+class ContentDelta(BaseModel):
+    """Изменение content относительно версии, которую видел клиент"""
+    base_hash: str  # sha256 (hex) исходного content в UTF-8; у заметки без content - пустой строки
+    ops: list[ContentSplice] = Field(max_length=MAX_DELTA_OPS)
+    result_hash: str | None = None  # sha256 ожидаемого результата, если клиент хочет его сверить
+
+
 class NoteUpdate(BaseModel):
     title: str | None = None
     content: str | None = None
+    content_delta: ContentDelta | None = None  # Вместо content: правки текущего текста
     tags_text: str | None = None  # текст с тегами
     folder_id: int | None = None
 
+    @model_validator(mode='after')
+    def check_content(self):
+        """content и content_delta - два способа передать один и тот же текст"""
+        if self.content_delta is not None and 'content' in self.model_fields_set:
+            raise ValueError('Передайте content или content_delta, но не оба')
+        return self
+
 
 class NoteOut(BaseModel):
     id: int
@@ -198,6 +239,57 @@ class NoteOut(BaseModel):
         from_attributes = True
 
 
+class NoteSummaryOut(BaseModel):
+    """Заметка для списков (fields=summary): без content, с готовым превью"""
+    id: int
+    title: str
+    folder_id: int | None
+    is_favorite: bool = False
+    snippet: str | None
+    content_length: int
+    todo_done: int | None = None  # Прогресс todo-заметки: выполнено непустых пунктов
+    todo_total: int | None = None  # и всего непустых пунктов (None - обычная заметка)
+    tags: list[TagOut]
+    has_deadline_notifications: bool = False
+
+
+class NotePage(BaseModel):
+    """Страница заметок; next_cursor передается в следующий запрос, None - последняя страница"""
+    items: list[NoteOut | NoteSummaryOut]
+    next_cursor: str | None
+    limit: int
+
+
+# Todo items
+class TodoItemOut(BaseModel):
+    id: int
+    text: str
+    completed: bool
+
+
+class TodoItemCreate(BaseModel):
+    text: str = ""
+    completed: bool = False
+    position: int | None = Field(None, ge=0)  # None - в конец списка
+
+
+class TodoItemUpdate(BaseModel):
+    text: str | None = None
+    completed: bool | None = None
+
+
+class TodoItemsOrder(BaseModel):
+    item_ids: list[int]  # Все пункты заметки в новом порядке
+
+
+class TodoItemsOut(BaseModel):
+    """Результат изменения пунктов: сам пункт (кроме удаления и порядка) и прогресс заметки"""
+    note_id: int
+    item: TodoItemOut | None = None
+    done: int
+    total: int
+
+
 # Deadlines
 class DeadlineCreate(BaseModel):
     note_id: int
@@ -222,6 +314,157 @@ class DeadlineOut(BaseModel):
         from_attributes = True
 
 
+# Agenda
+class AgendaItem(BaseModel):
+    id: int
+    note_id: int
+    note_title: str
+    deadline_at: str
+    notification_enabled: bool
+    status: str  # "active", "today", "overdue" - как в DeadlineOut
+
+
+class AgendaDay(BaseModel):
+    date: str  # Локальный день (YYYY-MM-DD) в часовом поясе запроса
+    overdue: int
+    today: int
+    active: int
+    items: list[AgendaItem]
+
+
+class AgendaOut(BaseModel):
+    """Дедлайны диапазона дней по локальным дням; дни без дедлайнов не включаются"""
+    tz: str
+    overdue: int
+    today: int
+    active: int
+    days: list[AgendaDay]
+
+
+# Sync
+class SyncDeleted(BaseModel):
+    notes: list[int] = []
+    tasks: list[int] = []
+    folders: list[int] = []
+    deadlines: list[int] = []
+    tags: list[int] = []
+
+
+class SyncOut(BaseModel):
+    """Изменения с версии since. full=True - это полный снимок данных, а не разница"""
+    version: int
+    full: bool
+    notes: list[NoteOut] = []
+    tasks: list[TaskOut] = []
+    folders: list[FolderOut] = []
+    deadlines: list[DeadlineOut] = []
+    tags: list[TagOut] = []
+    deleted: SyncDeleted = SyncDeleted()
+
+
+# Facets
+class FacetCount(BaseModel):
+    id: int | None  # id тега или папки (None - заметки без папки)
+    count: int
+
+
+class TaskFacets(BaseModel):
+    total: int
+    tags: list[FacetCount]
+
+
+class NoteFacets(BaseModel):
+    """Счетчики для текущего фильтра; folders считаются без учета фильтра по папке"""
+    total: int
+    tags: list[FacetCount]
+    folders: list[FacetCount]
+
+
+# Search
+class SearchHit(BaseModel):
+    type: str  # "note" или "task"
+    id: int
+    title: str
+    snippet: str | None  # Фрагмент текста вокруг совпадения
+    folder_id: int | None = None
+    score: int  # 2 - все слова запроса есть в заголовке, 1 - совпадение в тексте
+    updated_at: str  # У задач - дата создания
+
+
+class SearchOut(BaseModel):
+    items: list[SearchHit]
+
+
+# Batch
+BATCH_MAX_ITEMS = 500  # Максимум операций одного вида в пакете
+
+
+class TaskBatchUpdate(TaskUpdate):
+    id: int
+
+
+class TaskBatch(BaseModel):
+    create: list[TaskCreate] = Field(default_factory=list, max_length=BATCH_MAX_ITEMS)
+    update: list[TaskBatchUpdate] = Field(default_factory=list, max_length=BATCH_MAX_ITEMS)
+    delete: list[int] = Field(default_factory=list, max_length=BATCH_MAX_ITEMS)
+
+
+class NoteBatchUpdate(NoteUpdate):
+    id: int
+
+
+class NoteBatch(BaseModel):
+    create: list[NoteCreate] = Field(default_factory=list, max_length=BATCH_MAX_ITEMS)
+    update: list[NoteBatchUpdate] = Field(default_factory=list, max_length=BATCH_MAX_ITEMS)
+    delete: list[int] = Field(default_factory=list, max_length=BATCH_MAX_ITEMS)
+
+
+class DeadlineBatchUpdate(DeadlineUpdate):
+    note_id: int
+
+
+class DeadlineBatch(BaseModel):
+    """Операции над дедлайнами; delete и toggle_notifications - списки id заметок"""
+    create: list[DeadlineCreate] = Field(default_factory=list, max_length=BATCH_MAX_ITEMS)
+    update: list[DeadlineBatchUpdate] = Field(default_factory=list, max_length=BATCH_MAX_ITEMS)
+    delete: list[int] = Field(default_factory=list, max_length=BATCH_MAX_ITEMS)
+    toggle_notifications: list[int] = Field(default_factory=list, max_length=BATCH_MAX_ITEMS)
+
+
+class BatchItemResult(BaseModel):
+    """Результат одной операции пакета: op и index - вид операции и ее позиция в запросе,
+    status - HTTP-код, который вернул бы отдельный запрос, detail - текст ошибки"""
+    op: str
+    index: int
+    id: int | None = None
+    status: int = 200
+    detail: str | None = None
+
+
+class TaskBatchResult(BatchItemResult):
+    item: TaskOut | None = None
+
+
+class NoteBatchResult(BatchItemResult):
+    item: NoteOut | None = None
+
+
+class DeadlineBatchResult(BatchItemResult):
+    item: DeadlineOut | None = None
+
+
+class TaskBatchOut(BaseModel):
+    results: list[TaskBatchResult]
+
+
+class NoteBatchOut(BaseModel):
+    results: list[NoteBatchResult]
+
+
+class DeadlineBatchOut(BaseModel):
+    results: list[DeadlineBatchResult]
+
+
 # User Settings
 class UserSettingsOut(BaseModel):
     id: int
@@ -239,3 +482,15 @@ class UserSettingsUpdate(BaseModel):
     theme: str | None = None  # "light" or "dark"
     notification_times_minutes: list[int] | None = None  # Массив минут до дедлайна (до 10 штук)
 
+
+# Bootstrap
+class BootstrapOut(BaseModel):
+    """Данные главного экрана одним ответом; в ответе только запрошенные разделы"""
+    version: int
+    folders: list[FolderOut] | None = None
+    notes: list[NoteOut | NoteSummaryOut] | None = None
+    favorite: NoteOut | None = None  # null - избранной заметки нет
+    deadlines: list[DeadlineOut] | None = None
+    tags: list[TagOut] | None = None
+    tasks: list[TaskOut] | None = None
+    settings: UserSettingsOut | None = None
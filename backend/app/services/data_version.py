@@ -0,0 +1,64 @@
+"""
+Счетчик версии данных пользователя (users.data_version) и журнал изменений.
+
+Версия увеличивается в каждой изменяющей операции в той же транзакции, поэтому
+по ней строятся ETag списков (304 без выполнения запросов списка), проверка
+If-Match и /api/sync: record_changes помечает измененные сущности текущей версией.
+После коммита такой транзакции сбрасывается кэш чтения пользователей (read_cache),
+а изменения рассылаются в /api/events (events).
+"""
+from typing import Iterable
+
+from sqlalchemy import update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from ..coalescing import mark_changed as mark_coalescing_changed
+from ..models.change_log import ChangeLog
+from ..models.user import User
+from . import events
+from .read_cache import mark_changed
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+
+def _versions(db: Session) -> dict:
+    return db.info.setdefault("data_versions", {})
+
+
+def bump_data_version(db: Session, *user_ids: int) -> None:
+    """Увеличивает версию данных пользователей в текущей транзакции"""
+    if user_ids:
+        rows = db.execute(
+            update(User)
+            .where(User.id.in_(user_ids))
+            .values(data_version=User.data_version + 1)
+            .returning(User.id, User.data_version)
+            .execution_options(synchronize_session=False)
+        ).all()
+        _versions(db).update(dict(rows))
+        mark_changed(db, *user_ids)
+        mark_coalescing_changed(db, *user_ids)
+        for user_id, version in rows:
+            events.mark_version(db, user_id, version)
+
+
+def record_changes(db: Session, user_id: int, entity: str, entity_ids: Iterable[int], op: str = UPSERT) -> None:
+    """Отмечает сущности измененными в текущей версии данных пользователя"""
+    entity_ids = list(entity_ids)
+    if not entity_ids:
+        return
+    version = _versions(db).get(user_id)
+    if version is None:
+        bump_data_version(db, user_id)
+        version = _versions(db)[user_id]
+    stmt = insert(ChangeLog).values([
+        {"user_id": user_id, "version": version, "entity": entity, "entity_id": entity_id, "op": op}
+        for entity_id in entity_ids
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["user_id", "entity", "entity_id"],
+        set_={"version": stmt.excluded.version, "op": stmt.excluded.op},
+    ))
+    events.mark_changes(db, user_id, version, entity, entity_ids, op)
@@ -0,0 +1,164 @@
+"""
+Поток изменений для клиентов (/api/events, Server-Sent Events).
+
+Изменяющие операции отмечают в транзакции новую версию данных пользователя
+(bump_data_version) и измененные сущности (record_changes); после коммита
+брокер рассылает их открытым потокам пользователя одним событием
+{"version", "changes": [{"entity", "id", "op"}]}. Откат транзакции ничего
+не рассылает. Планировщик уведомлений сообщает об отправленных напоминаниях
+событием notification.
+
+Брокер живет в цикле событий приложения: публикация из потоков (синхронные
+маршруты, очередь записи, планировщик) передается в цикл через
+call_soon_threadsafe, у каждого потока своя ограниченная очередь. Если
+клиент не успевает читать и очередь переполнена, ее содержимое заменяется
+событием resync - клиент перечитывает данные (например, через /api/sync).
+События рассылаются только внутри процесса.
+
+EventSource в браузере не передает заголовки, а JWT в строке запроса попал бы
+в журналы доступа, поэтому поток открывается по одноразовому билету: он живет
+EVENTS_TICKET_TTL_SECONDS и хранится в памяти процесса, как и подписки.
+"""
+import asyncio
+import secrets
+import threading
+import time
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+
+# Больше изменений в одном событии не перечисляется (truncated: true)
+MAX_EVENT_CHANGES = 100
+
+# Событие закрытия потока при остановке приложения
+CLOSE = None
+
+
+class EventBroker:
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.loop: asyncio.AbstractEventLoop | None = None
+        # user_id -> очереди открытых потоков пользователя; меняется только в цикле событий
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        self.published = 0
+        self.resyncs = 0
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.loop = loop
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+
+    def publish(self, user_id: int, name: str, data: dict) -> None:
+        """Отправляет событие потокам пользователя; можно вызывать из любого потока"""
+        loop = self.loop
+        if loop is None or user_id not in self._subscribers or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._deliver, user_id, (name, data))
+
+    def _deliver(self, user_id: int, item: tuple) -> None:
+        for queue in self._subscribers.get(user_id, ()):
+            if queue.full():
+                # Клиент не успевает читать: пропущенное заменяется одним resync
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(("resync", {"version": item[1].get("version")}))
+                self.resyncs += 1
+            else:
+                queue.put_nowait(item)
+            self.published += 1
+
+    def close(self) -> None:
+        """Завершает все открытые потоки (при остановке приложения)"""
+        for queues in self._subscribers.values():
+            for queue in queues:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(CLOSE)
+        self.loop = None
+
+    def stats(self) -> dict:
+        return {
+            "connections": sum(len(queues) for queues in self._subscribers.values()),
+            "users": len(self._subscribers),
+            "published": self.published,
+            "resyncs": self.resyncs,
+        }
+
+
+broker = EventBroker(settings.events_queue_size)
+
+# билет -> (user_id, срок действия)
+_tickets: Dict[str, Tuple[int, float]] = {}
+_tickets_lock = threading.Lock()
+
+
+def issue_ticket(user_id: int) -> str:
+    """Одноразовый билет на подключение пользователя к потоку"""
+    ticket = secrets.token_urlsafe(32)
+    now = time.monotonic()
+    with _tickets_lock:
+        for expired in [t for t, (_, expires) in _tickets.items() if expires <= now]:
+            del _tickets[expired]
+        _tickets[ticket] = (user_id, now + settings.events_ticket_ttl_seconds)
+    return ticket
+
+
+def redeem_ticket(ticket: str) -> Optional[int]:
+    """Пользователь билета; билет погашается. None - билет неизвестен или истек"""
+    with _tickets_lock:
+        entry = _tickets.pop(ticket, None)
+    if entry is None or entry[1] <= time.monotonic():
+        return None
+    return entry[0]
+
+
+def _pending(db: Session) -> dict:
+    return db.info.setdefault("events_pending", {})
+
+
+def mark_version(db: Session, user_id: int, version: int) -> None:
+    """Новая версия данных пользователя в транзакции (вызывается из bump_data_version)"""
+    _pending(db).setdefault(user_id, {"version": version, "changes": []})["version"] = version
+
+
+def mark_changes(db: Session, user_id: int, version: int, entity: str, entity_ids: Iterable[int], op: str) -> None:
+    """Измененные сущности пользователя в транзакции (вызывается из record_changes)"""
+    pending = _pending(db).setdefault(user_id, {"version": version, "changes": []})
+    changes = pending["changes"]
+    for entity_id in entity_ids:
+        if len(changes) >= MAX_EVENT_CHANGES:
+            pending["truncated"] = True
+            break
+        changes.append({"entity": entity, "id": entity_id, "op": op})
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed(session: Session) -> None:
+    if session.in_nested_transaction():
+        # Событие приходит и на коммит SAVEPOINT (операции пачки WriteQueue):
+        # рассылаем только после коммита внешней транзакции
+        return
+    pending = session.info.pop("events_pending", None)
+    for user_id, data in (pending or {}).items():
+        broker.publish(user_id, "change", data)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session) -> None:
+    if session.in_nested_transaction():
+        # Отметки откаченной операции пачки убирает сама WriteQueue
+        return
+    session.info.pop("events_pending", None)
@@ -8,12 +8,15 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from sqlalchemy.orm import Session
 
+from ..core.config import settings
 from ..db import SessionLocal
 from ..models.todo import Deadline, DeadlineNotification, Note
 from ..models.user import User
 from ..models.user_settings import UserSettings
 from .bot_service import send_message_to_user
+from .events import broker
 from .message_tracker import track_message
+from .tag_service import collect_orphan_tags
 
 logger = logging.getLogger(__name__)
 
@@ -104,12 +107,7 @@ def check_and_send_notifications():
                     continue
                 
                 # Проверяем, что заметка является todo
-                try:
-                    import json
-                    parsed = json.loads(note.content or "{}")
-                    if parsed.get("type") != "todo" or not isinstance(parsed.get("items"), list):
-                        continue
-                except:
+                if not note.is_todo:
                     continue
                 
                 user = db.query(User).filter(User.id == deadline.user_id).first()
@@ -134,6 +132,7 @@ def check_and_send_notifications():
                     )
                     db.add(notification)
                     db.commit()
+                    broker.publish(user.id, "notification", {"deadline_id": deadline.id, "note_id": note.id, "type": "expired"})
                     logger.info(f"✅ Уведомление об окончании дедлайна отправлено для дедлайна {deadline.id}: {message}")
                 else:
                     error_code = result.get("error_code")
@@ -163,12 +162,7 @@ def check_and_send_notifications():
                     continue
                 
                 # Проверяем, что заметка является todo
-                try:
-                    import json
-                    parsed = json.loads(note.content or "{}")
-                    if parsed.get("type") != "todo" or not isinstance(parsed.get("items"), list):
-                        continue
-                except:
+                if not note.is_todo:
                     continue
                 
                 user = db.query(User).filter(User.id == deadline.user_id).first()
@@ -249,6 +243,9 @@ def check_and_send_notifications():
                             )
                             db.add(notification)
                             db.commit()
+                            broker.publish(user.id, "notification", {
+                                "deadline_id": deadline.id, "note_id": note.id, "type": notification_type,
+                            })
                             logger.info(f"✅ Уведомление отправлено для дедлайна {deadline.id}: {message}")
                             # Прерываем цикл после отправки первого подходящего уведомления
                             break
@@ -287,6 +284,13 @@ def start_scheduler():
         name='Проверка и отправка уведомлений о дедлайнах',
         replace_existing=True
     )
+    scheduler.add_job(
+        collect_orphan_tags,
+        trigger=IntervalTrigger(minutes=settings.tag_gc_interval_minutes),
+        id='tag_gc',
+        name='Удаление неиспользуемых тегов',
+        replace_existing=True
+    )
     scheduler.start()
     logger.info("Планировщик уведомлений о дедлайнах запущен (проверка каждую минуту)")
 
@@ -0,0 +1,153 @@
+"""
+Кэш небольших моделей чтения пользователей в памяти процесса: папки, теги,
+настройки, избранная заметка.
+
+Запись кэша пользователя помечена версией данных (users.data_version), с
+которой она прочитана; при обращении с другой версией запись сбрасывается.
+Версия читается из БД в каждом запросе вместе с пользователем, поэтому
+изменения из других процессов тоже видны. Кроме того, после коммита
+транзакции, увеличившей версию (bump_data_version), записи ее пользователей
+удаляются сразу.
+
+Пользователи вытесняются по LRU, когда превышен лимит памяти
+(READ_CACHE_MAX_BYTES, размер оценивается по JSON моделей) или числа
+пользователей (READ_CACHE_MAX_USERS). READ_CACHE_MAX_BYTES=0 выключает кэш.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from pydantic_core import to_json
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+
+_MISSING = object()
+
+
+class ReadCache:
+    def __init__(self, max_bytes: int, max_users: int):
+        self.max_bytes = max_bytes
+        self.max_users = max_users
+        self.lock = threading.Lock()
+        # user_id -> (версия данных, {ключ: (значение, размер)})
+        self._users: "OrderedDict[int, Tuple[int, Dict[str, Tuple[Any, int]]]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and self.max_users > 0
+
+    def _drop(self, user_id: int) -> None:
+        _, values = self._users.pop(user_id)
+        self._bytes -= sum(size for _, size in values.values())
+
+    def lookup(self, user_id: int, version: int, key: str) -> Any:
+        """Значение из кэша или _MISSING"""
+        with self.lock:
+            entry = self._users.get(user_id)
+            if entry is not None and entry[0] < version:
+                self._drop(user_id)
+                entry = None
+            if entry is None or entry[0] != version or key not in entry[1]:
+                self.misses += 1
+                return _MISSING
+            self._users.move_to_end(user_id)
+            self.hits += 1
+            return entry[1][key][0]
+
+    def store(self, user_id: int, version: int, key: str, value: Any) -> None:
+        if not self.enabled:
+            return
+        size = len(to_json(value))
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            entry = self._users.get(user_id)
+            if entry is not None and entry[0] != version:
+                if entry[0] > version:
+                    # Значение прочитано до изменения, уже попавшего в кэш
+                    return
+                self._drop(user_id)
+                entry = None
+            if entry is None:
+                entry = self._users[user_id] = (version, {})
+            old = entry[1].get(key)
+            self._bytes += size - (old[1] if old else 0)
+            entry[1][key] = (value, size)
+            self._users.move_to_end(user_id)
+            while self._bytes > self.max_bytes or len(self._users) > self.max_users:
+                self._drop(next(iter(self._users)))
+                self.evictions += 1
+
+    def invalidate(self, *user_ids: int) -> None:
+        """Сбрасывает кэш пользователей (без аргументов - всех)"""
+        with self.lock:
+            for user_id in user_ids or list(self._users):
+                if user_id in self._users:
+                    self._drop(user_id)
+                    self.invalidations += 1
+
+    def get(self, user, key: str, load: Callable[..., Any], *args) -> Any:
+        """Значение key пользователя user из кэша или load(*args)"""
+        if not self.enabled:
+            return load(*args)
+        version = user.data_version or 0
+        value = self.lookup(user.id, version, key)
+        if value is _MISSING:
+            value = load(*args)
+            self.store(user.id, version, key, value)
+        return value
+
+    async def get_async(self, user, key: str, load: Callable[..., Awaitable[Any]], *args) -> Any:
+        if not self.enabled:
+            return await load(*args)
+        version = user.data_version or 0
+        value = self.lookup(user.id, version, key)
+        if value is _MISSING:
+            value = await load(*args)
+            self.store(user.id, version, key, value)
+        return value
+
+    def stats(self) -> dict:
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / requests, 4) if requests else 0.0,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "users": len(self._users),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+read_cache = ReadCache(settings.read_cache_max_bytes, settings.read_cache_max_users)
+
+
+def mark_changed(db: Session, *user_ids: int) -> None:
+    """Отмечает, что транзакция меняет данные пользователей (вызывается из bump_data_version)"""
+    db.info.setdefault("read_cache_changed", set()).update(user_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed(session: Session) -> None:
+    if session.in_nested_transaction():
+        return
+    users = session.info.pop("read_cache_changed", None)
+    if users:
+        read_cache.invalidate(*users)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed(session: Session) -> None:
+    if session.in_nested_transaction():
+        return
+    session.info.pop("read_cache_changed", None)
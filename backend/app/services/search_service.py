@@ -0,0 +1,146 @@
+"""
+Полнотекстовый поиск по заметкам и задачам (SQLite FTS5).
+
+Индексы notes_fts и tasks_fts - обычные таблицы FTS5, rowid которых совпадает
+с id заметки/задачи. Их поддерживают триггеры на notes, todo_items и tasks,
+поэтому индекс остается согласованным при любом способе записи (ORM, пакетные
+UPDATE, миграции). Для todo-заметок индексируется текст пунктов (todo_items):
+отметка пункта выполненным индекс не трогает.
+
+Колонка owner содержит токен пользователя (u<id>): поиск всегда ограничен
+владельцем прямо в MATCH, и FTS5 пересекает списки документов, не перебирая
+совпадения других пользователей. Встроенный bm25 для этого не подходит: IDF
+он считает по всему индексу, то есть для частого слова читает его полный список
+документов всех пользователей (на 1M заметок - десятки и сотни миллисекунд),
+поэтому результаты ранжируются в роутере поиска по совпадению в заголовке и дате.
+"""
+import re
+from typing import List
+
+from sqlalchemy.engine import Connection
+
+SEARCH_TABLES = ("notes_fts", "tasks_fts")
+MAX_QUERY_TERMS = 10
+
+_TOKENIZE = "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'"
+
+# Текст пунктов todo-заметки в порядке списка
+_TODO_BODY = """
+    (SELECT group_concat(text, char(10)) FROM (
+        SELECT text FROM todo_items WHERE note_id = {note_id} ORDER BY position
+    ))
+"""
+
+# Текст заметки для индекса: у todo - тексты пунктов (как их видит пользователь)
+_NOTE_BODY = "CASE WHEN {row}.is_todo THEN " + _TODO_BODY.format(note_id="{row}.id") + " ELSE {row}.content END"
+
+
+def owner_token(user_id: int) -> str:
+    return f"u{user_id}"
+
+
+def create_search_tables(conn: Connection) -> None:
+    """Создает таблицы FTS5, которых еще нет"""
+    if conn.dialect.name != "sqlite":
+        return
+    for table in SEARCH_TABLES:
+        exists = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).scalar()
+        if not exists:
+            conn.exec_driver_sql(f"CREATE VIRTUAL TABLE {table} USING fts5(title, body, owner, {_TOKENIZE})")
+
+
+def create_search_index(conn: Connection) -> None:
+    """Создает таблицы FTS5 и триггеры синхронизации (повторный вызов ничего не меняет)"""
+    if conn.dialect.name != "sqlite":
+        return
+    create_search_tables(conn)
+
+    new_body = _NOTE_BODY.format(row="new")
+    conn.exec_driver_sql(f"""
+        CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN
+            INSERT INTO notes_fts (rowid, title, body, owner)
+            VALUES (new.id, new.title, {new_body}, 'u' || new.user_id);
+        END
+    """)
+    conn.exec_driver_sql("""
+        CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN
+            DELETE FROM notes_fts WHERE rowid = old.id;
+        END
+    """)
+    # Срабатывает только при изменении индексируемых колонок (не на избранное и т.п.)
+    conn.exec_driver_sql(f"""
+        CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE OF title, content, is_todo, user_id ON notes BEGIN
+            UPDATE notes_fts SET title = new.title, body = {new_body}, owner = 'u' || new.user_id
+            WHERE rowid = old.id;
+        END
+    """)
+    # Пункты todo: меняется только тело документа заметки (done не индексируется);
+    # пункты заметки, которая перестала быть todo, удаляются уже после смены ее текста
+    for event, row in (("INSERT", "new"), ("DELETE", "old"), ("UPDATE OF text", "new")):
+        name = "todo_items_fts_" + event.split()[0].lower()
+        conn.exec_driver_sql(f"""
+            CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON todo_items
+            WHEN (SELECT is_todo FROM notes WHERE id = {row}.note_id) BEGIN
+                UPDATE notes_fts SET body = {_TODO_BODY.format(note_id=f"{row}.note_id")}
+                WHERE rowid = {row}.note_id;
+            END
+        """)
+    conn.exec_driver_sql("""
+        CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+            INSERT INTO tasks_fts (rowid, title, body, owner)
+            VALUES (new.id, new.title, new.description, 'u' || new.user_id);
+        END
+    """)
+    conn.exec_driver_sql("""
+        CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+            DELETE FROM tasks_fts WHERE rowid = old.id;
+        END
+    """)
+    conn.exec_driver_sql("""
+        CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF title, description, user_id ON tasks BEGIN
+            UPDATE tasks_fts SET title = new.title, body = new.description, owner = 'u' || new.user_id
+            WHERE rowid = old.id;
+        END
+    """)
+
+
+def rebuild_search_index(conn: Connection) -> None:
+    """Заново заполняет индексы по текущим notes и tasks"""
+    if conn.dialect.name != "sqlite":
+        return
+    conn.exec_driver_sql("DELETE FROM notes_fts")
+    conn.exec_driver_sql(f"""
+        INSERT INTO notes_fts (rowid, title, body, owner)
+        SELECT id, title, {_NOTE_BODY.format(row="notes")}, 'u' || user_id FROM notes
+    """)
+    conn.exec_driver_sql("DELETE FROM tasks_fts")
+    conn.exec_driver_sql("""
+        INSERT INTO tasks_fts (rowid, title, body, owner)
+        SELECT id, title, description, 'u' || user_id FROM tasks
+    """)
+    for table in SEARCH_TABLES:
+        conn.exec_driver_sql(f"INSERT INTO {table}({table}) VALUES ('optimize')")
+
+
+def build_match_query(user_id: int, query: str, prefix_last: bool = True, columns: str = "title body") -> str | None:
+    """Превращает пользовательский ввод в выражение FTS5 по колонкам columns документов пользователя.
+
+    Каждое слово берется в кавычки, поэтому синтаксис FTS5 (OR, NEAR, двоеточия)
+    из ввода не интерпретируется; слово со звездочкой в конце - префиксный
+    поиск, последнее слово при prefix_last ищется по префиксу всегда (поиск по
+    мере набора). Возвращает None, если в запросе нет ни одного слова.
+    """
+    terms: List[str] = []
+    for raw in query.split():
+        words = re.findall(r"[^\W_]+", raw)
+        for i, word in enumerate(words):
+            is_prefix = raw.endswith("*") and i == len(words) - 1
+            terms.append(f'"{word}"' + ("*" if is_prefix else ""))
+    terms = terms[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    if prefix_last and not terms[-1].endswith("*"):
+        terms[-1] += "*"
+    return f"owner : {owner_token(user_id)} AND {{{columns}}} : (" + " ".join(terms) + ")"
@@ -0,0 +1,196 @@
+"""
+Кэш id тегов пользователей, индекс подсказок тегов и фоновая очистка тегов,
+которые больше не связаны ни с одной задачей или заметкой.
+
+Кэш id и индекс подсказок хранятся не более чем для TAG_CACHE_MAX_USERS
+пользователей каждый; давно не обращавшиеся вытесняются (LRU).
+"""
+import bisect
+import heapq
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from sqlalchemy import delete, event, exists
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..db import SessionLocal
+from ..models.todo import Tag, note_tag, task_tag
+from .data_version import DELETE, record_changes
+
+logger = logging.getLogger(__name__)
+
+# user_id -> {имя тега: id}. Кэш процесса; записи могут устареть (откат
+# транзакции, сборка мусора, другой процесс), поэтому при использовании
+# id проверяются в том же UPDATE, что увеличивает usage_count
+_tag_ids: "OrderedDict[int, Dict[str, int]]" = OrderedDict()
+_tag_ids_lock = threading.Lock()
+
+
+def cached_tag_ids(user_id: int) -> Dict[str, int]:
+    with _tag_ids_lock:
+        ids = _tag_ids.get(user_id)
+        if ids is None:
+            return {}
+        _tag_ids.move_to_end(user_id)
+        return dict(ids)
+
+
+def remember_tag_ids(user_id: int, ids: Dict[str, int]) -> None:
+    with _tag_ids_lock:
+        _tag_ids.setdefault(user_id, {}).update(ids)
+        _tag_ids.move_to_end(user_id)
+        while len(_tag_ids) > settings.tag_cache_max_users:
+            _tag_ids.popitem(last=False)
+
+
+def forget_tag_ids(user_id: int | None = None) -> None:
+    """Сбрасывает кэш пользователя (или весь кэш, если user_id не указан)"""
+    with _tag_ids_lock:
+        if user_id is None:
+            _tag_ids.clear()
+        else:
+            _tag_ids.pop(user_id, None)
+
+
+# Индекс подсказок: user_id -> (имена по алфавиту, теги в том же порядке, теги
+# по убыванию usage_count - для пустого префикса). Тег - кортеж (usage_count, id, name, color). Индекс пользователя сбрасывается
+# после коммита транзакции, изменившей его теги; _suggest_generation защищает от
+# записи в кэш индекса, прочитанного до этого коммита
+_suggest: "OrderedDict[int, Tuple[List[str], List[tuple], List[tuple]] | None]" = OrderedDict()
+# user_id -> номер последнего сброса индекса пользователя (значение _suggest_clock).
+# Тоже ограничен; у вытесненных пользователей номер сброса считается равным
+# наибольшему вытесненному (_suggest_evicted) - это может лишь не дать
+# сохранить индекс, но не сохранит устаревший
+_suggest_generation: "OrderedDict[int, int]" = OrderedDict()
+_suggest_clock = 0
+_suggest_evicted = 0
+_suggest_lock = threading.Lock()
+
+
+def mark_tags_changed(db: Session, user_id: int) -> None:
+    """Отмечает, что транзакция меняет теги пользователя (имена или usage_count)"""
+    db.info.setdefault("tags_changed", set()).add(user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _forget_changed_suggestions(session: Session) -> None:
+    if session.in_nested_transaction():
+        return
+    users = session.info.pop("tags_changed", None)
+    if users:
+        forget_tag_suggestions(*users)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_suggestions(session: Session) -> None:
+    if session.in_nested_transaction():
+        return
+    session.info.pop("tags_changed", None)
+
+
+def forget_tag_suggestions(*user_ids: int) -> None:
+    """Сбрасывает индекс подсказок пользователей (без аргументов - всех)"""
+    global _suggest_clock, _suggest_evicted
+
+    with _suggest_lock:
+        _suggest_clock += 1
+        if not user_ids:
+            _suggest.clear()
+            _suggest_generation.clear()
+            _suggest_evicted = _suggest_clock
+            return
+        for user_id in user_ids:
+            _suggest.pop(user_id, None)
+            _suggest_generation.pop(user_id, None)
+            _suggest_generation[user_id] = _suggest_clock
+        while len(_suggest_generation) > settings.tag_cache_max_users:
+            _, generation = _suggest_generation.popitem(last=False)
+            _suggest_evicted = max(_suggest_evicted, generation)
+
+
+def _load_suggest_index(db: Session, user_id: int):
+    """Строит индекс из БД; None - тегов слишком много, подсказки будут запросом"""
+    rows = db.query(Tag.usage_count, Tag.id, Tag.name, Tag.color).filter(
+        Tag.user_id == user_id
+    ).order_by(Tag.name).limit(settings.tag_suggest_max_cached + 1).all()
+    if len(rows) > settings.tag_suggest_max_cached:
+        return None
+    tags = [tuple(row) for row in rows]
+    return [tag[2] for tag in tags], tags, sorted(tags, key=_by_usage)
+
+
+def _by_usage(tag: tuple) -> tuple:
+    return -tag[0], tag[2]
+
+
+def _suggest_from_db(db: Session, user_id: int, prefix: str, limit: int) -> List[tuple]:
+    # Диапазон по имени - то же, что LIKE 'prefix%', но идет по индексу ix_tags_user_id_name
+    # (LIKE в SQLite регистронезависимый и обычный индекс не использует)
+    query = db.query(Tag.usage_count, Tag.id, Tag.name, Tag.color).filter(Tag.user_id == user_id)
+    if prefix:
+        query = query.filter(Tag.name >= prefix, Tag.name < prefix + "\uffff")
+    return [tuple(row) for row in query.order_by(Tag.usage_count.desc(), Tag.name).limit(limit)]
+
+
+def suggest_tags(db: Session, user_id: int, prefix: str, limit: int) -> List[tuple]:
+    """Самые используемые теги пользователя, начинающиеся с prefix: (usage_count, id, name, color)"""
+    with _suggest_lock:
+        cached = user_id in _suggest
+        if cached:
+            _suggest.move_to_end(user_id)
+        index = _suggest.get(user_id)
+        started = _suggest_clock
+    if not cached:
+        index = _load_suggest_index(db, user_id)
+        with _suggest_lock:
+            # Индекс не сбрасывался, пока строился
+            if _suggest_generation.get(user_id, _suggest_evicted) <= started:
+                _suggest[user_id] = index
+                _suggest.move_to_end(user_id)
+                while len(_suggest) > settings.tag_cache_max_users:
+                    _suggest.popitem(last=False)
+    if index is None:
+        return _suggest_from_db(db, user_id, prefix, limit)
+
+    names, tags, by_usage = index
+    if not prefix:
+        return by_usage[:limit]
+    start = bisect.bisect_left(names, prefix)
+    end = bisect.bisect_left(names, prefix + "\uffff", lo=start)
+    return heapq.nsmallest(limit, tags[start:end], key=_by_usage)
+
+
+def collect_orphan_tags() -> int:
+    """Удаляет теги с нулевым usage_count и возвращает их количество"""
+    db = SessionLocal()
+    try:
+        # Связи проверяем дополнительно: счетчик мог разойтись с данными
+        deleted = db.execute(
+            delete(Tag).where(
+                Tag.usage_count <= 0,
+                ~exists().where(note_tag.c.tag_id == Tag.id),
+                ~exists().where(task_tag.c.tag_id == Tag.id),
+            ).returning(Tag.user_id, Tag.id)
+        ).all()
+        by_user: Dict[int, List[int]] = {}
+        for user_id, tag_id in deleted:
+            by_user.setdefault(user_id, []).append(tag_id)
+        # Список тегов этих пользователей изменился
+        for user_id, tag_ids in by_user.items():
+            record_changes(db, user_id, "tag", tag_ids, DELETE)
+        for user_id in by_user:
+            mark_tags_changed(db, user_id)
+        db.commit()
+        if deleted:
+            forget_tag_ids()
+            logger.info(f"Удалено неиспользуемых тегов: {len(deleted)}")
+        return len(deleted)
+    except Exception as e:
+        db.rollback()
+        logger.exception(f"Ошибка при очистке тегов: {e}")
+        return 0
+    finally:
+        db.close()
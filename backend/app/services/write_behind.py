@@ -0,0 +1,269 @@
+"""
+Отложенная запись автосохранений заметок (включается при NOTE_WRITE_BEHIND=1).
+
+Фронтенд сохраняет заметку во время набора текста, и каждое сохранение было
+отдельной транзакцией. В этом режиме изменения title/content одной заметки
+копятся в памяти и записываются одним обновлением: через NOTE_WRITE_BEHIND_DELAY_MS
+после первого изменения, при NOTE_WRITE_BEHIND_MAX_PENDING заметках в буфере
+и при остановке приложения.
+
+Любой другой запрос пользователя (чтение, ETag, прочие изменения) сначала
+записывает его отложенные изменения (flush_user), поэтому пользователь всегда
+видит свои правки. Буфер живет в памяти процесса: при нескольких процессах
+(uvicorn --workers) запрос, попавший в другой процесс, отложенных правок не
+видит, поэтому режим рассчитан на один процесс.
+
+Клиент уже получил ответ, поэтому ошибка отложенной записи не теряет правку
+молча: временная ошибка (БД занята, 503 очереди записи) возвращает изменения
+в буфер для повторной записи (до MAX_WRITE_ATTEMPTS попыток), постоянная
+(например, заметку удалили с другого устройства) запоминается, и следующее
+изменение этой заметки получает ее в ответе 409.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy.exc import OperationalError
+
+from ..core.config import settings
+from ..db import SessionLocal
+from .write_queue import run_batched_write
+
+logger = logging.getLogger(__name__)
+
+# Попыток записи объекта при временных ошибках, после этого ошибка считается постоянной
+MAX_WRITE_ATTEMPTS = 5
+
+
+def _is_retryable(error: Exception) -> bool:
+    # database is locked и отмена ожидания в очереди записи (503)
+    if isinstance(error, HTTPException):
+        return error.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    return isinstance(error, OperationalError)
+
+
+class WriteBehindBuffer:
+    """Буфер изменений с объединением по ключу (user_id, id объекта).
+
+    write(db, user_id, key, fields) - функция записи в стиле _update_*: вызывается
+    через run_batched_write с объединенными полями всех изменений объекта.
+    Чтение буфера вместе с чтением объекта из БД и запись буфера выполняются под
+    блокировкой объекта (key_lock), поэтому объект не может оказаться записанным
+    "между" ними. Общий lock защищает только словари буфера и на время обращений
+    к БД не удерживается: запись одной заметки не задерживает остальные.
+    """
+
+    def __init__(self, write, delay_ms: float = 2000, max_pending: int = 1000):
+        self._write = write
+        self._delay = delay_ms / 1000
+        self._max_pending = max_pending
+        self.lock = threading.Lock()
+        # (user_id, key) -> (поля, срок записи); порядок вставки совпадает с порядком сроков
+        self._pending: Dict[Tuple[int, int], Tuple[dict, float]] = {}
+        # user_id -> число объектов в буфере или в процессе записи
+        self._users: Dict[int, int] = {}
+        # (user_id, key) -> [блокировка объекта, число ожидающих и владельцев]
+        self._key_locks: Dict[Tuple[int, int], list] = {}
+        # (user_id, key) -> число неудачных попыток записи
+        self._attempts: Dict[Tuple[int, int], int] = {}
+        # (user_id, key) -> ошибка записи, о которой еще не сообщили клиенту
+        self._errors: Dict[Tuple[int, int], str] = {}
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self.updates = 0
+        self.writes = 0
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Записывает все отложенные изменения и останавливает поток"""
+        if self._thread is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        self._thread.join()
+        self._thread = None
+
+    @contextmanager
+    def key_lock(self, user_id: int, key: int):
+        """Блокировка объекта: его чтение вместе с буфером, изменение буфера и запись"""
+        with self.lock:
+            entry = self._key_locks.get((user_id, key))
+            if entry is None:
+                entry = self._key_locks[(user_id, key)] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self.lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._key_locks[(user_id, key)]
+
+    def get(self, user_id: int, key: int) -> Optional[dict]:
+        """Отложенные поля объекта (вызывать под key_lock)"""
+        with self.lock:
+            entry = self._pending.get((user_id, key))
+            return dict(entry[0]) if entry else None
+
+    def put(self, user_id: int, key: int, fields: dict) -> dict:
+        """Добавляет изменение к отложенным и возвращает объединенные поля (вызывать под key_lock).
+
+        Срок записи отсчитывается от первого изменения, так что при непрерывном
+        наборе заметка все равно записывается раз в окно.
+        """
+        with self.lock:
+            entry = self._pending.get((user_id, key))
+            if entry is None:
+                merged, deadline = dict(fields), time.monotonic() + self._delay
+                self._users[user_id] = self._users.get(user_id, 0) + 1
+            else:
+                merged, deadline = {**entry[0], **fields}, entry[1]
+            self._pending[(user_id, key)] = (merged, deadline)
+            self.updates += 1
+            if len(self._pending) >= self._max_pending or (entry is None and len(self._pending) == 1):
+                # Переполнение - записать сразу; первая запись - поток пересчитает время ожидания
+                self._wakeup.set()
+            return dict(merged)
+
+    def take(self, user_id: int, key: int) -> Optional[dict]:
+        """Забирает отложенные поля объекта, чтобы записать их вместе с другим изменением (под key_lock)"""
+        with self.lock:
+            entry = self._pending.pop((user_id, key), None)
+            if entry is None:
+                return None
+            self._forget_user(user_id)
+            return entry[0]
+
+    def take_error(self, user_id: int, key: int) -> Optional[str]:
+        """Ошибка отложенной записи объекта, если она была (сообщается один раз)"""
+        with self.lock:
+            return self._errors.pop((user_id, key), None)
+
+    def has_pending(self, user_id: int) -> bool:
+        return user_id in self._users
+
+    def flush_user(self, user_id: int) -> None:
+        """Записывает отложенные изменения пользователя (перед любым другим его запросом).
+
+        Объекты, которые сейчас записываются другим потоком, тоже дожидаемся.
+        """
+        if not self.has_pending(user_id):
+            return
+        with self.lock:
+            keys = [k for k in self._pending if k[0] == user_id]
+            keys += [k for k in self._key_locks if k[0] == user_id and k not in self._pending]
+        self._flush(keys)
+
+    def flush(self, due_only: bool = False) -> None:
+        with self.lock:
+            keys = list(self._pending)
+            if due_only and len(keys) < self._max_pending:
+                now = time.monotonic()
+                keys = [k for k in keys if self._pending[k][1] <= now]
+        self._flush(keys)
+
+    def _forget_user(self, user_id: int) -> None:
+        if self._users[user_id] > 1:
+            self._users[user_id] -= 1
+        else:
+            del self._users[user_id]
+
+    def _flush(self, keys: List[Tuple[int, int]]) -> None:
+        for user_id, key in keys:
+            # Пока объект записывается, его чтение с буфером ждет key_lock, а
+            # пользователь остается в _users - flush_user дождется записи
+            with self.key_lock(user_id, key):
+                with self.lock:
+                    entry = self._pending.pop((user_id, key), None)
+                if entry is None:
+                    # Уже записан другим потоком или забран take
+                    continue
+                db = SessionLocal()
+                try:
+                    run_batched_write(db, self._write, user_id, key, entry[0])
+                    self.writes += 1
+                    with self.lock:
+                        self._attempts.pop((user_id, key), None)
+                except Exception as e:
+                    self._failed(user_id, key, entry[0], e)
+                finally:
+                    db.close()
+                    with self.lock:
+                        self._forget_user(user_id)
+
+    def _failed(self, user_id: int, key: int, fields: dict, error: Exception) -> None:
+        # Вызывается под key_lock объекта: новых изменений в буфере у него нет
+        with self.lock:
+            attempts = self._attempts.pop((user_id, key), 0) + 1
+            if _is_retryable(error) and attempts < MAX_WRITE_ATTEMPTS and not self._stopping:
+                self._pending[(user_id, key)] = (fields, time.monotonic() + self._delay)
+                self._attempts[(user_id, key)] = attempts
+                self._users[user_id] += 1
+                self._wakeup.set()
+                logger.warning(
+                    f"Отложенная запись не выполнена (пользователь {user_id}, объект {key}), "
+                    f"попытка {attempts}, повтор через окно: {error}"
+                )
+                return
+            detail = error.detail if isinstance(error, HTTPException) else str(error)
+            self._errors[(user_id, key)] = detail
+            while len(self._errors) > self._max_pending:
+                del self._errors[next(iter(self._errors))]
+        logger.error(f"Отложенная запись отброшена (пользователь {user_id}, объект {key}, поля {sorted(fields)}): {detail}")
+
+    def _next_timeout(self) -> Optional[float]:
+        with self.lock:
+            if not self._pending:
+                return None
+            _, deadline = next(iter(self._pending.values()))
+            return max(deadline - time.monotonic(), 0)
+
+    def _run(self) -> None:
+        while not self._stopping:
+            self._wakeup.wait(self._next_timeout())
+            self._wakeup.clear()
+            self.flush(due_only=not self._stopping)
+        self.flush()
+
+
+note_buffer: Optional[WriteBehindBuffer] = None
+
+
+def start_note_write_behind(write) -> None:
+    """Включает отложенную запись заметок, если задан NOTE_WRITE_BEHIND"""
+    global note_buffer
+
+    if not settings.note_write_behind or note_buffer is not None:
+        return
+    note_buffer = WriteBehindBuffer(write, settings.note_write_behind_delay_ms, settings.note_write_behind_max_pending)
+    note_buffer.start()
+    logger.info(
+        f"Отложенная запись заметок включена: окно {settings.note_write_behind_delay_ms} мс, "
+        f"до {settings.note_write_behind_max_pending} заметок в буфере"
+    )
+
+
+def stop_note_write_behind() -> None:
+    global note_buffer
+
+    if note_buffer is not None:
+        note_buffer.stop()
+        logger.info(
+            f"Отложенная запись заметок остановлена: {note_buffer.updates} изменений "
+            f"записано {note_buffer.writes} обновлениями"
+        )
+    note_buffer = None
+
+
+def flush_user_writes(user_id: int) -> None:
+    """Записывает отложенные изменения пользователя, если они есть"""
+    if note_buffer is not None:
+        note_buffer.flush_user(user_id)
@@ -0,0 +1,198 @@
+"""
+Групповой коммит записей в SQLite (включается при WRITE_BATCHING=1).
+
+Мелкие изменяющие операции из параллельных запросов ставятся в очередь одного
+потока-писателя. Он собирает их пачкой (до WRITE_BATCH_MAX_SIZE операций или
+WRITE_BATCH_MAX_DELAY_MS миллисекунд), выполняет каждую в своем SAVEPOINT внутри
+одной транзакции BEGIN IMMEDIATE и делает один COMMIT. Future каждого запроса
+получает свой результат или свою ошибку; ошибка одной операции откатывает только
+ее SAVEPOINT вместе с ее отметками в session.info (события, сброс кэшей,
+версии данных), так что после коммита пачки они не срабатывают.
+
+При ASYNC_DB=1 без WRITE_BATCHING тот же поток служит единственным писателем
+асинхронных эндпоинтов: операции выполняются по одной, каждая в своей
+транзакции BEGIN IMMEDIATE, и не соревнуются за блокировку записи SQLite.
+Ожидание в очереди ограничено WRITE_QUEUE_TIMEOUT_SECONDS: операция, которая
+так и не начала выполняться, отменяется с ответом 503.
+"""
+import asyncio
+import copy
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from ..core.config import settings
+from ..db import create_db_engine, is_sqlite_url, run_write
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WriteQueue:
+    """Очередь изменяющих операций с одним потоком-писателем"""
+
+    def __init__(self, engine: Engine, max_batch: int = 64, max_delay_ms: float = 5.0):
+        self._session_factory = sessionmaker(bind=engine, autoflush=False)
+        self._max_batch = max_batch
+        self._max_delay = max_delay_ms / 1000
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self.batches = 0
+        self.units = 0
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Дожидается выполнения уже поставленных операций и останавливает поток"""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    def submit(self, fn, *args) -> Future:
+        """Ставит fn(db, *args) в очередь; результат придет в возвращаемый Future"""
+        future: Future = Future()
+        self._queue.put((future, fn, args))
+        return future
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self._max_delay
+            while len(batch) < self._max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._process(batch)
+
+    def _process(self, batch: list) -> None:
+        outcomes = []
+        db: Session = self._session_factory()
+        try:
+            for future, fn, args in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                info = copy.deepcopy(dict(db.info))
+                savepoint = db.begin_nested()
+                try:
+                    result = fn(db, *args)
+                    savepoint.commit()
+                    outcomes.append((future, result, None))
+                except Exception as e:
+                    savepoint.rollback()
+                    # Отметки откаченной операции не должны сработать после коммита пачки
+                    db.info.clear()
+                    db.info.update(info)
+                    outcomes.append((future, None, e))
+            db.commit()
+        except Exception as e:
+            # Не удалось зафиксировать пачку целиком: ошибка достается всем операциям
+            logger.exception(f"Ошибка группового коммита ({len(batch)} операций): {e}")
+            db.rollback()
+            outcomes = [(future, None, error or e) for future, _, error in outcomes]
+        finally:
+            db.close()
+
+        self.batches += 1
+        self.units += len(outcomes)
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+write_queue: Optional[WriteQueue] = None
+
+
+def start_write_queue() -> None:
+    """Запускает писатель, если включен WRITE_BATCHING или ASYNC_DB и БД - файл SQLite"""
+    global write_queue
+
+    if not (settings.write_batching or settings.async_db) or write_queue is not None:
+        return
+    url = settings.database_url
+    if not is_sqlite_url(url) or ":memory:" in url:
+        if settings.write_batching:
+            logger.warning("WRITE_BATCHING поддерживается только для файловой SQLite, групповой коммит выключен")
+        return
+    # Собственное соединение писателя: явный BEGIN IMMEDIATE нужен для SAVEPOINT
+    engine = create_db_engine(url, begin_mode="IMMEDIATE", pool_size=1, max_overflow=0)
+    if settings.write_batching:
+        write_queue = WriteQueue(engine, settings.write_batch_max_size, settings.write_batch_max_delay_ms)
+        logger.info(
+            f"Групповой коммит включен: до {settings.write_batch_max_size} операций "
+            f"или {settings.write_batch_max_delay_ms} мс на транзакцию"
+        )
+    else:
+        # ASYNC_DB: записи асинхронных эндпоинтов по одной через единственного писателя
+        write_queue = WriteQueue(engine, max_batch=1, max_delay_ms=0)
+        logger.info("Единственный писатель для асинхронных эндпоинтов включен")
+    write_queue.start()
+
+
+def stop_write_queue() -> None:
+    global write_queue
+
+    if write_queue is not None:
+        write_queue.stop()
+        logger.info(f"Групповой коммит остановлен: {write_queue.units} операций в {write_queue.batches} транзакциях")
+    write_queue = None
+
+
+def _cancel_waiting(future: Future) -> None:
+    # Операция так и не начала выполняться - снимаем ее с очереди;
+    # уже начатую дожидаемся, иначе ответ не совпадет с тем, что записано
+    if future.cancel():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="База данных занята, повторите запрос позже",
+        )
+
+
+def run_batched_write(db: Session, fn, *args):
+    """Выполняет fn через общий писатель (если включен) или в транзакции запроса"""
+    if write_queue is None:
+        return run_write(db, fn, *args)
+    future = write_queue.submit(fn, *args)
+    try:
+        return future.result(timeout=settings.write_queue_timeout_seconds)
+    except TimeoutError:
+        _cancel_waiting(future)
+        return future.result()
+
+
+async def run_batched_write_async(db, fn, *args):
+    """Асинхронный вариант run_batched_write для эндпоинтов на AsyncSession"""
+    if write_queue is None:
+        return await db.run_sync(run_write, fn, *args)
+    future = write_queue.submit(fn, *args)
+    result = asyncio.wrap_future(future)
+    try:
+        return await asyncio.wait_for(asyncio.shield(result), settings.write_queue_timeout_seconds)
+    except TimeoutError:
+        _cancel_waiting(future)
+        return await result
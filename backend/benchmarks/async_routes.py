@@ -0,0 +1,125 @@
+"""
+Нагрузочный тест синхронных (threadpool) и асинхронных (ASYNC_DB=1) эндпоинтов.
+
+Каждый режим запускается в отдельном процессе на временной БД; запросы идут
+in-process через httpx.ASGITransport, поэтому измеряется только само приложение.
+
+Использование:
+    python benchmarks/async_routes.py
+    python benchmarks/async_routes.py --concurrency 200 --requests 4000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def _load(concurrency: int, total: int, notes: int, write_every: int) -> dict:
+    import httpx
+    from app.db import Base, engine
+    from app.main import app
+    from app import models  # noqa: F401
+
+    logging.getLogger().setLevel(logging.WARNING)
+    Base.metadata.create_all(bind=engine)
+
+    transport = httpx.ASGITransport(app=app)
+    # Lifespan запускает писателя (очередь записи) и закрывает асинхронные движки
+    async with app.router.lifespan_context(app), httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post("/auth/register", json={"username": "bench", "uuid": "bench"})
+        token = (await client.post("/auth/login", json={"username": "bench", "uuid": "bench"})).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        note_ids = []
+        for i in range(notes):
+            r = await client.post("/api/notes", json={"title": f"n{i}", "content": "text " * 50, "tags_text": "#bench"}, headers=headers)
+            note_ids.append(r.json()["id"])
+
+        latencies = []
+        errors = 0
+        queue = asyncio.Queue()
+        for i in range(total):
+            queue.put_nowait(i)
+
+        async def worker():
+            nonlocal errors
+            while not queue.empty():
+                i = queue.get_nowait()
+                started = time.perf_counter()
+                try:
+                    if write_every and i % write_every == 0:
+                        note_id = note_ids[i % len(note_ids)]
+                        r = await client.patch(f"/api/notes/{note_id}", json={"content": f"edit {i}"}, headers=headers)
+                    else:
+                        r = await client.get("/api/notes", headers=headers)
+                    ok = r.status_code < 400
+                except Exception:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "errors": errors,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+    }
+
+
+def _child(args):
+    result = asyncio.run(_load(args.concurrency, args.requests, args.notes, args.write_every))
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--notes", type=int, default=50)
+    parser.add_argument("--write-every", type=int, default=10, help="каждый N-й запрос - PATCH заметки (0 - только чтение)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, BACKEND_DIR)
+        _child(args)
+        return
+
+    for mode, async_db in (("sync", "0"), ("async", "1")):
+        with tempfile.TemporaryDirectory() as tmp:
+            # Пул не меньше числа параллельных запросов: иначе синхронный режим упирается
+            # в ожидание соединения внутри потоков threadpool
+            env = dict(
+                os.environ,
+                ASYNC_DB=async_db,
+                DATABASE_URL=f"sqlite:///{tmp}/bench.sqlite3",
+                DB_POOL_SIZE=str(args.concurrency),
+            )
+            out = subprocess.run(
+                [sys.executable, __file__, "--child", "--concurrency", str(args.concurrency),
+                 "--requests", str(args.requests), "--notes", str(args.notes),
+                 "--write-every", str(args.write_every)],
+                env=env, cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+            )
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+            print(
+                f"{mode:6s} req/s={result['rps']:8.1f} p50={result['p50_ms']:7.1f}ms "
+                f"p95={result['p95_ms']:7.1f}ms errors={result['errors']}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Бенчмарк группового коммита: записей в секунду при 50-500 параллельных клиентах.
+
+Сравниваются два режима выполнения одной и той же операции crud._update_note
+(автосохранение заметки):
+    - per-request: каждый клиент открывает свою сессию и коммитит свою транзакцию
+      (как run_write в обычных эндпоинтах);
+    - group-commit: операции идут через WriteQueue и коммитятся пачками.
+
+Использование:
+    python benchmarks/group_commit.py
+    python benchmarks/group_commit.py --clients 50 200 --seconds 5
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_tmp = tempfile.mkdtemp(prefix="group_commit_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'bench.sqlite3')}"
+
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.db import create_db_engine, engine, run_write  # noqa: E402
+from app.migrations import run_migrations  # noqa: E402
+from app.models import Note, User  # noqa: E402
+from app.routers import crud  # noqa: E402
+from app.schemas import NoteUpdate  # noqa: E402
+from app.services.write_queue import WriteQueue  # noqa: E402
+
+
+def _prepare(clients: int) -> tuple[int, list[int]]:
+    run_migrations(engine)
+    with sessionmaker(bind=engine)() as db:
+        user = User(username="bench", uuid="bench")
+        db.add(user)
+        db.flush()
+        notes = [Note(user_id=user.id, title=f"n{i}", content="text " * 50) for i in range(clients)]
+        db.add_all(notes)
+        db.commit()
+        return user.id, [note.id for note in notes]
+
+
+def _run(clients: int, seconds: float, user_id: int, note_ids: list[int], submit) -> dict:
+    stop = time.monotonic() + seconds
+    counters = {"writes": 0, "errors": 0}
+    lock = threading.Lock()
+    start = threading.Barrier(clients)
+
+    def client(n):
+        done = errors = 0
+        start.wait()
+        while time.monotonic() < stop:
+            try:
+                submit(user_id, note_ids[n], NoteUpdate(content=f"edit {n} {done}"))
+                done += 1
+            except Exception:
+                errors += 1
+        with lock:
+            counters["writes"] += done
+            counters["errors"] += errors
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+    return {"writes_per_s": counters["writes"] / elapsed, "errors": counters["errors"]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[50, 100, 200, 500])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    user_id, note_ids = _prepare(max(args.clients))
+
+    print(f"{'clients':>8} {'mode':>13} {'writes/s':>10} {'errors':>7}")
+    for clients in args.clients:
+        per_request_engine = create_db_engine(settings.database_url, pool_size=clients, max_overflow=0)
+        Session = sessionmaker(bind=per_request_engine, autoflush=False)
+
+        def per_request(*unit):
+            with Session() as db:
+                run_write(db, crud._update_note, *unit)
+
+        result = _run(clients, args.seconds, user_id, note_ids, per_request)
+        print(f"{clients:>8} {'per-request':>13} {result['writes_per_s']:>10.0f} {result['errors']:>7}")
+        per_request_engine.dispose()
+
+        writer_engine = create_db_engine(settings.database_url, begin_mode="IMMEDIATE", pool_size=1, max_overflow=0)
+        queue = WriteQueue(writer_engine, settings.write_batch_max_size, settings.write_batch_max_delay_ms)
+        queue.start()
+        result = _run(
+            clients, args.seconds, user_id, note_ids,
+            lambda *unit: queue.submit(crud._update_note, *unit).result(),
+        )
+        queue.stop()
+        writer_engine.dispose()
+        avg_batch = queue.units / queue.batches if queue.batches else 0
+        print(
+            f"{clients:>8} {'group-commit':>13} {result['writes_per_s']:>10.0f} {result['errors']:>7}"
+            f"   (в среднем {avg_batch:.1f} операций на транзакцию)"
+        )
+
+
+if __name__ == "__main__":
+    main()
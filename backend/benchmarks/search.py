@@ -0,0 +1,154 @@
+"""
+Бенчмарк полнотекстового поиска /api/search на синтетических данных.
+
+Создает временную БД с N заметками (по умолчанию 1 000 000) у U пользователей,
+индекс FTS5 заполняется триггерами при вставке. Затем измеряет задержку
+crud-ядра поиска (routers/search._search) для типичных запросов и, для
+сравнения, наивный поиск LIKE '%слово%' по заметкам пользователя.
+
+Использование:
+    python benchmarks/search.py
+    python benchmarks/search.py --notes 200000 --users 200 --queries 200
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_tmp = tempfile.mkdtemp(prefix="search_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'bench.sqlite3')}"
+
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.db import engine  # noqa: E402
+from app.migrations import run_migrations  # noqa: E402
+from app.routers.search import _search  # noqa: E402
+
+SYLLABLES = ["ка", "ро", "ми", "на", "то", "ли", "се", "ва", "ду", "пе", "zo", "ra", "ne", "ti", "lu", "mo"]
+
+
+def _vocabulary(size: int, rng: random.Random) -> list[str]:
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def _prepare(notes: int, users: int, rng: random.Random, vocabulary: list[str]) -> None:
+    run_migrations(engine)
+    # Частоты слов по Ципфу: несколько очень частых слов и длинный хвост редких
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+
+    def words(count: int) -> str:
+        return " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=count))
+
+    started = time.monotonic()
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO users (id, username, uuid, data_version) VALUES (?, ?, ?, 0)",
+            [(u, f"user{u}", f"uuid{u}") for u in range(1, users + 1)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO folders (id, user_id, name, is_default) VALUES (?, ?, ?, 0)",
+            [(u * 2 + k, u, f"folder{k}") for u in range(1, users + 1) for k in range(2)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO tags (id, user_id, name, color, usage_count) VALUES (?, ?, ?, '#000000', 0)",
+            [(u, u, "tag") for u in range(1, users + 1)],
+        )
+        batch = []
+        links = []
+        for note_id in range(1, notes + 1):
+            user_id = rng.randint(1, users)
+            if rng.random() < 0.2:
+                items = [{"id": i, "text": words(4), "completed": rng.random() < 0.5} for i in range(5)]
+                content = json.dumps({"type": "todo", "items": items}, ensure_ascii=False)
+            else:
+                content = words(30)
+            batch.append((note_id, user_id, user_id * 2 + rng.randint(0, 1), words(3), content))
+            if rng.random() < 0.1:
+                links.append((note_id, user_id))
+            if len(batch) == 10000:
+                conn.exec_driver_sql(
+                    "INSERT INTO notes (id, user_id, folder_id, title, content, is_favorite, content_length) "
+                    "VALUES (?, ?, ?, ?, ?, 0, 0)", batch,
+                )
+                batch = []
+        if batch:
+            conn.exec_driver_sql(
+                "INSERT INTO notes (id, user_id, folder_id, title, content, is_favorite, content_length) "
+                "VALUES (?, ?, ?, ?, ?, 0, 0)", batch,
+            )
+        conn.exec_driver_sql("INSERT INTO note_tag (note_id, tag_id) VALUES (?, ?)", links)
+        conn.exec_driver_sql("INSERT INTO notes_fts(notes_fts) VALUES ('optimize')")
+    print(f"Подготовлено {notes} заметок у {users} пользователей за {time.monotonic() - started:.0f} с")
+
+
+def _measure(label: str, fn, runs: list) -> None:
+    timings = []
+    for args in runs:
+        started = time.perf_counter()
+        fn(*args)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<32} p50 {statistics.median(timings):>8.2f} мс   p95 {p95:>8.2f} мс")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notes", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=100)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    rng = random.Random(42)
+    vocabulary = _vocabulary(5000, rng)
+    _prepare(args.notes, args.users, rng, vocabulary)
+
+    db = sessionmaker(bind=engine)()
+    users = [rng.randint(1, args.users) for _ in range(args.queries)]
+    common, rare = vocabulary[:20], vocabulary[-2000:]
+
+    def runs(make_query):
+        return [(u, make_query()) for u in users]
+
+    cases = [
+        ("частое слово", runs(lambda: rng.choice(common))),
+        ("редкое слово", runs(lambda: rng.choice(rare))),
+        ("два слова", runs(lambda: f"{rng.choice(common)} {rng.choice(vocabulary[:500])}")),
+        ("префикс (3 символа)", runs(lambda: rng.choice(vocabulary)[:3] + "*")),
+    ]
+    for label, case_runs in cases:
+        _measure(f"FTS5: {label}", lambda u, q: _search(db, u, q, prefix=False), case_runs)
+    _measure(
+        "FTS5: частое слово + папка",
+        lambda u, q: _search(db, u, q, folder_id=u * 2, prefix=False), cases[0][1],
+    )
+    _measure(
+        "FTS5: частое слово + тег",
+        lambda u, q: _search(db, u, q, tag_id=u, prefix=False), cases[0][1],
+    )
+
+    def like(user_id, query):
+        db.execute(text(
+            "SELECT id FROM notes WHERE user_id = :u AND (title LIKE :q OR content LIKE :q) LIMIT 20"
+        ), {"u": user_id, "q": f"%{query}%"}).all()
+
+    _measure("LIKE: редкое слово", like, cases[1][1])
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
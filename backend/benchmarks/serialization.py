@@ -0,0 +1,133 @@
+"""
+Микробенчмарк сериализации ответов списков: /api/tasks, /api/notes, /api/folders,
+/api/deadlines.
+
+Для каждого списка на одних и тех же объектах из БД сравниваются:
+    - response_model: модели собираются с проверкой, затем FastAPI еще раз
+      проверяет и сериализует их через response_model (прежний путь);
+    - fast JSON: model_construct + app.responses.fast_response;
+    - fast msgpack: то же с Accept: application/msgpack (если установлен msgpack).
+Чтение из БД в замер не входит.
+
+Использование:
+    python benchmarks/serialization.py
+    python benchmarks/serialization.py --items 5000 --repeat 20
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_tmp = tempfile.mkdtemp(prefix="serialization_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'bench.sqlite3')}"
+
+from fastapi import Request, Response  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_model_field  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app import responses  # noqa: E402
+from app.db import engine  # noqa: E402
+from app.migrations import run_migrations  # noqa: E402
+from app.routers import crud  # noqa: E402
+from app.schemas import DeadlineOut, FolderOut, NoteOut, TaskOut  # noqa: E402
+
+
+def _prepare(items: int) -> None:
+    run_migrations(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO users (id, username, uuid, data_version) VALUES (1, 'bench', 'bench', 0)")
+        conn.exec_driver_sql(
+            "INSERT INTO folders (id, user_id, name, is_default) VALUES (?, 1, ?, ?)",
+            [(i, f"folder{i}", i == 1) for i in range(1, min(items, 200) + 1)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO tags (id, user_id, name, color, usage_count) VALUES (?, 1, ?, '#85C1E2', 0)",
+            [(i, f"tag{i}") for i in range(1, 11)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO notes (id, user_id, folder_id, title, content, is_favorite, content_length) "
+            "VALUES (?, 1, 1, ?, ?, 0, 0)",
+            [(i, f"note {i}", "text " * 60) for i in range(1, items + 1)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO tasks (id, user_id, title, description, due_at, is_completed) "
+            "VALUES (?, 1, ?, ?, '2030-01-01 10:00:00', 0)",
+            [(i, f"task {i}", "description " * 10) for i in range(1, items + 1)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO note_tag (note_id, tag_id) VALUES (?, ?)",
+            [(i, t) for i in range(1, items + 1) for t in (i % 10 + 1, (i + 3) % 10 + 1)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO task_tag (task_id, tag_id) VALUES (?, ?)",
+            [(i, i % 10 + 1) for i in range(1, items + 1)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO deadlines (id, user_id, note_id, deadline_at, notification_enabled) "
+            "VALUES (?, 1, ?, '2099-01-01 00:00:00', 1)",
+            [(i, i) for i in range(1, items + 1)],
+        )
+
+
+def _request(accept: str) -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": [(b"accept", accept.encode())]})
+
+
+def _measure(label: str, fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    median = statistics.median(timings)
+    print(f"    {label:<16} {median:>9.2f} мс")
+    return median
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    _prepare(args.items)
+    db = sessionmaker(bind=engine)()
+    loop = asyncio.new_event_loop()
+    json_request, msgpack_request = _request("application/json"), _request("application/msgpack")
+
+    endpoints = [
+        ("/api/tasks", TaskOut, crud._list_tasks(db, 1)),
+        ("/api/notes", NoteOut, crud._list_notes(db, 1)),
+        ("/api/folders", FolderOut, crud._list_folders(db, 1)),
+        ("/api/deadlines", DeadlineOut, crud._list_deadlines(db, 1)),
+    ]
+    for path, model, content in endpoints:
+        print(f"{path} ({len(content)} объектов)")
+        field = create_model_field("Response_" + model.__name__, List[model], mode="serialization")
+        dumped = [item.model_dump() for item in content]
+
+        def old_path():
+            validated = [model(**item) for item in dumped]
+            body = loop.run_until_complete(serialize_response(field=field, response_content=validated))
+            JSONResponse(body)
+
+        before = _measure("response_model", old_path, args.repeat)
+        after = _measure("fast JSON", lambda: responses.fast_response(json_request, Response(), content), args.repeat)
+        if responses.msgpack is not None:
+            _measure("fast msgpack", lambda: responses.fast_response(msgpack_request, Response(), content), args.repeat)
+        print(f"    ускорение JSON: x{before / after:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Бенчмарк конкурентного чтения/записи SQLite: движок без профиля (как раньше)
+против движка с профилем хранения из app.db (WAL, synchronous, busy_timeout, ...).
+
+Использование:
+    python benchmarks/storage_profile.py
+    python benchmarks/storage_profile.py --writers 8 --readers 16 --seconds 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from app.db import create_db_engine  # noqa: E402
+
+
+def _prepare(engine):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE notes (id INTEGER PRIMARY KEY, user_id INTEGER, title TEXT, content TEXT)"))
+        conn.execute(text("CREATE INDEX ix_notes_user_id ON notes(user_id)"))
+        conn.execute(
+            text("INSERT INTO notes (user_id, title, content) VALUES (:u, :t, :c)"),
+            [{"u": i % 50, "t": f"note {i}", "c": "x" * 500} for i in range(5000)],
+        )
+
+
+def _run(engine, writers: int, readers: int, seconds: float) -> dict:
+    stop = time.monotonic() + seconds
+    counters = {"writes": 0, "reads": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def writer(n):
+        done = errors = 0
+        while time.monotonic() < stop:
+            try:
+                with engine.begin() as conn:
+                    conn.execute(
+                        text("INSERT INTO notes (user_id, title, content) VALUES (:u, :t, :c)"),
+                        {"u": n, "t": "bench", "c": "y" * 500},
+                    )
+                done += 1
+            except OperationalError:
+                errors += 1
+        with lock:
+            counters["writes"] += done
+            counters["errors"] += errors
+
+    def reader(n):
+        done = errors = 0
+        while time.monotonic() < stop:
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT id, title, content FROM notes WHERE user_id = :u"), {"u": n % 50}).fetchall()
+                done += 1
+            except OperationalError:
+                errors += 1
+        with lock:
+            counters["reads"] += done
+            counters["errors"] += errors
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {k: v / seconds if k != "errors" else v for k, v in counters.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    pool_size = args.writers + args.readers
+    with tempfile.TemporaryDirectory() as tmp:
+        variants = {
+            "default": create_engine(
+                f"sqlite:///{tmp}/default.sqlite3",
+                connect_args={"check_same_thread": False},
+                pool_size=pool_size,
+            ),
+            "profile": create_db_engine(f"sqlite:///{tmp}/profile.sqlite3", pool_size=pool_size),
+        }
+        for name, engine in variants.items():
+            _prepare(engine)
+            result = _run(engine, args.writers, args.readers, args.seconds)
+            print(
+                f"{name:8s} writes/s={result['writes']:8.1f} reads/s={result['reads']:8.1f} "
+                f"errors={result['errors']}"
+            )
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""
+Применяет недостающие миграции схемы БД (см. app/migrations.py).
+
+То же самое выполняется автоматически при старте приложения; скрипт нужен,
+чтобы прогнать миграции заранее, например перед выкладкой.
+
+Использование:
+    python migrate.py
+"""
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.db import engine  # noqa: E402
+from app.migrations import current_version, latest_version, run_migrations  # noqa: E402
+
+logging.basicConfig(level=logging.INFO)
+
+if __name__ == "__main__":
+    before = current_version(engine)
+    print(f"INFO: Текущая версия схемы: {before if before is not None else 'нет'}, последняя: {latest_version()}")
+    after = run_migrations(engine)
+    print(f"OK: Схема БД в версии {after}")
@@ -0,0 +1,40 @@
+"""
+Общие фикстуры: приложение на временной файловой БД SQLite и пользователь на тест.
+"""
+import os
+import sys
+import tempfile
+import uuid
+
+_tmp = tempfile.mkdtemp(prefix="unitask_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'test.sqlite3')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    from app.main import app
+
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture
+def make_auth(client):
+    """Регистрирует нового пользователя и возвращает его заголовки"""
+    def make() -> dict:
+        name = uuid.uuid4().hex
+        client.post("/auth/register", json={"username": name, "uuid": name})
+        token = client.post("/auth/login", json={"username": name, "uuid": name}).json()["access_token"]
+        return {"Authorization": f"Bearer {token}"}
+
+    return make
+
+
+@pytest.fixture
+def auth(make_auth) -> dict:
+    """Заголовки нового пользователя"""
+    return make_auth()
@@ -0,0 +1,55 @@
+from sqlalchemy import event
+
+from app.db import engine
+
+
+def _etag(client, auth, path):
+    return client.get(path, headers=auth).headers["etag"]
+
+
+def test_batch_without_changes_keeps_version(client, auth):
+    note = client.post("/api/notes", json={"title": "n", "content": "c"}, headers=auth).json()
+    tasks_etag, notes_etag = _etag(client, auth, "/api/tasks"), _etag(client, auth, "/api/notes")
+
+    assert client.post("/api/tasks/batch", json={}, headers=auth).json() == {"results": []}
+    failed = client.post("/api/tasks/batch", json={"update": [{"id": 999999, "title": "x"}], "delete": [999999]}, headers=auth)
+    assert [r["status"] for r in failed.json()["results"]] == [404, 404]
+    assert client.post("/api/deadlines/batch", json={"delete": [note["id"]]}, headers=auth).json()["results"][0]["status"] == 404
+
+    assert _etag(client, auth, "/api/tasks") == tasks_etag
+    assert _etag(client, auth, "/api/notes") == notes_etag
+
+
+def test_batch_bumps_version_once(client, auth):
+    task = client.post("/api/tasks", json={"title": "t"}, headers=auth).json()
+    other = client.post("/api/tasks", json={"title": "o"}, headers=auth).json()
+    version = int(_etag(client, auth, "/api/tasks").strip('W/"'))
+    client.post("/api/tasks/batch", json={
+        "create": [{"title": "new #tag"}], "update": [{"id": task["id"], "title": "t2"}], "delete": [other["id"]],
+    }, headers=auth)
+    assert _etag(client, auth, "/api/tasks") == f'W/"{version + 1}"'
+
+
+def test_unchanged_updates_keep_version(client, auth):
+    task = client.post("/api/tasks", json={"title": "t", "description": "d", "tags_text": "#a"}, headers=auth).json()
+    note = client.post("/api/notes", json={"title": "n", "content": "c"}, headers=auth).json()
+    tasks_etag, notes_etag = _etag(client, auth, "/api/tasks"), _etag(client, auth, "/api/notes")
+    writes = []
+
+    def record(conn, cursor, statement, *args):
+        if statement.lstrip().split()[0].upper() in ("INSERT", "UPDATE", "DELETE"):
+            writes.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        same = client.post("/api/tasks/batch", json={"update": [{"id": task["id"], "title": "t", "description": "d", "tags_text": "#a"}]}, headers=auth)
+        assert same.json()["results"][0]["item"]["title"] == "t"
+        same = client.post("/api/notes/batch", json={"update": [{"id": note["id"], "title": "n", "content": "c"}]}, headers=auth)
+        assert same.json()["results"][0]["item"]["title"] == "n"
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert writes == []
+
+    assert _etag(client, auth, "/api/tasks") == tasks_etag
+    assert _etag(client, auth, "/api/notes") == notes_etag
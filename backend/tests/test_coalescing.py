@@ -0,0 +1,42 @@
+import asyncio
+
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+
+from app import coalescing
+from app.coalescing import CoalescingMiddleware
+from app.security import create_access_token
+from app.services import write_behind
+from app.services.write_behind import WriteBehindBuffer
+
+
+def _request(user_id: int) -> Request:
+    token = create_access_token(str(user_id))
+    return Request({
+        "type": "http", "method": "GET", "path": "/api/notes", "query_string": b"",
+        "headers": [(b"authorization", f"Bearer {token}".encode())],
+    })
+
+
+def test_pending_autosave_disables_coalescing(monkeypatch):
+    middleware = CoalescingMiddleware(None)
+    buffer = WriteBehindBuffer(lambda *args: None)
+    monkeypatch.setattr(write_behind, "note_buffer", buffer)
+    assert middleware._key(_request(7)) is not None
+    with buffer.key_lock(7, 1):
+        buffer.put(7, 1, {"title": "x"})
+    assert middleware._key(_request(7)) is None
+    assert middleware._key(_request(8)) is not None
+
+
+def test_generation_dropped_when_no_leader_left():
+    middleware = CoalescingMiddleware(None)
+
+    async def call_next(request):
+        # Коммит изменения данных пользователя во время запроса
+        coalescing._generations[9] = coalescing._generations.get(9, 0) + 1
+        return StreamingResponse(iter([b"ok"]))
+
+    response = asyncio.run(middleware.dispatch(_request(9), call_next))
+    assert response.body == b"ok"
+    assert 9 not in coalescing._generations and not middleware._leaders
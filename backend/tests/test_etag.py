@@ -0,0 +1,6 @@
+def test_not_modified_varies_by_accept(client, auth):
+    first = client.get("/api/tasks", headers=auth)
+    assert first.headers["vary"] == "Accept"
+    r = client.get("/api/tasks", headers={**auth, "If-None-Match": first.headers["etag"]})
+    assert r.status_code == 304
+    assert r.headers["etag"] == first.headers["etag"] and r.headers["vary"] == "Accept"
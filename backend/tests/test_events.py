@@ -0,0 +1,50 @@
+import logging
+
+from app.core.config import settings
+from app.main import _RedactQueryFilter
+from app.services.events import issue_ticket, redeem_ticket
+
+
+def test_ticket_is_single_use(client, auth):
+    user_id = client.get("/auth/me", headers=auth).json()["id"]
+    ticket = client.post("/api/events/ticket", headers=auth).json()["ticket"]
+    assert redeem_ticket(ticket) == user_id
+    assert redeem_ticket(ticket) is None
+
+
+def test_expired_ticket_is_rejected(monkeypatch):
+    monkeypatch.setattr(settings, "events_ticket_ttl_seconds", 0)
+    assert redeem_ticket(issue_ticket(1)) is None
+
+
+def test_stream_requires_valid_ticket(client, auth):
+    assert client.post("/api/events/ticket").status_code == 401
+    assert client.get("/api/events?ticket=bad").status_code == 401
+    assert client.get("/api/events").status_code == 401
+    # JWT параметром больше не принимается
+    token = auth["Authorization"].split()[1]
+    assert client.get(f"/api/events?token={token}").status_code == 401
+
+
+def test_access_log_hides_ticket_and_token():
+    record = logging.LogRecord(
+        "uvicorn.access", logging.INFO, __file__, 1, '%s - "%s %s HTTP/%s" %d',
+        ("127.0.0.1:1", "GET", "/api/events?ticket=abc&x=1&token=eyJ", "1.1", 200), None,
+    )
+    assert _RedactQueryFilter().filter(record)
+    assert record.getMessage() == '127.0.0.1:1 - "GET /api/events?ticket=***&x=1&token=*** HTTP/1.1" 200'
+
+
+def test_settings_update_is_recorded(client, auth, monkeypatch):
+    from app.services import events
+
+    user_id = client.get("/auth/me", headers=auth).json()["id"]
+    client.get("/api/folders", headers=auth)  # папка по умолчанию создается при первом чтении
+    version = client.get("/api/sync", headers=auth).json()["version"]
+    published = []
+    monkeypatch.setattr(events.broker, "publish", lambda uid, name, data: published.append((uid, data)))
+    assert client.put("/api/settings", json={"theme": "light"}, headers=auth).status_code == 200
+    assert published == [(user_id, {"version": version + 1, "changes": [{"entity": "settings", "id": user_id, "op": "upsert"}]})]
+    # /api/sync пропускает настройки
+    delta = client.get(f"/api/sync?since={version}", headers=auth).json()
+    assert delta["version"] == version + 1 and not delta["full"]
@@ -0,0 +1,157 @@
+"""
+Обновление БД, созданной исходной версией приложения (create_all без schema_version),
+до текущей схемы через run_migrations.
+"""
+import json
+
+from sqlalchemy import create_engine
+
+from app.migrations import latest_version, run_migrations
+from app.services.search_service import build_match_query
+
+# Схема, которую создавал create_all исходной версии
+BASELINE_SCHEMA = """
+CREATE TABLE users (
+    id INTEGER NOT NULL PRIMARY KEY,
+    username VARCHAR NOT NULL,
+    uuid VARCHAR NOT NULL,
+    created_at DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL
+);
+CREATE UNIQUE INDEX ix_users_username ON users (username);
+CREATE UNIQUE INDEX ix_users_uuid ON users (uuid);
+CREATE TABLE tags (
+    id INTEGER NOT NULL PRIMARY KEY,
+    name VARCHAR(64) NOT NULL,
+    color VARCHAR(7)
+);
+CREATE UNIQUE INDEX ix_tags_name ON tags (name);
+CREATE TABLE tasks (
+    id INTEGER NOT NULL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users (id),
+    title VARCHAR(200) NOT NULL,
+    description TEXT,
+    due_at DATETIME,
+    is_completed BOOLEAN NOT NULL,
+    created_at DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL
+);
+CREATE TABLE folders (
+    id INTEGER NOT NULL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users (id),
+    name VARCHAR(200) NOT NULL,
+    is_default BOOLEAN NOT NULL,
+    created_at DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL
+);
+CREATE TABLE user_settings (
+    id INTEGER NOT NULL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    language VARCHAR(2) NOT NULL,
+    theme VARCHAR(10) NOT NULL,
+    notification_times_minutes JSON NOT NULL,
+    created_at DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL,
+    updated_at DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL
+);
+CREATE UNIQUE INDEX ix_user_settings_user_id ON user_settings (user_id);
+CREATE TABLE task_tag (
+    task_id INTEGER NOT NULL REFERENCES tasks (id) ON DELETE CASCADE,
+    tag_id INTEGER NOT NULL REFERENCES tags (id) ON DELETE CASCADE,
+    PRIMARY KEY (task_id, tag_id)
+);
+CREATE TABLE notes (
+    id INTEGER NOT NULL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users (id),
+    folder_id INTEGER REFERENCES folders (id) ON DELETE SET NULL,
+    title VARCHAR(200) NOT NULL,
+    content TEXT,
+    is_favorite BOOLEAN NOT NULL,
+    created_at DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL,
+    updated_at DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL
+);
+CREATE INDEX ix_notes_is_favorite ON notes (is_favorite);
+CREATE TABLE note_tag (
+    note_id INTEGER NOT NULL REFERENCES notes (id) ON DELETE CASCADE,
+    tag_id INTEGER NOT NULL REFERENCES tags (id) ON DELETE CASCADE,
+    PRIMARY KEY (note_id, tag_id)
+);
+CREATE TABLE deadlines (
+    id INTEGER NOT NULL PRIMARY KEY,
+    note_id INTEGER NOT NULL REFERENCES notes (id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users (id),
+    deadline_at DATETIME NOT NULL,
+    notification_enabled BOOLEAN NOT NULL,
+    created_at DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL,
+    updated_at DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL
+);
+CREATE UNIQUE INDEX ix_deadlines_note_id ON deadlines (note_id);
+CREATE TABLE deadline_notifications (
+    id INTEGER NOT NULL PRIMARY KEY,
+    deadline_id INTEGER NOT NULL REFERENCES deadlines (id) ON DELETE CASCADE,
+    notification_type VARCHAR(10) NOT NULL,
+    sent_at DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL,
+    CONSTRAINT uq_deadline_notification UNIQUE (deadline_id, notification_type)
+);
+"""
+
+
+def _baseline_db(path):
+    engine = create_engine(f"sqlite:///{path}")
+    todo = {"type": "todo", "items": [
+        {"id": 7, "text": "альфа", "completed": True},
+        {"id": 7, "text": "бета", "completed": False},
+        {"id": "x", "text": "гамма", "completed": 1},
+        5,
+    ]}
+    with engine.begin() as conn:
+        for statement in BASELINE_SCHEMA.split(";"):
+            if statement.strip():
+                conn.exec_driver_sql(statement)
+        conn.exec_driver_sql("INSERT INTO users (id, username, uuid) VALUES (1, 'u1', '1'), (2, 'u2', '2')")
+        # Глобальный тег "work" у задач обоих пользователей и у заметки второго
+        conn.exec_driver_sql("INSERT INTO tags (id, name) VALUES (1, 'work'), (2, 'unused')")
+        conn.exec_driver_sql("INSERT INTO tasks (id, user_id, title, is_completed) VALUES (1, 1, 'первая', 0), (2, 2, 'вторая', 0)")
+        conn.exec_driver_sql("INSERT INTO task_tag (task_id, tag_id) VALUES (1, 1), (2, 1)")
+        conn.exec_driver_sql(
+            "INSERT INTO notes (id, user_id, title, content, is_favorite) VALUES (1, 1, 'todo', ?, 0), (2, 2, 'plain', 'обычный текст', 0)",
+            (json.dumps(todo, ensure_ascii=False),),
+        )
+        conn.exec_driver_sql("INSERT INTO note_tag (note_id, tag_id) VALUES (2, 1)")
+    return engine
+
+
+def test_baseline_database_upgrades_to_latest(tmp_path):
+    engine = _baseline_db(tmp_path / "baseline.sqlite3")
+    assert run_migrations(engine) == latest_version()
+
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT version FROM schema_version").scalar() == latest_version()
+
+        # Теги разделены по пользователям, связи указывают на тег владельца задачи/заметки
+        tags = conn.exec_driver_sql("SELECT user_id, name, usage_count FROM tags ORDER BY user_id").fetchall()
+        assert [tuple(t) for t in tags] == [(1, "work", 1), (2, "work", 2)]
+        assert conn.exec_driver_sql("""
+            SELECT COUNT(*) FROM task_tag tt JOIN tasks t ON t.id = tt.task_id JOIN tags g ON g.id = tt.tag_id
+            WHERE g.user_id <> t.user_id
+        """).scalar() == 0
+        assert conn.exec_driver_sql("""
+            SELECT g.user_id FROM note_tag nt JOIN tags g ON g.id = nt.tag_id WHERE nt.note_id = 2
+        """).scalar() == 2
+
+        # Пункты todo перенесены в todo_items: повтор id и нецелый id получили новые
+        items = conn.exec_driver_sql("SELECT id, position, text, done FROM todo_items WHERE note_id = 1 ORDER BY position").fetchall()
+        assert [tuple(i) for i in items] == [(7, 0, "альфа", 1), (8, 1, "бета", 0), (9, 2, "гамма", 1)]
+        note = conn.exec_driver_sql("SELECT is_todo, content, todo_done, todo_total, snippet FROM notes WHERE id = 1").one()
+        assert tuple(note) == (1, None, 2, 3, "2/3")
+        assert conn.exec_driver_sql("SELECT snippet FROM notes WHERE id = 2").scalar() == "обычный текст"
+
+        # Поисковый индекс заполнен, в том числе текстами пунктов
+        def found(table, user_id, query):
+            match = build_match_query(user_id, query)
+            return [r[0] for r in conn.exec_driver_sql(f"SELECT rowid FROM {table} WHERE {table} MATCH ?", (match,))]
+
+        assert found("notes_fts", 1, "гамма") == [1]
+        assert found("notes_fts", 2, "обычный") == [2]
+        assert found("notes_fts", 1, "обычный") == []
+        assert found("tasks_fts", 2, "вторая") == [2]
+
+    # Повторный запуск на обновленной БД ничего не делает
+    assert run_migrations(engine) == latest_version()
+    engine.dispose()
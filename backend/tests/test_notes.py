@@ -0,0 +1,69 @@
+import hashlib
+import json
+
+from sqlalchemy import event
+
+from app.db import engine
+
+
+def _hash(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _content(client, auth, note_id):
+    return next(n["content"] for n in client.get("/api/notes", headers=auth).json() if n["id"] == note_id)
+
+
+def _patch_delta(client, auth, note, ops, base=None):
+    delta = {"base_hash": _hash(note["content"] if base is None else base), "ops": ops}
+    return client.patch(f"/api/notes/{note['id']}", json={"content_delta": delta}, headers=auth)
+
+
+def test_content_delta_uses_utf16_offsets(client, auth):
+    note = client.post("/api/notes", json={"title": "n", "content": "a😀b"}, headers=auth).json()
+    # Эмодзи занимает две единицы UTF-16: "b" начинается с позиции 3
+    response = _patch_delta(client, auth, note, [{"at": 3, "delete": 1, "insert": "c"}])
+    assert response.status_code == 200
+    assert response.json()["content"] == "a😀c"
+
+
+def test_content_delta_rejects_cut_surrogate_and_stale_base(client, auth):
+    note = client.post("/api/notes", json={"title": "n", "content": "a😀b"}, headers=auth).json()
+    assert _patch_delta(client, auth, note, [{"at": 2, "delete": 0, "insert": "x"}]).status_code == 400
+    assert _patch_delta(client, auth, note, [{"at": 0, "delete": 1, "insert": "x"}], base="other").status_code == 409
+    assert _content(client, auth, note["id"]) == "a😀b"
+
+
+def test_toggle_rewrites_only_that_item(client, auth):
+    items = [{"id": i, "text": f"item {i}", "completed": False} for i in (1, 2, 3)]
+    content = json.dumps({"type": "todo", "items": items})
+    note = client.post("/api/notes", json={"title": "todo", "content": content}, headers=auth).json()
+    writes = []
+
+    def record(conn, cursor, statement, parameters, *args):
+        if "todo_items" in statement and statement.lstrip().split()[0].upper() in ("INSERT", "UPDATE", "DELETE"):
+            writes.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.post(f"/api/notes/{note['id']}/items/2/toggle", headers=auth)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert response.status_code == 200
+    assert response.json()["item"]["completed"] is True
+    assert (response.json()["done"], response.json()["total"]) == (1, 3)
+    assert len(writes) == 1 and writes[0][0].lstrip().upper().startswith("UPDATE")
+    assert 2 in writes[0][1] and note["id"] in writes[0][1]
+    completed = [i["completed"] for i in json.loads(_content(client, auth, note["id"]))["items"]]
+    assert completed == [False, True, False]
+
+
+def test_sync_reports_deleted_note(client, auth):
+    note = client.post("/api/notes", json={"title": "n", "content": "c"}, headers=auth).json()
+    version = client.get("/api/sync", headers=auth).json()["version"]
+    client.delete(f"/api/notes/{note['id']}", headers=auth)
+    delta = client.get("/api/sync", params={"since": version}, headers=auth).json()
+    assert delta["full"] is False
+    assert delta["deleted"]["notes"] == [note["id"]]
+    assert all(n["id"] != note["id"] for n in delta["notes"])
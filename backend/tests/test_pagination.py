@@ -0,0 +1,56 @@
+import base64
+import json
+
+import pytest
+
+
+def _cursor(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def test_tasks_pages_follow_cursor(client, auth):
+    for i in range(3):
+        client.post("/api/tasks", json={"title": f"t{i}"}, headers=auth)
+    first = client.get("/api/tasks?limit=2", headers=auth).json()
+    second = client.get(f"/api/tasks?limit=2&cursor={first['next_cursor']}", headers=auth).json()
+    assert len(first["items"]) == 2 and len(second["items"]) == 1 and second["next_cursor"] is None
+
+
+def test_notes_pages_follow_cursor(client, auth):
+    for i in range(3):
+        client.post("/api/notes", json={"title": f"n{i}", "content": "x"}, headers=auth)
+    first = client.get("/api/notes?limit=2", headers=auth).json()
+    second = client.get(f"/api/notes?limit=2&cursor={first['next_cursor']}", headers=auth).json()
+    ids = [n["id"] for n in first["items"] + second["items"]]
+    assert len(ids) == 3 and len(set(ids)) == 3
+
+
+@pytest.mark.parametrize("values", [
+    ["x", "abc"],
+    [None, None],
+    ["2024-01-01 10:00:00.000000", "1"],
+    ["2024-01-01 10:00:00.000000", True],
+    [1, 2],
+    ["2024-01-01 10:00:00.000000"],
+    {"a": 1},
+])
+def test_tasks_bad_cursor_is_400(client, auth, values):
+    r = client.get(f"/api/tasks?cursor={_cursor(values)}", headers=auth)
+    assert r.status_code == 400 and r.json()["detail"] == "Некорректный курсор"
+
+
+@pytest.mark.parametrize("values", [
+    [False, "x", "abc"],
+    [None, None, None],
+    [0, "2024-01-01 10:00:00.000000", 1],
+    [False, "2024-01-01 10:00:00.000000", 1.5],
+    [False, 5, 1],
+])
+def test_notes_bad_cursor_is_400(client, auth, values):
+    r = client.get(f"/api/notes?cursor={_cursor(values)}", headers=auth)
+    assert r.status_code == 400 and r.json()["detail"] == "Некорректный курсор"
+
+
+def test_cursor_not_base64_json_is_400(client, auth):
+    assert client.get("/api/tasks?cursor=%%%", headers=auth).status_code == 400
+    assert client.get(f"/api/notes?cursor={_cursor('str')}", headers=auth).status_code == 400
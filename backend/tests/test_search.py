@@ -0,0 +1,20 @@
+def _ids(client, auth, **params):
+    items = client.get("/api/search", params={"q": "alpha", **params}, headers=auth).json()["items"]
+    return {(item["type"], item["id"]) for item in items}
+
+
+def test_search_filters_like_lists(client, auth):
+    everything = next(f for f in client.get("/api/folders", headers=auth).json() if f["is_default"])
+    work = client.post("/api/folders", json={"name": "work"}, headers=auth).json()
+    a = client.post("/api/notes", json={"title": "alpha one", "content": "x", "tags_text": "#red #blue"}, headers=auth).json()
+    b = client.post("/api/notes", json={"title": "alpha two", "content": "x", "tags_text": "#red", "folder_id": work["id"]}, headers=auth).json()
+    t = client.post("/api/tasks", json={"title": "alpha task", "tags_text": "#blue"}, headers=auth).json()
+    red = next(tag["id"] for tag in a["tags"] if tag["name"] == "red")
+    blue = next(tag["id"] for tag in a["tags"] if tag["name"] == "blue")
+
+    # Папка "Все" не фильтрует, задачи тоже ищутся
+    assert _ids(client, auth, folder_id=everything["id"]) == {("note", a["id"]), ("note", b["id"]), ("task", t["id"])}
+    assert _ids(client, auth, folder_id=work["id"]) == {("note", b["id"])}
+    assert _ids(client, auth, tag_id=[red, blue]) == {("note", a["id"])}
+    assert _ids(client, auth, tag_id=[red, blue], tag_mode="any") == {("note", a["id"]), ("note", b["id"]), ("task", t["id"])}
+    assert _ids(client, auth, tag_id=[blue], type="tasks") == {("task", t["id"])}
@@ -0,0 +1,19 @@
+from app.routers import settings as settings_router
+
+
+def test_missing_settings_created_through_writer(client, auth, monkeypatch):
+    calls = []
+    run_batched_write = settings_router.run_batched_write
+
+    def recording(db, fn, *args):
+        calls.append(fn.__name__)
+        return run_batched_write(db, fn, *args)
+
+    monkeypatch.setattr(settings_router, "run_batched_write", recording)
+    r = client.get("/api/settings", headers=auth)
+    assert r.status_code == 200 and r.json()["theme"] == "dark"
+    assert calls == ["_get_settings"]
+    # Настройки сохранены: повторное чтение их не создает
+    client.put("/api/settings", json={"theme": "light"}, headers=auth)
+    assert client.get("/api/settings", headers=auth).json()["theme"] == "light"
+    assert calls == ["_get_settings", "_update_settings"]
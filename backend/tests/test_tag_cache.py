@@ -0,0 +1,47 @@
+from app.core.config import settings
+from app.services import tag_service
+
+
+def _index(*names):
+    tags = [(1, i, name, None) for i, name in enumerate(names)]
+    return list(names), tags, tags
+
+
+def test_tag_ids_cache_is_lru_bounded(monkeypatch):
+    monkeypatch.setattr(settings, "tag_cache_max_users", 2)
+    tag_service.forget_tag_ids()
+    tag_service.remember_tag_ids(1, {"a": 1})
+    tag_service.remember_tag_ids(2, {"b": 2})
+    assert tag_service.cached_tag_ids(1) == {"a": 1}  # 1 - недавно использованный
+    tag_service.remember_tag_ids(3, {"c": 3})
+    assert list(tag_service._tag_ids) == [1, 3]
+    assert tag_service.cached_tag_ids(2) == {}
+
+
+def test_suggest_index_is_bounded_and_never_stale(monkeypatch):
+    monkeypatch.setattr(settings, "tag_cache_max_users", 2)
+    tag_service.forget_tag_suggestions()
+    monkeypatch.setattr(tag_service, "_load_suggest_index", lambda db, user_id: _index(f"u{user_id}"))
+    for user_id in (1, 2, 3):
+        assert [t[2] for t in tag_service.suggest_tags(None, user_id, "", 5)] == [f"u{user_id}"]
+    assert list(tag_service._suggest) == [2, 3]
+
+    # Теги изменились, пока индекс строился: он не сохраняется
+    def load_during_change(db, user_id):
+        tag_service.forget_tag_suggestions(user_id)
+        return _index("old")
+
+    monkeypatch.setattr(tag_service, "_load_suggest_index", load_during_change)
+    tag_service.suggest_tags(None, 4, "", 5)
+    assert 4 not in tag_service._suggest
+
+    # То же, если за время построения запись о сбросе пользователя вытеснена
+    def load_during_eviction(db, user_id):
+        tag_service.forget_tag_suggestions(user_id)
+        tag_service.forget_tag_suggestions(10, 11)
+        return _index("old")
+
+    monkeypatch.setattr(tag_service, "_load_suggest_index", load_during_eviction)
+    tag_service.suggest_tags(None, 5, "", 5)
+    assert 5 not in tag_service._suggest_generation and 5 not in tag_service._suggest
+    assert len(tag_service._suggest_generation) <= 2
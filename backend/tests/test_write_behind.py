@@ -0,0 +1,78 @@
+import threading
+
+from app.services.write_behind import WriteBehindBuffer
+
+
+def test_flush_writes_outside_buffer_lock():
+    started, release = threading.Event(), threading.Event()
+    written = []
+
+    def write(db, user_id, key, fields):
+        if key == 1:
+            started.set()
+            release.wait(5)
+        written.append((key, fields))
+
+    buffer = WriteBehindBuffer(write, delay_ms=60000)
+    with buffer.key_lock(1, 1):
+        buffer.put(1, 1, {"title": "a"})
+    flusher = threading.Thread(target=buffer.flush)
+    flusher.start()
+    try:
+        assert started.wait(5)
+        # Пока первая заметка записывается, другая меняется и читается без ожидания
+        with buffer.key_lock(1, 2):
+            buffer.put(1, 2, {"title": "b"})
+            assert buffer.get(1, 2) == {"title": "b"}
+        assert buffer.has_pending(1)
+        # flush_user записывает вторую заметку и дожидается записи первой
+        waiter = threading.Thread(target=buffer.flush_user, args=(1,))
+        waiter.start()
+        waiter.join(0.2)
+        assert waiter.is_alive()
+        assert written == [(2, {"title": "b"})]
+    finally:
+        release.set()
+        flusher.join(5)
+    waiter.join(5)
+    assert not waiter.is_alive()
+    assert sorted(written) == [(1, {"title": "a"}), (2, {"title": "b"})]
+    assert not buffer.has_pending(1) and not buffer._key_locks
+
+
+def test_transient_failure_keeps_fields_for_retry():
+    from sqlalchemy.exc import OperationalError
+
+    calls = []
+
+    def write(db, user_id, key, fields):
+        calls.append(fields)
+        if len(calls) == 1:
+            raise OperationalError("UPDATE notes", {}, Exception("database is locked"))
+
+    buffer = WriteBehindBuffer(write, delay_ms=0)
+    with buffer.key_lock(1, 1):
+        buffer.put(1, 1, {"title": "a"})
+    buffer.flush()
+    assert buffer.has_pending(1) and buffer.get(1, 1) == {"title": "a"}
+    buffer.flush()
+    assert calls == [{"title": "a"}, {"title": "a"}]
+    assert not buffer.has_pending(1) and buffer.take_error(1, 1) is None
+
+
+def test_permanent_failure_is_reported_on_next_patch(client, auth, monkeypatch):
+    from fastapi import HTTPException
+
+    from app.services import write_behind
+
+    def write(db, user_id, key, fields):
+        raise HTTPException(status_code=404, detail="Заметка не найдена")
+
+    monkeypatch.setattr(write_behind, "note_buffer", WriteBehindBuffer(write))
+    note = client.post("/api/notes", json={"title": "n", "content": "x"}, headers=auth).json()
+    assert client.patch(f"/api/notes/{note['id']}", json={"title": "edited"}, headers=auth).status_code == 200
+    # Чтение записывает отложенное изменение; запись не удалась
+    client.get("/api/notes", headers=auth)
+    r = client.patch(f"/api/notes/{note['id']}", json={"title": "again"}, headers=auth)
+    assert r.status_code == 409 and "Заметка не найдена" in r.json()["detail"]
+    assert client.patch(f"/api/notes/{note['id']}", json={"title": "again"}, headers=auth).status_code == 200
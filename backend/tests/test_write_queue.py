@@ -0,0 +1,49 @@
+from concurrent.futures import Future
+
+import pytest
+
+from app import coalescing
+from app.core.config import settings
+from app.db import create_db_engine
+from app.services import events
+from app.services.data_version import bump_data_version, record_changes
+from app.services.read_cache import read_cache
+from app.services.write_queue import WriteQueue
+
+
+def _ok(db, user_id):
+    bump_data_version(db, user_id)
+    record_changes(db, user_id, "tasks", [1])
+    return user_id
+
+
+def _fail(db, user_id):
+    bump_data_version(db, user_id)
+    record_changes(db, user_id, "tasks", [2])
+    raise ValueError("unit failed")
+
+
+def test_failed_unit_leaves_no_marks(client, make_auth, monkeypatch):
+    first, second = (client.get("/auth/me", headers=make_auth()).json()["id"] for _ in range(2))
+    published, invalidated = [], []
+    monkeypatch.setattr(events.broker, "publish", lambda user_id, name, data: published.append((user_id, data)))
+    monkeypatch.setattr(read_cache, "invalidate", lambda *user_ids: invalidated.extend(user_ids))
+    generation = coalescing._generations.get(second, 0)
+
+    engine = create_db_engine(settings.database_url, begin_mode="IMMEDIATE", pool_size=1, max_overflow=0)
+    ok, failed, probe = Future(), Future(), Future()
+    # До коммита пачки ничего не рассылается, хотя SAVEPOINT первой операции уже зафиксирован
+    seen = lambda db: list(published)
+    try:
+        WriteQueue(engine)._process([(ok, _ok, (first,)), (failed, _fail, (second,)), (probe, seen, ())])
+    finally:
+        engine.dispose()
+
+    assert ok.result() == first
+    assert probe.result() == []
+    with pytest.raises(ValueError):
+        failed.result()
+    assert [user_id for user_id, _ in published] == [first]
+    assert published[0][1]["changes"] == [{"entity": "tasks", "id": 1, "op": "upsert"}]
+    assert invalidated == [first]
+    assert coalescing._generations.get(second, 0) == generation